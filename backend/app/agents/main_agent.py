@@ -1,15 +1,82 @@
 from langchain_openai import ChatOpenAI
 from langchain.agents import AgentExecutor, create_openai_functions_agent
 from langchain.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain.schema import HumanMessage, AIMessage
+from collections import OrderedDict
+from typing import Dict, Optional
 
 from app.config import settings
-from app.agents.prompts import MAIN_AGENT_SYSTEM_PROMPT
+from app.agents.prompts import build_main_agent_system_prompt, retrieve_gym_details
 from app.tools.intent_classifier_tool import intent_classifier_tool
-from app.tools.calendly_tool import get_availability_tool, book_trial_tool
+from app.tools.calendly_tool import get_availability_tool, find_slots_tool, book_trial_tool
 from app.tools.gym_info_tool import gym_info_tool
 from app.tools.memory_tool import memory_update_tool
 from app.services.mongodb_service import mongodb_service
+from app.services.event_bus import event_bus
+from app.services.usage_service import usage_service, COMPONENT_AGENT
+from app.agents.model_router import model_router, TokenUsageHandler
+from app.agents.parallel_agent import ParallelToolAgent
+from app.agents.session_record import SessionRecord, ROLE_USER, ROLE_AGENT
+from app.services.admission import PRIORITY_HIGH, PRIORITY_MEDIUM, PRIORITY_LOW
+from app.services.tenants import Tenant, get_current_tenant
+from app.services.knowledge_base import gym_knowledge
+from app.services.transcript_store import transcript_store
+from app.utils.helpers import LazySingleton
+from app.services.profiler import request_profiler
+from app.utils.logger import get_logger, bind_log_context, is_verbose, ChainLogHandler
+import json
+import time
+
+logger = get_logger(__name__)
+
+NEW_LEAD_CONTEXT = "New lead - no previous information."
+MEMORY_UNAVAILABLE_CONTEXT = (
+    "Lead profile temporarily unavailable - this may be a returning lead. "
+    "Don't treat them as new or re-ask basics they may have shared; let them lead."
+)
+
+# LLM clients by (model, streaming), shared by every tenant's agent so all
+# branches reuse the same connection pools
+_llm_clients: Dict[tuple, ChatOpenAI] = {}
+
+def get_llm(model: str, streaming: bool = False) -> ChatOpenAI:
+    key = (model, streaming)
+    if key not in _llm_clients:
+        _llm_clients[key] = ChatOpenAI(
+            model=model,
+            temperature=0.7,
+            streaming=streaming,
+            openai_api_key=settings.openai_api_key
+        )
+    return _llm_clients[key]
+
+def format_memory_context(memory: Optional[Dict]) -> str:
+    """Lead profile shown to the agent ("New lead" until a profile field is known)"""
+    if not memory:
+        return NEW_LEAD_CONTEXT
+    
+    # Check if this is actually a new lead (all Unknown)
+    is_new = all(
+        memory.get(field) in ["Unknown", "None", "unknown"]
+        for field in ["fitness_goals", "past_experience", "location_proximity", 
+                     "joining_timeline", "motivation", "preferred_time"]
+    )
+    if is_new:
+        return NEW_LEAD_CONTEXT
+    
+    return f"""
+Fitness Goals: {memory.get('fitness_goals', 'Unknown')}
+Past Experience: {memory.get('past_experience', 'Unknown')}
+Location: {memory.get('location_proximity', 'Unknown')}
+Timeline: {memory.get('joining_timeline', 'Unknown')}
+Motivation: {memory.get('motivation', 'Unknown')}
+Preferred Time: {memory.get('preferred_time', 'Unknown')}
+Health Info: {memory.get('health_physical_info', 'Unknown')}
+Objections: {memory.get('objections', 'None')}
+
+Additional Context: {memory.get('conversation_summary', 'None')}
+
+💡 Use this information to personalize your conversation. Don't ask for details we already know!
+"""
 
 class MainSalesAgent:
     """
@@ -17,178 +84,344 @@ class MainSalesAgent:
     Agent calls intent_classifier_tool to adapt behavior dynamically
     """
     
-    def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
-            temperature=0.7,
-            openai_api_key=settings.openai_api_key
-        )
+    def __init__(
+        self,
+        engine: Optional[str] = None,
+        tenant: Optional[Tenant] = None,
+        sessions: Optional[Dict[str, SessionRecord]] = None
+    ):
+        # "functions" or "parallel_tools" (see settings.agent_engine)
+        self.engine = engine or settings.agent_engine
+        # Gym branch this agent sells for (its prompt names the branch)
+        self.tenant = tenant or get_current_tenant()
         
         # Tools available to the agent
         self.tools = [
             intent_classifier_tool,  # Agent will call this first
             memory_update_tool,    
             get_availability_tool,
+            find_slots_tool,
             book_trial_tool,
             gym_info_tool
         ]
         
         # Agent prompt - intent will be determined by tool call
         self.prompt = ChatPromptTemplate.from_messages([
-            ("system", MAIN_AGENT_SYSTEM_PROMPT),
+            ("system", build_main_agent_system_prompt(self.tenant)),
             ("system", "CURRENT LEAD PROFILE:\n{memory_context}"),
             MessagesPlaceholder(variable_name="chat_history"),
             ("human", "{input}"),
             MessagesPlaceholder(variable_name="agent_scratchpad")
         ])
         
-        # Create the agent
-        self.agent = create_openai_functions_agent(
-            llm=self.llm,
-            tools=self.tools,
-            prompt=self.prompt
-        )
+        # One executor per model, built on first use by the router
+        self.executors = {}
+        self.agent_executor = self._get_executor(settings.router_default_model)
+        self.llm = self.executors[(settings.router_default_model, False, False)]["llm"]
         
-        self.agent_executor = AgentExecutor(
-            agent=self.agent,
-            tools=self.tools,
-            verbose=True,
-            handle_parsing_errors=True,
-            max_iterations=20,
-            return_intermediate_steps=True
-        )
+        # Session storage (in production, use Redis or similar); passed in by
+        # TenantAgentCache so sessions outlive an evicted agent
+        self.sessions: Dict[str, SessionRecord] = sessions if sessions is not None else {}
+    
+    def _get_executor(self, model: str, streaming: bool = False, restricted: bool = False):
+        """Get (or build and cache) the agent executor for a model
+        
+        Streaming executors emit on_llm_new_token callbacks for the WebSocket
+        transport; they're kept separate because streamed responses don't
+        report token usage. Restricted executors (sessions over budget) leave
+        out the tools listed in settings.budget_disabled_tools.
+        """
+        key = (model, streaming, restricted)
+        if key not in self.executors:
+            tools = self.tools
+            if restricted:
+                tools = [t for t in self.tools if t.name not in settings.budget_disabled_tools]
+            
+            llm = get_llm(model, streaming)
+            
+            if self.engine == "parallel_tools":
+                executor = ParallelToolAgent(
+                    llm=llm,
+                    tools=tools,
+                    prompt=self.prompt,
+                    max_iterations=20
+                )
+            else:
+                agent = create_openai_functions_agent(
+                    llm=llm,
+                    tools=tools,
+                    prompt=self.prompt
+                )
+                executor = AgentExecutor(
+                    agent=agent,
+                    tools=tools,
+                    verbose=False,  # Chain output goes through ChainLogHandler on verbose requests
+                    handle_parsing_errors=True,
+                    max_iterations=20,
+                    return_intermediate_steps=True
+                )
+            
+            self.executors[key] = {
+                "llm": llm,
+                "executor": executor
+            }
         
-        # Session storage (in production, use Redis or similar)
-        self.sessions = {}
+        return self.executors[key]["executor"]
     
-    def _get_or_create_session(self, session_id: str) -> dict:
+    def _get_or_create_session(self, session_id: str) -> SessionRecord:
         """Get or create a session"""
-        if session_id not in self.sessions:
-            self.sessions[session_id] = {
-                "chat_history": [],
-                "last_intent": "unknown",
-                "user_info": {},
-                "message_count": 0
-            }
-        return self.sessions[session_id]
+        session = self.sessions.get(session_id)
+        if session is None:
+            session = self.sessions[session_id] = SessionRecord()
+        return session
     
-    def _format_chat_history(self, chat_history: list) -> str:
+    async def _load_session(self, session_id: str) -> SessionRecord:
+        """Get a session, rebuilding it from its stored transcript if it isn't in memory
+        
+        Sessions are lost on restart (or when handled by another instance);
+        their last SessionRecord.MAX_MESSAGES messages are read back on the
+        next message. A transcript that can't be read in time gives an empty
+        session rather than a slow reply.
+        """
+        session = self.sessions.get(session_id)
+        if session is not None:
+            return session
+        
+        session = SessionRecord()
+        if settings.transcripts_enabled:
+            stored = await transcript_store.load_recent(self.tenant.tenant_id, session_id, SessionRecord.MAX_MESSAGES)
+            if stored:
+                messages, session.message_count = stored
+                for role, text in messages:
+                    session.append(ROLE_USER if role == ROLE_USER else ROLE_AGENT, text)
+                logger.info("Session rehydrated", extra={"messages": len(messages)})
+        # Another message may have created the session while the transcript loaded
+        return self.sessions.setdefault(session_id, session)
+    
+    def _record(self, session_id: str, role: str, text: str) -> None:
+        """Queue a message for the persistent transcript (never waits on MongoDB)"""
+        if settings.transcripts_enabled:
+            transcript_store.append(self.tenant.tenant_id, session_id, role, text)
+    
+    async def get_priority(self, session_id: str, user_message: str) -> int:
+        """Admission priority for a turn, from lead intent and conversation stage
+        
+        Uses this process's latest classification when there is one, else the
+        `last_intent` stored in memory. The intent classifier itself isn't run
+        here: that would spend the LLM capacity admission is rationing.
+        
+        Returns:
+            PRIORITY_HIGH for high intent or a message in the booking flow,
+            PRIORITY_LOW for low intent, PRIORITY_MEDIUM otherwise (new leads,
+            medium intent, leads that have already booked)
+        """
+        session = self.sessions.get(session_id)
+        intent = session.last_intent if session else "unknown"
+        
+        lead = {}
+        if intent == "unknown" or model_router.is_booking_flow(user_message):
+            # None while MongoDB is unavailable: rank on the message alone
+            lead = await mongodb_service.get_lead_fields(session_id, ["last_intent", "booking_status"]) or {}
+            if intent == "unknown":
+                intent = lead.get("last_intent") or "unknown"
+        
+        if lead.get("booking_status") == "booked":
+            return PRIORITY_MEDIUM
+        if intent == "high" or model_router.is_booking_flow(user_message):
+            return PRIORITY_HIGH
+        if intent == "low":
+            return PRIORITY_LOW
+        return PRIORITY_MEDIUM
+    
+    def _format_chat_history(self, session: SessionRecord) -> str:
         """Format chat history as string"""
-        if not chat_history:
+        if not len(session):
             return "No previous conversation"
         
         formatted = []
-        for msg in chat_history[-6:]:  # Last 3 exchanges
-            if isinstance(msg, HumanMessage):
-                formatted.append(f"User: {msg.content}")
-            elif isinstance(msg, AIMessage):
-                formatted.append(f"Agent: {msg.content}")
+        for role, text in session.iter_messages(last=6):  # Last 3 exchanges
+            if role == ROLE_USER:
+                formatted.append(f"User: {text}")
+            else:
+                formatted.append(f"Agent: {text}")
         
         return "\n".join(formatted)
     
-    async def _load_memory_context(self, session_id: str) -> str:
-        """Load memory from MongoDB and format for agent context"""
+    async def _load_memory_context(self, session_id: str) -> tuple:
+        """Load memory from MongoDB and format for agent context
+        
+        Returns:
+            Tuple of (formatted context, raw memory document or None). While
+            MongoDB is unavailable the context says so instead of presenting
+            the lead as new.
+        """
+        memory = None
         try:
             memory = await mongodb_service.get_memory(session_id)
+            if memory is None:
+                logger.warning("Lead memory unavailable")
+                return MEMORY_UNAVAILABLE_CONTEXT, None
             
-            if not memory:
-                return "New lead - no previous information."
-            
-            # Check if this is actually a new lead (all Unknown)
-            is_new = all(
-                memory.get(field) in ["Unknown", "None", "unknown"]
-                for field in ["fitness_goals", "past_experience", "location_proximity", 
-                             "joining_timeline", "motivation", "preferred_time"]
-            )
-            
-            if is_new:
-                return "New lead - no previous information."
-            
-            # Format memory for agent
-            context = f"""
-Fitness Goals: {memory.get('fitness_goals', 'Unknown')}
-Past Experience: {memory.get('past_experience', 'Unknown')}
-Location: {memory.get('location_proximity', 'Unknown')}
-Timeline: {memory.get('joining_timeline', 'Unknown')}
-Motivation: {memory.get('motivation', 'Unknown')}
-Preferred Time: {memory.get('preferred_time', 'Unknown')}
-Health Info: {memory.get('health_physical_info', 'Unknown')}
-Objections: {memory.get('objections', 'None')}
-
-Additional Context: {memory.get('conversation_summary', 'None')}
-
-💡 Use this information to personalize your conversation. Don't ask for details we already know!
-"""
-            
-            print(f"✅ Loaded memory for session: {session_id}")
-            return context
+            context = format_memory_context(memory)
+            logger.debug("Memory loaded")
+            return context, memory
             
         except Exception as e:
-            print(f"Error loading memory: {str(e)}")
-            return "New lead - no previous information."
+            logger.warning("Error loading memory", extra={"error": str(e)})
+            return MEMORY_UNAVAILABLE_CONTEXT, memory
+    
+    def _get_gym_details(self, session: SessionRecord, user_message: str) -> str:
+        """GYM DETAILS for this turn: the chunks matching the lead's message (and the one before), or everything"""
+        if not settings.gym_retrieval_enabled:
+            return gym_knowledge.snapshot(self.tenant).derived("gym_details_prompt", self.tenant)
+        
+        previous = [text for role, text in session.iter_messages(last=2) if role is ROLE_USER]
+        gym_details, chunk_ids = retrieve_gym_details(user_message, " ".join(previous), self.tenant)
+        logger.debug("Gym details retrieved", extra={"chunks": chunk_ids})
+        return gym_details
     
-    async def process_message(self, user_message: str, session_id: str) -> dict:
-        """Process a user message with memory support"""
+    async def process_message(
+        self,
+        user_message: str,
+        session_id: str,
+        callbacks: Optional[list] = None
+    ) -> dict:
+        """Process a user message with memory support
+        
+        Everything logged while the turn runs carries the session id and tenant.
+        With profiling enabled, the turn may run under the profiler (see
+        RequestProfiler).
+        
+        Args:
+            user_message: The latest message from user
+            session_id: Session identifier
+            callbacks: Extra LangChain callbacks for this turn; passing any
+                switches to a streaming executor (used for token streaming)
+        """
+        with bind_log_context(session_id=session_id, tenant=self.tenant.tenant_id):
+            if settings.profiling_enabled:
+                trigger = request_profiler.trigger()
+                if trigger:
+                    return await request_profiler.run(
+                        self._process_message(user_message, session_id, callbacks),
+                        trigger,
+                        session_id=session_id,
+                        tenant=self.tenant.tenant_id
+                    )
+            return await self._process_message(user_message, session_id, callbacks)
+    
+    async def _process_message(self, user_message: str, session_id: str, callbacks: Optional[list]) -> dict:
+        turn_usage = None
         try:
-            # Get or create session
-            session = self._get_or_create_session(session_id)
-            session["message_count"] += 1
+            # Get the session, rehydrated from its transcript after a restart
+            session = await self._load_session(session_id)
+            session.message_count += 1
             
             # Load memory context
-            memory_context = await self._load_memory_context(session_id)
+            memory_context, memory = await self._load_memory_context(session_id)
+            
+            logger.info("Turn started", extra={"message_number": session.message_count, "chars": len(user_message)})
+            logger.debug("Lead message", extra={"text": user_message})
+            
+            # Sessions over budget get the fallback model and fewer tools
+            over_budget = usage_service.is_over_budget(
+                await usage_service.get_session_totals(session_id)
+            )
+            turn_usage = usage_service.start_turn(session_id)
             
-            print(f"\n{'='*50}")
-            print(f"[MAIN AGENT] Session: {session_id}")
-            print(f"[MAIN AGENT] Message #{session['message_count']}: {user_message}")
-            print(f"{'='*50}\n")
+            # Pick the model for this turn
+            route = model_router.route(user_message, session.last_intent, over_budget=over_budget)
+            executor = self._get_executor(route.model, streaming=bool(callbacks), restricted=over_budget)
             
             # Agent processes with memory context
             # Add session_id to input so agent can use it in tool calls
             enriched_input = f"[Session ID: {session_id}]\n{user_message}"
-
-            response = await self.agent_executor.ainvoke({
-                         "input": enriched_input,
-                         "chat_history": session["chat_history"],
-                         "memory_context": memory_context
-            })
             
-            # Extract intent from intermediate steps
+            usage = TokenUsageHandler()
+            started = time.perf_counter()
+            response = await executor.ainvoke(
+                {
+                    "input": enriched_input,
+                    "chat_history": session.to_messages(),
+                    "memory_context": memory_context,
+                    "gym_details": self._get_gym_details(session, user_message)
+                },
+                config={"callbacks": [usage] + list(callbacks or []) + ([ChainLogHandler()] if is_verbose() else [])}
+            )
+            model_router.record(
+                route.model,
+                time.perf_counter() - started,
+                usage.prompt_tokens,
+                usage.completion_tokens,
+                component=COMPONENT_AGENT
+            )
+            await usage_service.finish_turn(turn_usage, degraded=over_budget)
+            
+            # Extract intent and booking result from intermediate steps
             intent_level = "unknown"
+            trial_booked = False
             if response.get("intermediate_steps"):
                 for action, observation in response["intermediate_steps"]:
                     if action.tool == "classify_user_intent":
                         try:
-                            import json
                             intent_data = json.loads(observation)
                             intent_level = intent_data.get("intent_level", "unknown")
-                            session["last_intent"] = intent_level
-                            print(f"[INTENT] {intent_level}")
+                            session.set_intent(intent_level)
+                        except:
+                            pass
+                    elif action.tool == "book_gym_trial":
+                        try:
+                            trial_booked = trial_booked or bool(json.loads(observation).get("success"))
                         except:
                             pass
             
-            # Update chat history
-            session["chat_history"].append(HumanMessage(content=user_message))
-            session["chat_history"].append(AIMessage(content=response["output"]))
+            # Push the fresh classification to live subscribers
+            if intent_level != "unknown":
+                event_bus.publish(session_id, {"last_intent": intent_level}, event_type="intent", tenant_id=self.tenant.tenant_id)
             
-            # Keep only last 10 messages
-            if len(session["chat_history"]) > 10:
-                session["chat_history"] = session["chat_history"][-10:]
+            # Keep stored funnel fields current (only written when they change)
+            funnel_updates = {}
+            if memory and intent_level != "unknown" and memory.get("last_intent") != intent_level:
+                funnel_updates["last_intent"] = intent_level
+            if memory and trial_booked and memory.get("booking_status") != "booked":
+                funnel_updates["booking_status"] = "booked"
+            if funnel_updates:
+                await mongodb_service.update_lead_fields(session_id, funnel_updates)
+            
+            # Update chat history (record keeps only the last 10 messages; the
+            # transcript keeps more and is written in the background)
+            session.add_exchange(user_message, response["output"])
+            self._record(session_id, ROLE_USER, user_message)
+            self._record(session_id, ROLE_AGENT, response["output"])
             
             # Check if booking was made
             booking_made = "booked" in response["output"].lower() or "confirmed" in response["output"].lower()
+            logger.info("Turn finished", extra={
+                "intent": intent_level,
+                "model": route.model,
+                "iterations": usage.llm_calls,
+                "prompt_tokens": usage.prompt_tokens,
+                "completion_tokens": usage.completion_tokens,
+                "booking_made": booking_made
+            })
             
             return {
                 "response": response["output"],
                 "session_id": session_id,
                 "intent_level": intent_level,
                 "booking_made": booking_made,
-                "message_count": session["message_count"]
+                "message_count": session.message_count,
+                "model": route.model,
+                "iterations": usage.llm_calls,
+                "usage": turn_usage.to_dict()
             }
             
         except Exception as e:
-            print(f"Error processing message: {str(e)}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Error processing message")
+            
+            # Keep whatever was spent before the failure
+            if turn_usage is not None and usage_service.current_turn() is turn_usage:
+                await usage_service.finish_turn(turn_usage)
             
             return {
                 "response": "I apologize, I encountered a technical issue. Could you please try again?",
@@ -198,10 +431,71 @@ Additional Context: {memory.get('conversation_summary', 'None')}
                 "error": str(e)
             }
     
+    def add_agent_message(self, session_id: str, message: str):
+        """Record a server-initiated agent message (e.g. a follow-up) in the session history
+        
+        A session that isn't in memory isn't created here, so it's still
+        rehydrated (follow-up included) on the lead's next message.
+        """
+        session = self.sessions.get(session_id)
+        if session is not None or not settings.transcripts_enabled:
+            self._get_or_create_session(session_id).append(ROLE_AGENT, message)
+        self._record(session_id, ROLE_AGENT, message)
+    
     def reset_session(self, session_id: str):
-        """Reset a session (clear history)"""
+        """Reset a session (clear history, including the stored transcript)"""
         if session_id in self.sessions:
             del self.sessions[session_id]
+        if settings.transcripts_enabled:
+            transcript_store.clear(self.tenant.tenant_id, session_id)
+
+class TenantAgentCache:
+    """
+    Bounded LRU of built MainSalesAgent instances, one per tenant
+    
+    Building an agent renders the branch's prompt and its executors, so it's
+    done once per tenant and reused. Only the `max_size` most recently used
+    tenants keep a built agent; chat sessions are stored here rather than on
+    the agent so they survive an eviction.
+    
+    Usage:
+        agent = tenant_agents.get()  # current request's tenant
+        result = await agent.process_message(...)
+    """
+    
+    def __init__(self, max_size: int):
+        self.max_size = max(1, max_size)
+        self.agents: "OrderedDict[str, MainSalesAgent]" = OrderedDict()
+        self.sessions: Dict[str, Dict[str, SessionRecord]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    def get(self, tenant: Optional[Tenant] = None) -> MainSalesAgent:
+        """Built agent for a tenant (default: the current one)"""
+        tenant = tenant or get_current_tenant()
+        agent = self.agents.get(tenant.tenant_id)
+        if agent is not None:
+            self.agents.move_to_end(tenant.tenant_id)
+            self.hits += 1
+            return agent
+        
+        self.misses += 1
+        agent = MainSalesAgent(tenant=tenant, sessions=self.sessions.setdefault(tenant.tenant_id, {}))
+        self.agents[tenant.tenant_id] = agent
+        if len(self.agents) > self.max_size:
+            self.agents.popitem(last=False)
+            self.evictions += 1
+        return agent
+    
+    def get_stats(self) -> Dict:
+        return {
+            "cached": len(self.agents),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
 
-# Singleton instance
-main_agent = MainSalesAgent()
+# Singleton instance (built on first use)
+tenant_agents = LazySingleton(lambda: TenantAgentCache(settings.tenant_agent_cache_size))
@@ -1,8 +1,18 @@
 from langchain_openai import ChatOpenAI
 from langchain.prompts import ChatPromptTemplate
 from app.config import settings
+from app.agents.model_router import model_router, TokenUsageHandler
+from app.services.usage_service import COMPONENT_MEMORY
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger
 from typing import Dict
 import json
+import time
+
+logger = get_logger(__name__)
+
+class MemoryUpdateError(Exception):
+    """The memory manager's LLM call failed or its reply had no memory fields"""
 
 class MemoryManagerAgent:
     """
@@ -11,8 +21,9 @@ class MemoryManagerAgent:
     """
     
     def __init__(self):
+        self.model = "gpt-4o-mini"
         self.llm = ChatOpenAI(
-            model="gpt-4o-mini",
+            model=self.model,
             temperature=0,
             openai_api_key=settings.openai_api_key
         )
@@ -46,6 +57,32 @@ Based on the above information, generate the UPDATED MEMORY following the exact
 Return ONLY the updated memory in the specified format.""")
         ])
     
+    def build_messages(
+        self,
+        current_memory: Dict,
+        user_message: str,
+        agent_response: str,
+        conversation_history: str = ""
+    ) -> list:
+        """Render the chat messages sent to the model for one memory update"""
+        current_memory_text = f"""
+Fitness Goal(s): {current_memory.get('fitness_goals', 'Unknown')}
+Past Experience / Background: {current_memory.get('past_experience', 'Unknown')}
+Location / Proximity: {current_memory.get('location_proximity', 'Unknown')}
+Joining Timeline: {current_memory.get('joining_timeline', 'Unknown')}
+Motivation: {current_memory.get('motivation', 'Unknown')}
+Preferred Time: {current_memory.get('preferred_time', 'Unknown')}
+Health / Physical Info: {current_memory.get('health_physical_info', 'Unknown')}
+Objections: {current_memory.get('objections', 'None')}
+Other Notes: {current_memory.get('conversation_summary', 'None')}
+"""
+        return self.prompt.format_messages(
+            current_memory=current_memory_text,
+            user_message=user_message,
+            agent_response=agent_response,
+            conversation_history=conversation_history or "No previous conversation"
+        )
+    
     async def update_memory(
         self,
         current_memory: Dict,
@@ -63,47 +100,55 @@ Return ONLY the updated memory in the specified format.""")
             conversation_history: Recent conversation context
             
         Returns:
-            Updated memory dictionary
+            Updated memory dictionary (current_memory unchanged if the update failed)
         """
         try:
-            # Format current memory as text
-            current_memory_text = f"""
-Fitness Goal(s): {current_memory.get('fitness_goals', 'Unknown')}
-Past Experience / Background: {current_memory.get('past_experience', 'Unknown')}
-Location / Proximity: {current_memory.get('location_proximity', 'Unknown')}
-Joining Timeline: {current_memory.get('joining_timeline', 'Unknown')}
-Motivation: {current_memory.get('motivation', 'Unknown')}
-Preferred Time: {current_memory.get('preferred_time', 'Unknown')}
-Health / Physical Info: {current_memory.get('health_physical_info', 'Unknown')}
-Objections: {current_memory.get('objections', 'None')}
-Other Notes: {current_memory.get('conversation_summary', 'None')}
-"""
+            return await self.generate_memory(current_memory, user_message, agent_response, conversation_history)
+        except MemoryUpdateError as e:
+            logger.warning("Memory update failed", extra={"error": str(e)})
+            return current_memory
+    
+    async def generate_memory(
+        self,
+        current_memory: Dict,
+        user_message: str,
+        agent_response: str,
+        conversation_history: str = ""
+    ) -> Dict:
+        """
+        Like update_memory, but a failed update raises instead of returning the memory unchanged
+        
+        Raises:
+            MemoryUpdateError: The LLM call failed or its reply had no memory fields
+        """
+        try:
+            messages = self.build_messages(current_memory, user_message, agent_response, conversation_history)
             
-            # Call LLM
-            messages = self.prompt.format_messages(
-                current_memory=current_memory_text,
-                user_message=user_message,
-                agent_response=agent_response,
-                conversation_history=conversation_history or "No previous conversation"
+            usage = TokenUsageHandler()
+            started = time.perf_counter()
+            response = await self.llm.ainvoke(messages, config={"callbacks": [usage]})
+            model_router.record(
+                self.model,
+                time.perf_counter() - started,
+                usage.prompt_tokens,
+                usage.completion_tokens,
+                component=COMPONENT_MEMORY
             )
-            
-            response = await self.llm.ainvoke(messages)
-            
-            # Parse the response
-            updated_memory = self._parse_memory_response(response.content, current_memory)
-            
-            print(f"\n[MEMORY MANAGER] Updated fields:")
-            for key, value in updated_memory.items():
-                if key not in ['_id', 'created_at', 'last_updated', 'total_messages']:
-                    if current_memory.get(key) != value:
-                        print(f"  - {key}: {current_memory.get(key)} → {value}")
-            
-            return updated_memory
-            
         except Exception as e:
-            print(f"[MEMORY MANAGER ERROR] {str(e)}")
-            # Return current memory unchanged on error
-            return current_memory
+            raise MemoryUpdateError(str(e) or type(e).__name__) from e
+        
+        # Parse the response
+        updated_memory = self._parse_memory_response(response.content, current_memory)
+        
+        changed = [
+            key for key, value in updated_memory.items()
+            if key not in ['_id', 'created_at', 'last_updated', 'total_messages']
+            and current_memory.get(key) != value
+        ]
+        logger.info("Memory fields updated", extra={"fields": changed})
+        logger.debug("Memory field values", extra={"changes": {key: [current_memory.get(key), updated_memory[key]] for key in changed}})
+        
+        return updated_memory
     
     def _parse_memory_response(self, response_text: str, current_memory: Dict) -> Dict:
         """
@@ -115,47 +160,52 @@ Other Notes: {current_memory.get('conversation_summary', 'None')}
             
         Returns:
             Updated memory dictionary
-        """
-        try:
-            # Initialize with current memory
-            updated = dict(current_memory)
-            
-            # Parse the structured response
-            lines = response_text.strip().split('\n')
-            
-            for line in lines:
-                line = line.strip()
-                
-                if line.startswith("Fitness Goal(s):"):
-                    updated["fitness_goals"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Past Experience"):
-                    updated["past_experience"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Location"):
-                    updated["location_proximity"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Joining Timeline:"):
-                    updated["joining_timeline"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Motivation:"):
-                    updated["motivation"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Preferred Time:"):
-                    updated["preferred_time"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Health"):
-                    updated["health_physical_info"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Objections:"):
-                    updated["objections"] = line.split(":", 1)[1].strip()
-                elif line.startswith("Other Notes:"):
-                    updated["conversation_summary"] = line.split(":", 1)[1].strip()
             
-            # Preserve metadata
-            updated["_id"] = current_memory.get("_id")
-            updated["created_at"] = current_memory.get("created_at")
-            updated["total_messages"] = current_memory.get("total_messages", 0) + 1
-            updated["last_intent"] = current_memory.get("last_intent", "unknown")
+        Raises:
+            MemoryUpdateError: The response has none of the memory fields
+        """
+        # Initialize with current memory
+        updated = dict(current_memory)
+        parsed = 0
+        
+        # Parse the structured response
+        for line in response_text.strip().split('\n'):
+            line = line.strip()
             
-            return updated
+            field = None
+            if line.startswith("Fitness Goal(s):"):
+                field = "fitness_goals"
+            elif line.startswith("Past Experience"):
+                field = "past_experience"
+            elif line.startswith("Location"):
+                field = "location_proximity"
+            elif line.startswith("Joining Timeline:"):
+                field = "joining_timeline"
+            elif line.startswith("Motivation:"):
+                field = "motivation"
+            elif line.startswith("Preferred Time:"):
+                field = "preferred_time"
+            elif line.startswith("Health"):
+                field = "health_physical_info"
+            elif line.startswith("Objections:"):
+                field = "objections"
+            elif line.startswith("Other Notes:"):
+                field = "conversation_summary"
             
-        except Exception as e:
-            print(f"[MEMORY PARSER ERROR] {str(e)}")
-            return current_memory
+            if field and ":" in line:
+                updated[field] = line.split(":", 1)[1].strip()
+                parsed += 1
+        
+        if not parsed:
+            raise MemoryUpdateError(f"No memory fields in reply: {response_text[:200]!r}")
+        
+        # Preserve metadata
+        updated["_id"] = current_memory.get("_id")
+        updated["created_at"] = current_memory.get("created_at")
+        updated["total_messages"] = current_memory.get("total_messages", 0) + 1
+        updated["last_intent"] = current_memory.get("last_intent", "unknown")
+        
+        return updated
 
-# Singleton instance
-memory_manager = MemoryManagerAgent()
\ No newline at end of file
+# Singleton instance (built on first use)
+memory_manager = LazySingleton(MemoryManagerAgent)
\ No newline at end of file
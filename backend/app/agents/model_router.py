@@ -0,0 +1,232 @@
+from langchain.callbacks.base import AsyncCallbackHandler
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from datetime import datetime
+from typing import Dict, List, Optional
+import re
+
+from app.config import settings
+from app.services.usage_service import current_turn_usage
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Keyword signals used to guess whether a turn will need tools
+BOOKING_KEYWORDS = (
+    "book", "booking", "slot", "available", "availability", "schedule",
+    "trial", "tomorrow", "today", "tonight", "this week", "sign up", "join",
+    "morning", "evening", "weekend"
+)
+INFO_KEYWORDS = (
+    "class", "trainer", "coach", "price", "cost", "fee", "plan", "membership",
+    "pool", "facility", "facilities", "equipment", "hours", "timing", "yoga",
+    "zumba", "crossfit", "sauna", "parking", "location", "address"
+)
+TRIVIAL_MESSAGES = {
+    "hi", "hello", "hey", "ok", "okay", "thanks", "thank you", "sure", "yes",
+    "no", "cool", "great", "got it", "bye", "hmm", "nice"
+}
+EMAIL_PATTERN = re.compile(r"[\w.+-]+@[\w-]+\.[\w.]+")
+TIME_PATTERN = re.compile(r"\b\d{1,2}(:\d{2})?\s?(am|pm)\b", re.IGNORECASE)
+
+TIER_FAST = "fast"
+TIER_DEFAULT = "default"
+TIER_ESCALATION = "escalation"
+TIER_BUDGET = "budget"
+
+
+@dataclass
+class RouteDecision:
+    """Model chosen for a single turn and the signals behind it"""
+    model: str
+    tier: str
+    reason: str
+    message_length: int
+    last_intent: str
+    tools_likely: bool
+    decided_at: str = field(default_factory=lambda: datetime.utcnow().isoformat())
+
+
+class TokenUsageHandler(AsyncCallbackHandler):
+    """
+    Collects token usage reported by the LLM calls of a single run
+
+    Streamed responses don't report usage; for those the prompt is estimated
+    at ~4 characters per token and each streamed chunk counts as one token.
+    """
+
+    def __init__(self):
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.llm_calls = 0
+        self.estimated = False
+        self._prompt_chars = 0
+        self._streamed_tokens = 0
+
+    async def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        self._prompt_chars = sum(len(str(m.content)) for batch in messages for m in batch)
+        self._streamed_tokens = 0
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        self._streamed_tokens += 1
+
+    async def on_llm_end(self, response, **kwargs) -> None:
+        self.llm_calls += 1
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        if usage:
+            self.prompt_tokens += usage.get("prompt_tokens", 0)
+            self.completion_tokens += usage.get("completion_tokens", 0)
+        elif self._streamed_tokens:
+            self.estimated = True
+            self.prompt_tokens += self._prompt_chars // 4
+            self.completion_tokens += self._streamed_tokens
+
+
+class ModelRouter:
+    """
+    Chooses the LLM for each turn from cheap signals (message length,
+    previous intent, likely tool use) and records per-model latency and cost
+    """
+
+    def __init__(self, history_size: int = 200):
+        self.recent_decisions: deque = deque(maxlen=history_size)
+        self.tier_counts: Dict[str, int] = {}
+        self.model_stats: Dict[str, Dict] = {}
+
+    @staticmethod
+    def _normalize(message: str) -> str:
+        return re.sub(r"[^\w\s@.]", "", message.lower()).strip()
+
+    def _tools_likely(self, message: str) -> bool:
+        """Guess whether the agent will need tools to answer this message"""
+        text = self._normalize(message)
+        if EMAIL_PATTERN.search(message) or TIME_PATTERN.search(message):
+            return True
+        return any(keyword in text for keyword in BOOKING_KEYWORDS + INFO_KEYWORDS)
+
+    def _is_trivial(self, message: str) -> bool:
+        text = self._normalize(message)
+        if text in TRIVIAL_MESSAGES:
+            return True
+        return len(message) <= settings.router_trivial_max_chars and not self._tools_likely(message)
+
+    def is_booking_flow(self, message: str) -> bool:
+        """Message looks like part of booking a trial (email, time or booking words)"""
+        text = self._normalize(message)
+        if EMAIL_PATTERN.search(message) or TIME_PATTERN.search(message):
+            return True
+        return any(keyword in text for keyword in BOOKING_KEYWORDS)
+
+    def route(
+        self,
+        user_message: str,
+        last_intent: str = "unknown",
+        over_budget: bool = False
+    ) -> RouteDecision:
+        """
+        Pick the model for the main agent on this turn
+
+        Args:
+            user_message: The latest message from user
+            last_intent: Intent level recorded on the previous turn
+            over_budget: Session has exceeded its token/cost budget
+
+        Returns:
+            RouteDecision with the chosen model and the signals used
+        """
+        message_length = len(user_message)
+        tools_likely = self._tools_likely(user_message)
+
+        if over_budget:
+            tier, model, reason = TIER_BUDGET, settings.budget_fallback_model, "session budget exceeded"
+        elif not settings.model_routing_enabled:
+            tier, model, reason = TIER_DEFAULT, settings.router_default_model, "routing disabled"
+        elif last_intent == "high" and self.is_booking_flow(user_message):
+            tier, model, reason = TIER_ESCALATION, settings.router_escalation_model, "high-intent booking flow"
+        elif self._is_trivial(user_message) and last_intent != "high":
+            tier, model, reason = TIER_FAST, settings.router_fast_model, "trivial turn"
+        else:
+            tier, model, reason = TIER_DEFAULT, settings.router_default_model, "standard turn"
+
+        decision = RouteDecision(
+            model=model,
+            tier=tier,
+            reason=reason,
+            message_length=message_length,
+            last_intent=last_intent,
+            tools_likely=tools_likely
+        )
+
+        self.recent_decisions.append(decision)
+        self.tier_counts[tier] = self.tier_counts.get(tier, 0) + 1
+        logger.debug("Model routed", extra={"tier": tier, "model": model, "reason": reason})
+
+        return decision
+
+    def route_classifier(self, user_message: str) -> str:
+        """Pick the model for the intent classifier; trivial messages use the fast model"""
+        if settings.model_routing_enabled and self._is_trivial(user_message):
+            return settings.intent_classifier_fast_model
+        return settings.intent_classifier_model
+
+    def estimate_cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        """Estimate USD cost of a call from the configured price table"""
+        prices = settings.model_prices_per_1k.get(model)
+        if not prices:
+            return 0.0
+        return (prompt_tokens / 1000) * prices.get("input", 0.0) + \
+            (completion_tokens / 1000) * prices.get("output", 0.0)
+
+    def record(
+        self,
+        model: str,
+        latency_seconds: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        component: Optional[str] = None
+    ) -> None:
+        """Record latency, tokens and estimated cost of a run
+        
+        When called while a chat turn is being processed, the usage is also
+        added to that turn under `component` (see usage_service).
+        """
+        stats = self.model_stats.setdefault(model, {
+            "calls": 0,
+            "total_latency_seconds": 0.0,
+            "prompt_tokens": 0,
+            "completion_tokens": 0,
+            "total_cost_usd": 0.0
+        })
+        stats["calls"] += 1
+        stats["total_latency_seconds"] += latency_seconds
+        stats["prompt_tokens"] += prompt_tokens
+        stats["completion_tokens"] += completion_tokens
+        cost = self.estimate_cost(model, prompt_tokens, completion_tokens)
+        stats["total_cost_usd"] += cost
+
+        turn = current_turn_usage.get()
+        if turn is not None and component:
+            turn.add(component, model, prompt_tokens, completion_tokens, cost)
+
+    def get_stats(self, recent: int = 20) -> Dict:
+        """Summary of routing decisions and per-model latency/cost"""
+        models = {}
+        for model, stats in self.model_stats.items():
+            calls = stats["calls"] or 1
+            models[model] = {
+                **stats,
+                "avg_latency_seconds": round(stats["total_latency_seconds"] / calls, 3),
+                "avg_cost_usd": round(stats["total_cost_usd"] / calls, 6)
+            }
+
+        decisions: List[Dict] = [asdict(d) for d in list(self.recent_decisions)[-recent:]]
+
+        return {
+            "routing_enabled": settings.model_routing_enabled,
+            "tier_counts": dict(self.tier_counts),
+            "models": models,
+            "recent_decisions": decisions
+        }
+
+# Singleton instance
+model_router = ModelRouter()
@@ -0,0 +1,117 @@
+from langchain_openai import ChatOpenAI
+from langchain.prompts import ChatPromptTemplate
+from langchain.schema import AgentAction, AIMessage
+from langchain.tools.render import format_tool_to_openai_tool
+from langchain_core.messages import ToolMessage
+from typing import Dict, List, Optional, Tuple
+import asyncio
+import json
+from app.utils.logger import get_logger, is_verbose
+
+logger = get_logger(__name__)
+
+MAX_ITERATIONS_MESSAGE = "Agent stopped due to iteration limit or time limit."
+
+
+class ParallelToolAgent:
+    """
+    Lean tool-calling loop using OpenAI parallel tool calls
+
+    Each iteration is one LLM call. Every tool call the model requests in that
+    response is executed concurrently with asyncio.gather and all observations
+    are fed back together, so a turn that needs gym info, availability and a
+    memory update takes one tool round instead of three.
+
+    Exposes the subset of the AgentExecutor interface the main agent uses:
+    ainvoke(inputs, config) -> {"output", "intermediate_steps"}.
+    """
+
+    def __init__(
+        self,
+        llm: ChatOpenAI,
+        tools: list,
+        prompt: ChatPromptTemplate,
+        max_iterations: int = 20,
+        verbose: bool = False
+    ):
+        self.tools = {tool.name: tool for tool in tools}
+        self.llm = llm.bind(tools=[format_tool_to_openai_tool(tool) for tool in tools])
+        self.prompt = prompt
+        self.max_iterations = max_iterations
+        self.verbose = verbose
+
+    @staticmethod
+    def _parse_arguments(raw: str):
+        """Tool arguments from a tool call; single-input tools use "__arg1" """
+        try:
+            arguments = json.loads(raw or "{}")
+        except ValueError:
+            return raw
+        if isinstance(arguments, dict) and "__arg1" in arguments:
+            return arguments["__arg1"]
+        return arguments
+
+    async def _run_tool(self, tool_call: Dict, callbacks: Optional[list]) -> Tuple[AgentAction, str]:
+        """Execute one requested tool call; errors become the observation"""
+        name = tool_call["function"]["name"]
+        tool_input = self._parse_arguments(tool_call["function"].get("arguments"))
+        action = AgentAction(tool=name, tool_input=tool_input, log=f"Invoking: `{name}` with `{tool_input}`")
+
+        tool = self.tools.get(name)
+        if tool is None:
+            return action, f"{name} is not a valid tool, try one of [{', '.join(self.tools)}]."
+
+        try:
+            observation = await tool.arun(tool_input, callbacks=callbacks)
+        except Exception as e:
+            observation = f"Error: {str(e)}"
+        return action, str(observation)
+
+    async def ainvoke(self, inputs: Dict, config: Optional[Dict] = None) -> Dict:
+        """
+        Run the tool-calling loop for one turn
+
+        Args:
+            inputs: Prompt variables (agent_scratchpad is managed here)
+            config: Runnable config; its callbacks are passed to LLM and tool runs
+
+        Returns:
+            Dictionary with "output", "intermediate_steps" and "iterations"
+        """
+        config = config or {}
+        callbacks = config.get("callbacks")
+        scratchpad: List = []
+        intermediate_steps: List[Tuple[AgentAction, str]] = []
+
+        for iteration in range(1, self.max_iterations + 1):
+            messages = self.prompt.format_messages(**inputs, agent_scratchpad=scratchpad)
+            response = await self.llm.ainvoke(messages, config=config)
+
+            # Streamed responses carry a chunk "index" that the API won't accept back
+            tool_calls = [
+                {"id": call["id"], "type": "function", "function": call["function"]}
+                for call in response.additional_kwargs.get("tool_calls") or []
+            ]
+            if not tool_calls:
+                return {
+                    "output": response.content,
+                    "intermediate_steps": intermediate_steps,
+                    "iterations": iteration
+                }
+
+            if self.verbose or is_verbose():
+                names = [call["function"]["name"] for call in tool_calls]
+                logger.info("Running tools", extra={"iteration": iteration, "tools": names, "force": True})
+
+            results = await asyncio.gather(*(self._run_tool(call, callbacks) for call in tool_calls))
+
+            scratchpad.append(AIMessage(content=response.content or "", additional_kwargs={"tool_calls": tool_calls}))
+            for call, (action, observation) in zip(tool_calls, results):
+                scratchpad.append(ToolMessage(content=observation, tool_call_id=call["id"]))
+                intermediate_steps.append((action, observation))
+
+        return {
+            "output": MAX_ITERATIONS_MESSAGE,
+            "intermediate_steps": intermediate_steps,
+            "iterations": self.max_iterations
+        }
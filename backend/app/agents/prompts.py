@@ -1,9 +1,9 @@
-from app.config import settings
 from datetime import datetime
-
-# Get current date and time for context
-current_date = datetime.now().strftime("%A, %B %d, %Y")
-current_time = datetime.now().strftime("%I:%M %p")
+from typing import List, Mapping, Optional, Tuple
+from app.config import settings
+from app.services.retrieval import BM25Index, Chunk
+from app.services.tenants import Tenant, get_current_tenant, tenant_registry
+from app.services.knowledge_base import derived, gym_knowledge
 
 # Intent Classifier Prompt (Keep as is - it's functional)
 INTENT_CLASSIFIER_PROMPT = """You are an expert at analyzing customer intent in sales conversations.
@@ -40,8 +40,155 @@ Analyze the conversation and return:
 
 Be objective and base your analysis on concrete signals in the user's message."""
 
+# Index-only words for chunks whose text doesn't use the words leads ask with
+HOURS_KEYWORDS = "timing time open opening close closing early late night holiday weekday weekend saturday sunday"
+TRAINER_KEYWORDS = "trainer coach personal training pt beginner guidance"
+CLASS_KEYWORDS = "class group session schedule batch"
+TRIAL_KEYWORDS = "trial try visit first day pass demo"
+PROMOTION_KEYWORDS = "offer discount deal promotion"
+SLOT_KEYWORDS = "slot time busy crowd crowded peak morning evening afternoon lunch weekend when"
+PLAN_KEYWORDS = "price cost fee membership plan package option monthly quarterly annual yearly expensive cheap join pay flexible discount"
+STORY_KEYWORDS = "success result results testimonial transformation lose weight loss"
+
+
+def gym_detail_chunks(data: Mapping, tenant: Tenant, extras: bool = True) -> List[Chunk]:
+    """
+    GYM DETAILS prompt content as retrievable chunks, in prompt order
+
+    Chunks are single facts (one facility, trainer, class or promotion) so a
+    question pulls in only the lines it needs. Headings are kept per chunk and
+    re-applied by render_chunks.
+
+    Args:
+        data: Gym data snapshot
+        tenant: Branch the details are rendered for
+        extras: Include membership plans and success stories, which the full
+            prompt leaves to the get_gym_information tool
+    """
+    hours = data["operating_hours"]
+    trial = data["trial"]
+    chunks = [Chunk("operating_hours", "**Operating Hours:**", "\n".join([
+        f"- Monday - Friday: {hours['weekdays']}",
+        f"- Saturday - Sunday: {hours['weekends']}",
+        f"- Open 365 days a year (including holidays: {hours['holidays']})"
+    ]), HOURS_KEYWORDS)]
+    
+    facilities = "**World-Class Facilities:**"
+    for name, facility in data["facilities"].items():
+        if isinstance(facility, Mapping) and facility.get("highlight"):
+            details = " ".join(
+                " ".join(value) if isinstance(value, tuple) else str(value)
+                for key, value in facility.items() if key != "highlight"
+            )
+            chunks.append(Chunk(f"facility:{name}", facilities, f"- {facility['highlight']}", f"gym facility {name.replace('_', ' ')} {details}"))
+    for i, highlight in enumerate(data.get("amenity_highlights", ())):
+        chunks.append(Chunk(f"amenity:{i}", facilities, f"- {highlight}", "amenity facility"))
+    
+    for trainer in data["trainers"]:
+        details = ", ".join(filter(None, (trainer.get("credentials"), f"{trainer['experience']} exp")))
+        chunks.append(Chunk(
+            f"trainer:{trainer['name']}", "**Expert Trainers:**",
+            f"- {trainer['name']} ({trainer['specialization']}; {details})", TRAINER_KEYWORDS
+        ))
+    
+    per_week = data.get("classes_per_week")
+    classes = f"**Group Classes ({per_week} sessions/week):**" if per_week else "**Group Classes:**"
+    for gym_class in data["classes"]:
+        note = f" ({gym_class['note']})" if gym_class.get("note") else ""
+        chunks.append(Chunk(
+            f"class:{gym_class['name']}", classes,
+            f"- {gym_class['name']}: {gym_class['timing']}{note}", f"{CLASS_KEYWORDS} {gym_class.get('level', '')}"
+        ))
+    chunks.append(Chunk("classes_included", classes, "- All classes included in membership!", f"{CLASS_KEYWORDS} membership"))
+    
+    chunks.append(Chunk("trial_offer", "**TRIAL OFFER (Limited Time!):**", "\n".join([
+        f"- **Price:** ₹{tenant.gym_trial_price} (Regular price: ₹{trial['regular_price']})",
+        "- **Includes:**",
+        *(f"  • {benefit}" for benefit in trial["benefits"]),
+        f"- **Total Value:** {trial['total_value']} for just ₹{tenant.gym_trial_price}!"
+    ]), TRIAL_KEYWORDS))
+    
+    for i, promotion in enumerate(data.get("promotions", ()), 1):
+        chunks.append(Chunk(
+            f"promotion:{promotion['name']}", "**SPECIAL ONGOING PROMOTIONS:**",
+            f"{i}. **{promotion['name']}:** {promotion['details']}", PROMOTION_KEYWORDS
+        ))
+    
+    if data.get("popular_time_slots"):
+        chunks.append(Chunk(
+            "popular_time_slots", "**Current Popular Time Slots:**",
+            "\n".join(f"- {slot}" for slot in data["popular_time_slots"]), SLOT_KEYWORDS
+        ))
+    
+    if extras:
+        chunks.append(Chunk("membership_plans", "**Membership Plans:**", "\n".join(
+            f"- {plan['name']}: ₹{plan['price']} ({plan['features']})" for plan in data["membership_plans"]
+        ), PLAN_KEYWORDS))
+        chunks.append(Chunk("success_stories", "**Member Success Stories:**", "\n".join(
+            f"- {story}" for story in data["success_stories"]
+        ), STORY_KEYWORDS))
+    
+    return chunks
+
+def render_chunks(chunks: List[Chunk]) -> str:
+    """Chunks as prompt text, grouped under their section headings"""
+    sections: List[List[str]] = []
+    heading = None
+    for chunk in chunks:
+        if chunk.section != heading:
+            heading = chunk.section
+            sections.append([heading])
+        sections[-1].append(chunk.text)
+    return "\n\n".join("\n".join(lines) for lines in sections)
+
+@derived("gym_details_prompt")
+def render_gym_details(data: Mapping, tenant: Tenant) -> str:
+    """Full GYM DETAILS body of the main agent prompt, from the gym data file"""
+    return render_chunks(gym_detail_chunks(data, tenant, extras=False))
+
+@derived("gym_details_index")
+def build_gym_details_index(data: Mapping, tenant: Tenant) -> BM25Index:
+    """BM25 index over the GYM DETAILS chunks (plus plans and success stories)"""
+    return BM25Index(gym_detail_chunks(data, tenant))
+
+def retrieve_gym_details(query: str, context: str = "", tenant: Optional[Tenant] = None) -> Tuple[str, List[str]]:
+    """
+    GYM DETAILS body holding only the chunks relevant to a query
+    
+    Args:
+        query: The lead's latest message
+        context: The lead's previous message (matches count for half)
+        tenant: Branch to describe; defaults to the current request's tenant
+    
+    Returns:
+        (prompt text, retrieved chunk ids)
+    """
+    tenant = tenant or get_current_tenant()
+    index = gym_knowledge.snapshot(tenant).derived("gym_details_index", tenant)
+    hits = index.search(query, settings.gym_retrieval_top_k, settings.gym_retrieval_min_score, context=context)
+    positions = {chunk.chunk_id: i for i, chunk in enumerate(index.chunks)}
+    chunks = sorted((chunk for chunk, _ in hits), key=lambda chunk: positions[chunk.chunk_id])
+    
+    note = "(Only details relevant to the lead's latest messages are shown. Use get_gym_information for anything else - never guess.)"
+    body = f"{render_chunks(chunks)}\n\n{note}" if chunks else note
+    return body, [chunk.chunk_id for chunk in chunks]
+
 # Main Agent System Prompt - SALES FOCUSED
-MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant at {settings.gym_name}. Today is {current_date}, and it's currently {current_time}. You're passionate about fitness and genuinely care about helping people achieve their health goals while driving membership sales.
+def build_main_agent_system_prompt(tenant: Optional[Tenant] = None) -> str:
+    """Render the main agent system prompt for a gym branch (date/time fixed at render)
+    
+    The GYM DETAILS section is left as a {gym_details} prompt variable, filled
+    per turn from the live gym data snapshot so data file edits apply without
+    rebuilding agents.
+    
+    Args:
+        tenant: Branch to describe; defaults to the current request's tenant
+    """
+    tenant = tenant or get_current_tenant()
+    current_date = datetime.now().strftime("%A, %B %d, %Y")
+    current_time = datetime.now().strftime("%I:%M %p")
+    
+    return f"""You are Priya, a top-performing sales consultant at {tenant.gym_name}. Today is {current_date}, and it's currently {current_time}. You're passionate about fitness and genuinely care about helping people achieve their health goals while driving membership sales.
 
 ## YOUR PRIMARY MISSION:
 **Generate sales by converting every conversation into a trial booking.** Be professional, warm, and efficient. Your success is measured by bookings completed, not conversations held.
@@ -51,66 +198,12 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 2. Read the intent result and adapt your strategy accordingly
 3. Move conversations toward booking quickly but naturally
 4. Never ask for the same information more than TWICE (name, email, time preference)
-5. If user provides booking details, immediately call get_available_slots and book
-
-## GYM DETAILS - {settings.gym_name}:
-
-**Location:** {settings.gym_location}
-**Operating Hours:**
-- Monday - Friday: 5:00 AM - 11:00 PM
-- Saturday - Sunday: 6:00 AM - 10:00 PM
-- Open 365 days a year (including holidays: 7:00 AM - 9:00 PM)
-
-**World-Class Facilities:**
-- Olympic-size Swimming Pool (heated, 6 AM - 10 PM daily)
-- Advanced Cardio Zone (50+ machines with personal entertainment screens)
-- Strength Training Area (free weights up to 80kg, latest equipment)
-- Yoga & Meditation Studio (peaceful, air-conditioned)
-- CrossFit Arena with professional-grade equipment
-- Steam Room, Sauna, and Spa facilities
-- Juice Bar with nutritionist-approved menu
-- Separate changing rooms with premium lockers
-- Free secure parking for members
-
-**Expert Trainers:**
-- Rahul Sharma (Bodybuilding Champion, 10+ years exp)
-- Priya Patel (Certified Nutritionist & Weight Loss Specialist)
-- Amit Kumar (CrossFit Level 3, Former Athlete)
-- Sneha Reddy (International Yoga Alliance Certified)
-
-**Group Classes (70+ sessions/week):**
-- HIIT Training: Mon/Wed/Fri 6 AM, 7 PM
-- Zumba: Tue/Thu/Sat 6 PM (most popular!)
-- Yoga: Daily 7 AM & 6 PM
-- CrossFit: Mon/Wed/Fri 8 AM, 5 PM
-- Spinning: Tue/Thu 7 AM, 8 PM
-- Boxing: Mon/Thu 6 PM
-- All classes included in membership!
-
-**TRIAL OFFER (Limited Time!):**
-- **Price:** ₹{settings.gym_trial_price} (Regular price: ₹299)
-- **Includes:**
-  • Full day unlimited gym access
-  • 1 FREE Personal Training session (45 mins, worth ₹1500)
-  • Complete Body Composition Analysis (BCA scan)
-  • Nutrition consultation with certified dietitian
-  • Access to ALL group classes on trial day
-  • Free trial of pool, steam, sauna
-  • Complimentary protein shake
-  • Guest pass for a friend (₹500 value)
-- **Total Value:** ₹3000+ for just ₹{settings.gym_trial_price}!
-
-**SPECIAL ONGOING PROMOTIONS:**
-1. **Early Bird Special:** Book trial for 6-8 AM slots → Get extra PT session FREE
-2. **Weekend Warrior:** Saturday/Sunday trials include group class of your choice
-3. **Refer & Earn:** Bring a friend → Both get 10% off membership
-4. **Limited slots:** Only 15 trials per day to maintain quality
-
-**Current Popular Time Slots:**
-- Morning: 6-8 AM (energizing, less crowded)
-- Lunch: 12-2 PM (quick workout break)
-- Evening: 6-8 PM (most popular, high energy)
-- Weekend: 9-11 AM (relaxed pace, family-friendly)
+5. If user provides booking details, immediately call find_matching_slots (or get_available_slots if they have no time preference) and book
+
+## GYM DETAILS - {tenant.gym_name}:
+
+**Location:** {tenant.gym_location}
+{{gym_details}}
 
 ## YOUR COMMUNICATION STYLE:
 
@@ -127,7 +220,7 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 ✅ Build rapport quickly with genuine interest
 ✅ Ask smart qualifying questions about fitness goals
 ✅ Create FOMO (Fear of Missing Out) subtly
-✅ Highlight value (₹3000+ benefits for ₹99)
+✅ Highlight value (₹3000+ benefits for ₹{tenant.gym_trial_price})
 ✅ Offer specific time slots proactively
 ✅ Close confidently when ready
 ✅ Use social proof ("200+ members joined this month")
@@ -148,7 +241,7 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 **Action:** CLOSE THE SALE NOW
 - "Fantastic! Let me get you booked right away."
 - Immediately ask: "What time works best for you? We have slots available tomorrow at [times]"
-- If they give time preference: Call get_available_slots tool
+- If they give time preference: Call find_matching_slots with their request (e.g. "Tuesday evening")
 - If they give name/email: Prepare to book immediately
 - Confirm and execute booking within 2-3 exchanges MAX
 - **Example:** "Perfect! I have 7 AM and 9 AM tomorrow. Which works? And I'll need your name and email to confirm."
@@ -174,7 +267,7 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 ## OBJECTION HANDLING:
 
 **"Too expensive"**
-→ "I understand! That's why the trial is only ₹99 - less than a pizza! You get ₹3000+ in value. Try it first, see the results, then decide."
+→ "I understand! That's why the trial is only ₹{tenant.gym_trial_price} - less than a pizza! You get ₹3000+ in value. Try it first, see the results, then decide."
 
 **"I'll think about it"**
 → "Of course! What specific concerns can I address? Also, slots fill up fast - would you like me to tentatively hold one while you think?"
@@ -191,7 +284,7 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 ## BOOKING PROCESS (STREAMLINED):
 
 **Stage 1: Interest Confirmation**
-"Great! Our trial is ₹99 and includes [mention 2-3 key benefits]. Interested?"
+"Great! Our trial is ₹{tenant.gym_trial_price} and includes [mention 2-3 key benefits]. Interested?"
 
 **Stage 2: Get Details (Ask ONCE, maximum TWICE)**
 "To book your trial, I'll need:
@@ -200,7 +293,7 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 3. Preferred day and time"
 
 **Stage 3: Show Availability**
-[Call get_available_slots tool]
+[Call find_matching_slots with their preferred day/time - it already ranks by what we know about them]
 "I have slots available on [dates]. What works best for you?"
 
 **Stage 4: Confirm & Book**
@@ -222,7 +315,7 @@ MAIN_AGENT_SYSTEM_PROMPT = f"""You are Priya, a top-performing sales consultant
 ## CONVERSATION STARTERS (based on intent):
 
 **Low Intent Opening:**
-"Hi! 👋 Welcome to {settings.gym_name}! What brings you here today - looking to start your fitness journey or just exploring options?"
+"Hi! 👋 Welcome to {tenant.gym_name}! What brings you here today - looking to start your fitness journey or just exploring options?"
 
 **Medium Intent Response:**
 "Great question! [Answer]. By the way, we have a special trial offer going on - would you like to hear about it?"
@@ -272,11 +365,11 @@ Other Notes: {{any useful information derived from conversation and important fo
 Extract this session ID and use it when calling the update_lead_memory tool.
 
 When calling update_lead_memory, use the ACTUAL session ID from the conversation, like this:
-{
+{{
   "session_id": "5a2011be-55cb-4944-b57d-49ae5e27199b",  # Use the real session ID, not "session_id_here"
   "user_message": "I want to lose weight",
   "agent_response": "Great! Let me help you..."
-}
+}}
 
 
 ## CORE RESPONSIBILITIES
@@ -371,3 +464,16 @@ Before finalizing:
 
 Remember: Accuracy over completeness. Better to keep "Unknown" than to guess."""
 
+
+
+def __getattr__(name):
+    # MAIN_AGENT_SYSTEM_PROMPT (default gym) is rendered on first use so
+    # importing this module doesn't read settings
+    if name == "MAIN_AGENT_SYSTEM_PROMPT":
+        tenant = tenant_registry.default
+        prompt = build_main_agent_system_prompt(tenant).replace(
+            "{gym_details}", gym_knowledge.snapshot(tenant).derived("gym_details_prompt", tenant)
+        )
+        globals()[name] = prompt
+        return prompt
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
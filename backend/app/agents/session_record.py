@@ -0,0 +1,70 @@
+from langchain.schema import HumanMessage, AIMessage
+from typing import Iterator, List, Optional, Tuple
+import sys
+
+# Roles are interned so every session shares the same two string objects
+ROLE_USER = sys.intern("user")
+ROLE_AGENT = sys.intern("agent")
+_ROLES = (ROLE_USER, ROLE_AGENT)
+_ROLE_CODES = {ROLE_USER: 0, ROLE_AGENT: 1}
+
+
+class SessionRecord:
+    """
+    Compact in-process state for one conversation
+
+    Chat history is stored as a bytearray of role codes plus a list of plain
+    strings instead of LangChain message objects; messages are only built when
+    the agent executor needs them (see to_messages).
+    """
+
+    __slots__ = ("roles", "texts", "last_intent", "message_count", "_user_info")
+
+    MAX_MESSAGES = 10  # Keep only the last 5 exchanges
+
+    def __init__(self):
+        self.roles = bytearray()
+        self.texts: List[str] = []
+        self.last_intent = "unknown"
+        self.message_count = 0
+        self._user_info: Optional[dict] = None
+
+    def __len__(self) -> int:
+        return len(self.texts)
+
+    @property
+    def user_info(self) -> dict:
+        """Extra details about the user, allocated on first use"""
+        if self._user_info is None:
+            self._user_info = {}
+        return self._user_info
+
+    def set_intent(self, intent_level: str) -> None:
+        self.last_intent = sys.intern(intent_level)
+
+    def append(self, role: str, text: str) -> None:
+        """Append a message and drop the oldest ones beyond MAX_MESSAGES"""
+        self.roles.append(_ROLE_CODES[role])
+        self.texts.append(text)
+
+        overflow = len(self.texts) - self.MAX_MESSAGES
+        if overflow > 0:
+            del self.roles[:overflow]
+            del self.texts[:overflow]
+
+    def add_exchange(self, user_message: str, agent_response: str) -> None:
+        self.append(ROLE_USER, user_message)
+        self.append(ROLE_AGENT, agent_response)
+
+    def iter_messages(self, last: Optional[int] = None) -> Iterator[Tuple[str, str]]:
+        """Yield (role, text) pairs, optionally only the last `last` messages"""
+        start = 0 if last is None else max(0, len(self.texts) - last)
+        for i in range(start, len(self.texts)):
+            yield _ROLES[self.roles[i]], self.texts[i]
+
+    def to_messages(self) -> list:
+        """Build LangChain messages for the agent executor"""
+        return [
+            HumanMessage(content=text) if role is ROLE_USER else AIMessage(content=text)
+            for role, text in self.iter_messages()
+        ]
@@ -1,30 +1,161 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Optional, Dict, List
+from app.utils.helpers import LazySingleton
 
 class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
     
+    # Agent engine: "functions" (LangChain AgentExecutor, one tool per step)
+    # or "parallel_tools" (native loop running parallel tool calls concurrently)
+    agent_engine: str = "functions"
+    
+    # Model routing
+    model_routing_enabled: bool = True
+    router_fast_model: str = "gpt-4o-mini"
+    router_default_model: str = "gpt-4o-mini"
+    router_escalation_model: str = "gpt-4o"
+    router_trivial_max_chars: int = 40
+    intent_classifier_model: str = "gpt-5.1"
+    intent_classifier_fast_model: str = "gpt-4o-mini"
+    # USD per 1K tokens: {"model": {"input": x, "output": y}}
+    model_prices_per_1k: Dict[str, Dict[str, float]] = {
+        "gpt-4o-mini": {"input": 0.00015, "output": 0.0006},
+        "gpt-4o": {"input": 0.0025, "output": 0.01},
+        "gpt-5.1": {"input": 0.00125, "output": 0.01}
+    }
+    
+    # Per-session budgets (0 = unlimited). Once exceeded, turns use the
+    # fallback model and the optional tools below are removed from the agent.
+    session_token_budget: int = 0
+    session_cost_budget_usd: float = 0.0
+    budget_fallback_model: str = "gpt-4o-mini"
+    budget_disabled_tools: List[str] = ["classify_user_intent"]
+    usage_totals_cache_size: int = 10000  # Sessions whose totals are cached per process
+    usage_totals_cache_seconds: float = 30.0  # Spend recorded by other processes shows up within this
+    
     # Calendly
     calendly_api_token: str
     calendly_event_type_uri: str
+    availability_cache_seconds: int = 60  # How long the slot index is reused
+    calendly_webhook_signing_key: Optional[str] = None
+    calendly_webhook_tolerance_seconds: int = 180
+    
+    # Local booking/availability mirror (fed by webhooks + periodic sync)
+    availability_mirror_enabled: bool = True
+    availability_mirror_days: int = 7
+    availability_mirror_sync_seconds: int = 300
+    availability_mirror_max_age_seconds: int = 900  # Older mirrors fall back to live calls
     
     # MongoDB
     mongodb_url: str
     mongodb_database: str = "gym_sales_db"  
+    memory_change_stream_enabled: bool = True
+    mongodb_min_pool_size: int = 2
+    mongodb_write_timeout_seconds: float = 3.0  # Slower memory writes go to the WAL
+    mongodb_read_timeout_seconds: float = 1.0  # Slower lead reads count as MongoDB unavailable
+    mongodb_server_selection_timeout_ms: int = 2000  # Give up finding a reachable server after this
+    
+    # Memory write-ahead log (used while MongoDB is slow or down)
+    memory_wal_enabled: bool = True
+    memory_wal_path: str = "wal/memory.jsonl"
+    memory_wal_fsync: bool = False  # fsync every append (survives OS crashes, slower)
+    memory_wal_replay_seconds: int = 5
+    memory_wal_batch_size: int = 500
+    
+    # Chat transcripts (chat history survives restarts; sessions are rebuilt on their next message)
+    transcripts_enabled: bool = True
+    transcript_max_messages: int = 200  # Per session; older messages are dropped
+    transcript_flush_seconds: float = 1.0  # Queued messages are written at least this often
+    transcript_batch_size: int = 500  # Operations per bulk write
+    transcript_max_buffered: int = 20000  # Unwritten messages kept while MongoDB is down
+    transcript_load_timeout_seconds: float = 0.5  # Give up rebuilding a session (it starts empty) after this
+    
+    # Live updates (SSE / WebSocket subscribers)
+    event_subscriber_queue_size: int = 100
+    event_keepalive_seconds: int = 15
+    
+    # Admission control (per worker process)
+    admission_enabled: bool = True
+    admission_max_inflight: int = 8  # Concurrent agent runs
+    admission_max_queue: int = 32  # Requests allowed to wait for a run slot
+    admission_queue_timeout_seconds: float = 10.0  # Longest wait before a 503
+    admission_priority_enabled: bool = True  # Serve high-intent leads first (FIFO when off)
+    admission_priority_aging_seconds: float = 3.0  # Head start per priority class
+    
+    # Batch chat (/chat/batch, for channel gateways)
+    chat_batch_max_messages: int = 500
+    chat_batch_concurrency: int = 4  # Sessions of one batch run at once (admission control still applies)
+    
+    # Queue worker mode (python -m app.worker)
+    worker_queue_backend: str = "redis"  # "redis" (Redis Streams) or "sqlite" (local stand-in)
+    worker_redis_url: str = "redis://localhost:6379/0"
+    worker_sqlite_path: str = "queue/messages.db"
+    worker_stream_prefix: str = "gym-agent"
+    worker_group: str = "agents"
+    worker_shards: int = 16  # Inbound streams (producers must agree); caps the useful worker processes
+    worker_concurrency: int = 8  # Turns run at once per process
+    worker_max_inflight: int = 32  # Messages read but not finished per process
+    worker_block_ms: int = 1000  # Longest wait for new messages per read
+    worker_max_attempts: int = 3  # Tries to set up a turn (build the agent); a turn that ran is never retried
+    worker_retry_backoff_seconds: float = 1.0  # Doubles after each failed try
+    worker_max_deliveries: int = 5  # A message redelivered more often (it keeps crashing workers) is dead-lettered
+    worker_claim_idle_seconds: int = 120  # Unacknowledged this long = its consumer died, another one takes it
+    worker_stream_maxlen: int = 100000  # Outbound and dead-letter streams are trimmed to about this
+    
+    # WebSocket chat
+    ws_heartbeat_seconds: int = 20
+    ws_send_queue_size: int = 256
+    ws_max_pending_messages: int = 5
     
     # Gym Info
     gym_name: str = "FitLife Gym"
     gym_trial_price: int = 99
     gym_facilities: str = "Swimming Pool, Cardio Zone, Weight Training, Yoga Studio"
     gym_location: str = "123 Fitness Street, Mumbai"
+    gym_timezone: str = "Asia/Kolkata"
+    gym_info_file: str = "data/gym_info.json"  # Facilities, classes, trainers... (relative to backend/)
+    gym_info_reload_seconds: int = 5  # How often the file is checked for changes (0 = never)
+    gym_retrieval_enabled: bool = True  # Prompt gets only the gym details relevant to the turn (False = all of them)
+    gym_retrieval_top_k: int = 4  # Most gym detail chunks injected per turn
+    gym_retrieval_min_score: float = 1.5  # BM25 score below which a chunk isn't injected
+    
+    # Multi-gym tenancy: the gym above is the default tenant; other branches
+    # come from a JSON file of tenant id -> overrides (see TenantRegistry)
+    default_tenant_id: str = "default"
+    tenants_file: Optional[str] = None
+    tenant_agent_cache_size: int = 64  # Tenants whose agents stay built (~60 KB each)
+    
+    # Logging (structured, written by a background thread)
+    log_level: str = "INFO"
+    log_format: str = "json"  # "json" or "text"
+    log_sample_rate: float = 1.0  # Share of sessions whose DEBUG/INFO records are kept
+    log_queue_size: int = 10000  # Records waiting to be written; more are dropped
+    agent_verbose: bool = False  # Log every agent step, tool result and LLM call
+    allow_verbose_requests: bool = False  # "X-Agent-Verbose: 1" plus a valid X-Profile-Token turns that on for one request
+    
+    # Per-request profiling (needs pyinstrument; when disabled turns run untouched)
+    profiling_enabled: bool = False
+    profiling_admin_token: Optional[str] = None  # "X-Profile-Token: <token>" profiles a request and authorizes /profiles
+    profiling_sample_rate: float = 0.0  # Share of turns profiled without the header
+    profiling_interval_ms: float = 1.0  # Stack sampling interval
+    profiling_format: str = "speedscope"  # "speedscope" (speedscope.app) or "html" (pyinstrument's viewer)
+    profiling_dir: str = "profiles"
+    profiling_max_profiles: int = 50  # Oldest profiles are deleted beyond this
+    profiling_max_concurrent: int = 2  # Turns profiled at once; more run unprofiled
     
     # Server
     host: str = "0.0.0.0"
     port: int = 8000
     
+    # Startup warm-up (runs after startup, /ready reports when it's done)
+    warmup_on_startup: bool = True
+    warmup_llm_connections: bool = True  # One 1-token completion per model
+    
     class Config:
         env_file = ".env"
         case_sensitive = False
+        protected_namespaces = ()  # model_routing_enabled, model_prices_per_1k
 
-settings = Settings()
\ No newline at end of file
+# Validated on first attribute access, not at import
+settings = LazySingleton(Settings)
\ No newline at end of file
@@ -0,0 +1,330 @@
+"""
+Backfill user_memories from historical WhatsApp transcripts
+
+Usage:
+    python -m app.jobs.backfill_transcripts ./transcripts --agent-name "FitLife Gym"
+
+Input (files are streamed, never loaded all at once):
+- *.txt   WhatsApp "Export chat" files, one lead per file. Lines from
+          --agent-name are the gym's side, everything else is the lead.
+- *.jsonl one transcript per line:
+          {"session_id": "...", "messages": [{"role": "user"|"agent", "text": "..."}]}
+
+Each transcript is replayed exchange by exchange through
+MemoryManagerAgent.generate_memory, with --concurrency transcripts in flight and
+LLM calls capped at --rate per second. Finished memories are written with
+bulk upserts every --batch-size transcripts, and their ids are appended to
+--checkpoint so a rerun skips them. A transcript whose memory update fails is
+counted as failed and left out of the checkpoint, so the next run retries it.
+A failed bulk write keeps its memories for the next write; whatever is still
+unwritten at the end is reported and, like failed transcripts, makes the job
+exit with status 1.
+
+Leads that already have a memory document (they chatted with the live agent,
+or an earlier run wrote them without checkpointing) are skipped, since the
+rebuilt memory would replace their booking_status and last_intent. With
+--merge-existing the transcript is replayed on top of the stored memory instead.
+"""
+import argparse
+import asyncio
+import json
+import re
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from app.agents.memory_manager import memory_manager
+from app.services.mongodb_service import mongodb_service
+from app.utils.helpers import AsyncRateLimiter
+
+# "12/01/2024, 10:15 - Name: text" or "[12/01/24, 10:15:02 AM] Name: text"
+WHATSAPP_LINE = re.compile(
+    r"^\[?(\d{1,2}/\d{1,2}/\d{2,4}),?\s+(\d{1,2}:\d{2}(?::\d{2})?(?:\s?[APap][Mm])?)\]?\s*-?\s*([^:]+?):\s(.*)$"
+)
+HISTORY_LINES = 6
+
+
+@dataclass
+class Transcript:
+    """A historical conversation as (role, text) messages"""
+    session_id: str
+    messages: List[Tuple[str, str]] = field(default_factory=list)
+
+    def exchanges(self) -> Iterator[Tuple[str, str]]:
+        """Group messages into (user_message, agent_response) pairs"""
+        user_parts: List[str] = []
+        agent_parts: List[str] = []
+
+        for role, text in self.messages:
+            if role == "user":
+                if agent_parts:
+                    # Agent messages before the lead's first message carry no lead info
+                    if user_parts:
+                        yield "\n".join(user_parts), "\n".join(agent_parts)
+                    user_parts, agent_parts = [], []
+                user_parts.append(text)
+            else:
+                agent_parts.append(text)
+
+        if user_parts:
+            yield "\n".join(user_parts), "\n".join(agent_parts)
+
+
+def parse_whatsapp_export(path: Path, agent_name: str) -> Transcript:
+    """Parse a WhatsApp chat export; continuation lines join the previous message"""
+    transcript = Transcript(session_id=f"backfill-{path.stem}")
+    agent_name = agent_name.strip().lower()
+
+    with path.open(encoding="utf-8", errors="replace") as f:
+        for raw_line in f:
+            line = raw_line.rstrip("\n").lstrip("\ufeff\u200e")
+            match = WHATSAPP_LINE.match(line)
+            if match:
+                sender, text = match.group(3).strip(), match.group(4).strip()
+                if text == "<Media omitted>":
+                    continue
+                role = "agent" if sender.lower() == agent_name else "user"
+                transcript.messages.append((role, text))
+            elif transcript.messages and line.strip():
+                role, text = transcript.messages[-1]
+                transcript.messages[-1] = (role, f"{text}\n{line.strip()}")
+
+    return transcript
+
+
+def iter_jsonl_transcripts(path: Path) -> Iterator[Transcript]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            data = json.loads(line)
+            yield Transcript(
+                session_id=str(data["session_id"]),
+                messages=[
+                    ("agent" if m.get("role") in ("agent", "assistant") else "user", m.get("text", ""))
+                    for m in data.get("messages", [])
+                ]
+            )
+
+
+def iter_transcripts(source: Path, agent_name: str) -> Iterator[Transcript]:
+    """Lazily yield transcripts from a file or directory"""
+    paths = sorted(source.rglob("*")) if source.is_dir() else [source]
+    for path in paths:
+        if path.suffix == ".txt":
+            yield parse_whatsapp_export(path, agent_name)
+        elif path.suffix == ".jsonl":
+            yield from iter_jsonl_transcripts(path)
+
+
+class BackfillPipeline:
+    """
+    Bounded-concurrency pipeline: reader -> memory manager workers -> bulk writer
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 8,
+        rate_per_second: float = 5.0,
+        batch_size: int = 100,
+        checkpoint: Optional[Path] = None,
+        dry_run: bool = False,
+        merge_existing: bool = False
+    ):
+        self.concurrency = concurrency
+        self.rate_limiter = AsyncRateLimiter(rate_per_second, burst=concurrency)
+        self.batch_size = batch_size
+        self.checkpoint = checkpoint
+        self.dry_run = dry_run
+        self.merge_existing = merge_existing
+
+        self.done: Set[str] = set()
+        self.pending: Dict[str, Dict] = {}
+        self.write_lock = asyncio.Lock()
+
+        self.transcripts = 0
+        self.exchanges = 0
+        self.skipped = 0
+        self.failed = 0
+        self.write_errors = 0
+        self.written = 0
+        self.started_at = time.perf_counter()
+
+    def load_checkpoint(self) -> None:
+        if self.checkpoint and self.checkpoint.exists():
+            with self.checkpoint.open() as f:
+                self.done = {line.strip() for line in f if line.strip()}
+            print(f"[BACKFILL] Resuming - {len(self.done)} transcripts already done")
+
+    async def load_existing(self, session_id: str) -> Optional[Dict]:
+        """The lead's stored memory document, if it has one (never in a dry run)"""
+        if self.dry_run:
+            return None
+        return await mongodb_service.collection.find_one({"_id": session_id})
+
+    async def build_memory(self, transcript: Transcript, memory: Optional[Dict] = None) -> Dict:
+        """
+        Replay a transcript through the memory manager, one exchange at a time
+
+        Raises:
+            MemoryUpdateError: An exchange's memory update failed
+        """
+        memory = memory or mongodb_service.new_memory(transcript.session_id)
+        history: List[str] = []
+
+        for user_message, agent_response in transcript.exchanges():
+            await self.rate_limiter.acquire()
+            memory = await memory_manager.generate_memory(
+                current_memory=memory,
+                user_message=user_message,
+                agent_response=agent_response,
+                conversation_history="\n".join(history[-HISTORY_LINES:])
+            )
+            history.append(f"User: {user_message}")
+            if agent_response:
+                history.append(f"Agent: {agent_response}")
+            self.exchanges += 1
+
+        return memory
+
+    async def flush(self, force: bool = False) -> None:
+        """Bulk-upsert finished memories and record them in the checkpoint"""
+        async with self.write_lock:
+            if not self.pending or (not force and len(self.pending) < self.batch_size):
+                return
+
+            batch, self.pending = self.pending, {}
+            try:
+                if not self.dry_run:
+                    self.written += await mongodb_service.bulk_upsert_memories(batch)
+            except Exception:
+                # Keep the batch so the next flush retries it
+                self.pending.update(batch)
+                raise
+
+            if self.checkpoint and not self.dry_run:
+                with self.checkpoint.open("a") as f:
+                    f.writelines(f"{session_id}\n" for session_id in batch)
+            self.done.update(batch)
+
+    async def try_flush(self, force: bool = False) -> None:
+        """flush(), counting a failed bulk write instead of raising (its memories stay pending)"""
+        try:
+            await self.flush(force)
+        except Exception as e:
+            self.write_errors += 1
+            print(f"[BACKFILL ERROR] Bulk write of {len(self.pending)} memories failed: {str(e) or type(e).__name__}")
+
+    async def worker(self, queue: asyncio.Queue) -> None:
+        while True:
+            transcript = await queue.get()
+            try:
+                if transcript is None:
+                    return
+                try:
+                    existing = await self.load_existing(transcript.session_id)
+                    if existing and not self.merge_existing:
+                        self.skipped += 1
+                        continue
+                    memory = await self.build_memory(transcript, existing)
+                except Exception as e:
+                    self.failed += 1
+                    print(f"[BACKFILL ERROR] {transcript.session_id}: {str(e)}")
+                    continue
+                self.pending[transcript.session_id] = memory
+                self.transcripts += 1
+                await self.try_flush()
+            finally:
+                queue.task_done()
+
+    def report(self, final: bool = False) -> None:
+        elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+        label = "DONE" if final else "PROGRESS"
+        print(
+            f"[BACKFILL {label}] transcripts={self.transcripts} exchanges={self.exchanges} "
+            f"written={self.written} unwritten={len(self.pending)} skipped={self.skipped} "
+            f"failed={self.failed} write_errors={self.write_errors} | "
+            f"{self.transcripts / elapsed:.2f} transcripts/s, {self.exchanges / elapsed:.2f} LLM calls/s"
+        )
+
+    async def _report_periodically(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            self.report()
+
+    async def run(self, transcripts: Iterator[Transcript], report_interval: float = 30.0) -> None:
+        self.load_checkpoint()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [asyncio.create_task(self.worker(queue)) for _ in range(self.concurrency)]
+        reporter = asyncio.create_task(self._report_periodically(report_interval))
+
+        try:
+            for transcript in transcripts:
+                if transcript.session_id in self.done or not transcript.messages:
+                    self.skipped += 1
+                    continue
+                await queue.put(transcript)
+
+            for _ in workers:
+                await queue.put(None)
+            await asyncio.gather(*workers)
+            await self.try_flush(force=True)
+        finally:
+            reporter.cancel()
+            self.report(final=True)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill lead memories from historical transcripts")
+    parser.add_argument("source", help="Transcript file or directory")
+    parser.add_argument("--agent-name", default="", help="WhatsApp sender name used by the gym")
+    parser.add_argument("--concurrency", type=int, default=8, help="Transcripts processed in parallel")
+    parser.add_argument("--rate", type=float, default=5.0, help="Max memory-manager LLM calls per second")
+    parser.add_argument("--batch-size", type=int, default=100, help="Memories per bulk upsert")
+    parser.add_argument("--checkpoint", default="backfill.checkpoint", help="File of completed session ids")
+    parser.add_argument("--report-interval", type=float, default=30.0, help="Seconds between progress lines")
+    parser.add_argument("--dry-run", action="store_true", help="Run the memory manager but skip DB writes")
+    parser.add_argument(
+        "--merge-existing",
+        action="store_true",
+        help="Replay transcripts of leads that already have a memory on top of it (default: skip them)"
+    )
+    return parser.parse_args(argv)
+
+
+async def run_backfill(args) -> int:
+    source = Path(args.source)
+    if not source.exists():
+        print(f"[BACKFILL] Source not found: {source}", file=sys.stderr)
+        return 1
+
+    pipeline = BackfillPipeline(
+        concurrency=args.concurrency,
+        rate_per_second=args.rate,
+        batch_size=args.batch_size,
+        checkpoint=Path(args.checkpoint) if args.checkpoint else None,
+        dry_run=args.dry_run,
+        merge_existing=args.merge_existing
+    )
+
+    if not args.dry_run:
+        await mongodb_service.connect()
+    try:
+        await pipeline.run(iter_transcripts(source, args.agent_name), args.report_interval)
+    finally:
+        if not args.dry_run:
+            await mongodb_service.disconnect()
+
+    # Failed transcripts and memories no bulk write got through are retried by the next run
+    return 1 if pipeline.failed or pipeline.pending else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.exit(asyncio.run(run_backfill(args)))
+
+
+if __name__ == "__main__":
+    main()
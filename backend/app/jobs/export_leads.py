@@ -0,0 +1,89 @@
+"""
+Export every lead memory to NDJSON or CSV (optionally gzipped)
+
+Usage:
+    python -m app.jobs.export_leads --out leads.ndjson.gz --gzip
+    python -m app.jobs.export_leads --format csv --out leads.csv --since 2024-01-01 --intent high
+
+Pass --checkpoint to record the last exported session_id after every chunk.
+Re-running with the same checkpoint resumes after that lead and appends to --out
+(use a new --out file when resuming an interrupted gzip export).
+"""
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+from app.services.export_service import (
+    LeadExporter,
+    build_export_query,
+    EXPORT_FORMATS,
+    DEFAULT_BATCH_SIZE
+)
+from app.services.mongodb_service import mongodb_service
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Stream lead memories to NDJSON/CSV")
+    parser.add_argument("--out", required=True, help="Output file path ('-' for stdout)")
+    parser.add_argument("--format", choices=EXPORT_FORMATS, default="ndjson")
+    parser.add_argument("--gzip", action="store_true", help="Gzip the output")
+    parser.add_argument("--since", help="Only leads updated at or after this ISO timestamp")
+    parser.add_argument("--until", help="Only leads updated before this ISO timestamp")
+    parser.add_argument("--intent", help="Only leads with this last_intent")
+    parser.add_argument("--resume-after", help="Resume token: session_id of the last exported lead")
+    parser.add_argument("--checkpoint", help="File used to save/load the resume token")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    return parser.parse_args(argv)
+
+
+async def run_export(args) -> int:
+    resume_after = args.resume_after
+    checkpoint = Path(args.checkpoint) if args.checkpoint else None
+    if not resume_after and checkpoint and checkpoint.exists():
+        resume_after = checkpoint.read_text().strip() or None
+
+    await mongodb_service.connect()
+    exporter = LeadExporter(mongodb_service.collection, batch_size=args.batch_size)
+    query = build_export_query(args.since, args.until, args.intent, resume_after)
+
+    if resume_after:
+        print(f"[EXPORT] Resuming after session_id: {resume_after}", file=sys.stderr)
+
+    started = time.perf_counter()
+    mode = "ab" if resume_after else "wb"
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, mode)
+
+    try:
+        async for chunk in exporter.iter_bytes(
+            query,
+            args.format,
+            gzip=args.gzip,
+            header=not resume_after  # CSV header only on a fresh export
+        ):
+            out.write(chunk)
+            out.flush()
+            if checkpoint and exporter.last_id is not None:
+                checkpoint.write_text(str(exporter.last_id))
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+        await mongodb_service.disconnect()
+
+    elapsed = time.perf_counter() - started
+    print(
+        f"[EXPORT] {exporter.exported} leads in {elapsed:.1f}s "
+        f"(last session_id: {exporter.last_id})",
+        file=sys.stderr
+    )
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.exit(asyncio.run(run_export(args)))
+
+
+if __name__ == "__main__":
+    main()
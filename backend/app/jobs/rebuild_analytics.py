@@ -0,0 +1,48 @@
+"""
+Recount the "current" analytics snapshot from the stored lead memories
+
+Usage:
+    python -m app.jobs.rebuild_analytics
+
+The lead_analytics counters are kept up to date with $inc on every memory
+write and seeded from the existing leads the first time the app connects.
+Run this if they have drifted (for example, counters written before seeding
+existed) - it scans every tenant's memory collection once and replaces the
+"current" document. Per-day movement counters are not touched. The same
+recount is available at POST /analytics/rebuild.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+
+from app.services.analytics_service import analytics_service
+from app.services.mongodb_service import mongodb_service
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Recount the current lead funnel counters")
+    return parser.parse_args(argv)
+
+
+async def run_rebuild(args) -> int:
+    await mongodb_service.connect()
+    try:
+        started = time.perf_counter()
+        current = await analytics_service.rebuild(mongodb_service.memory_collections())
+        print(json.dumps(current, indent=2))
+        print(f"[ANALYTICS] Recounted {current['total_leads']} leads in {time.perf_counter() - started:.1f}s")
+    finally:
+        await mongodb_service.disconnect()
+
+    return 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.exit(asyncio.run(run_rebuild(args)))
+
+
+if __name__ == "__main__":
+    main()
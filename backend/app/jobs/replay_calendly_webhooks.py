@@ -0,0 +1,133 @@
+"""
+Replay Calendly webhooks against a local server
+
+Usage:
+    python -m app.jobs.replay_calendly_webhooks events.jsonl
+    python -m app.jobs.replay_calendly_webhooks --sample --start-time 2025-01-10T04:30:00Z
+    python -m app.jobs.replay_calendly_webhooks --sample --tamper
+
+Each line of the input file is one webhook body as Calendly sends it
+({"event": "invitee.created", "created_at": ..., "payload": {...}}). Bodies are
+signed with CALENDLY_WEBHOOK_SIGNING_KEY (or --signing-key) exactly like
+Calendly does and POSTed to --url in order. --sample generates a booking, a
+duplicate delivery of it and its cancellation for one slot instead of reading
+a file. --tamper corrupts every signature to check that the server rejects it.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import httpx
+
+from app.config import settings
+from app.services.booking_mirror import sign_payload, EVENT_CREATED, EVENT_CANCELED
+
+
+def sample_events(start_time: str, email: str = "replay.lead@example.com") -> List[Dict]:
+    """invitee.created, a duplicate delivery of it, then invitee.canceled for one slot"""
+    start = datetime.fromisoformat(start_time.replace("Z", "+00:00"))
+    end = start + timedelta(hours=1)
+    invitee_uri = f"https://api.calendly.com/scheduled_events/replay-{uuid.uuid4().hex[:8]}/invitees/replay"
+    now = datetime.utcnow()
+
+    def event(event_type: str, created_at: datetime, cancellation=None) -> Dict:
+        return {
+            "event": event_type,
+            "created_at": created_at.strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+            "payload": {
+                "uri": invitee_uri,
+                "email": email,
+                "name": "Replay Lead",
+                "status": "active" if event_type == EVENT_CREATED else "canceled",
+                "rescheduled": False,
+                "cancellation": cancellation,
+                "scheduled_event": {
+                    "uri": invitee_uri.rsplit("/invitees/", 1)[0],
+                    "event_type": settings.calendly_event_type_uri,
+                    "start_time": start.strftime("%Y-%m-%dT%H:%M:%S.000000Z"),
+                    "end_time": end.strftime("%Y-%m-%dT%H:%M:%S.000000Z")
+                }
+            }
+        }
+
+    created = event(EVENT_CREATED, now)
+    return [
+        created,
+        created,  # Calendly retries deliveries; the mirror must ignore the repeat
+        event(EVENT_CANCELED, now + timedelta(seconds=1), {"canceled_by": "Replay Lead", "reason": "replay"})
+    ]
+
+
+def iter_file_events(path: Path) -> Iterator[Dict]:
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+async def replay(events, url: str, signing_key: str, tamper: bool, delay: float) -> int:
+    """POST each event signed; returns the number of unexpected responses"""
+    failures = 0
+    async with httpx.AsyncClient(timeout=10.0) as client:
+        for i, event in enumerate(events, 1):
+            body = json.dumps(event).encode()
+            signature = sign_payload(body, signing_key)
+            if tamper:
+                signature = signature[:-4] + "0000"
+
+            response = await client.post(
+                url,
+                content=body,
+                headers={"Content-Type": "application/json", "Calendly-Webhook-Signature": signature}
+            )
+
+            expected = 401 if tamper else 200
+            ok = response.status_code == expected
+            failures += 0 if ok else 1
+            print(f"[REPLAY] #{i} {event.get('event')}: {response.status_code} {response.text[:200]}"
+                  f"{'' if ok else f'  (expected {expected})'}")
+
+            if delay:
+                await asyncio.sleep(delay)
+
+    return failures
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay signed Calendly webhooks")
+    parser.add_argument("file", nargs="?", help="JSONL file of webhook bodies")
+    parser.add_argument("--sample", action="store_true", help="Generate a created/duplicate/canceled sequence")
+    parser.add_argument("--start-time", help="Slot start for --sample (default: tomorrow 04:30 UTC)")
+    parser.add_argument("--url", default=f"http://localhost:{settings.port}/webhooks/calendly")
+    parser.add_argument("--signing-key", help="Defaults to CALENDLY_WEBHOOK_SIGNING_KEY")
+    parser.add_argument("--tamper", action="store_true", help="Send invalid signatures (expects 401)")
+    parser.add_argument("--delay", type=float, default=0.0, help="Seconds between deliveries")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    signing_key = args.signing_key or settings.calendly_webhook_signing_key
+    if not signing_key:
+        sys.exit("No signing key: set CALENDLY_WEBHOOK_SIGNING_KEY or pass --signing-key")
+
+    if args.sample:
+        start_time = args.start_time or (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%dT04:30:00Z")
+        events = sample_events(start_time)
+    elif args.file:
+        events = iter_file_events(Path(args.file))
+    else:
+        sys.exit("Pass a JSONL file or --sample")
+
+    failures = asyncio.run(replay(events, args.url, signing_key, args.tamper, args.delay))
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
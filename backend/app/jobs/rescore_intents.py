@@ -0,0 +1,253 @@
+"""
+Re-classify last_intent for every stored lead
+
+Usage:
+    python -m app.jobs.rescore_intents --dry-run
+    python -m app.jobs.rescore_intents --concurrency 10 --rate 4 --checkpoint rescore.checkpoint
+
+Pages through user_memories in _id order, rebuilds classifier input from each
+lead's stored memory, classifies a page at a time in parallel LLM calls under
+a rate budget and writes changed intents back with one bulk_write per page.
+The last processed session_id is saved to --checkpoint after every page, so a
+rerun continues where the previous one stopped (delete it to start a fresh
+pass). Leads whose classification failed are listed in "<checkpoint>.failed"
+and retried first by the next run; the job exits with status 1 while any are
+left. --dry-run skips writes and prints how the intent distribution would shift.
+
+A lead is only updated if its last_intent hasn't changed since its page was
+read (see MongoDBService.bulk_update_fields), so a live chat that moves a
+lead during a slow page wins over the rescore.
+"""
+import argparse
+import asyncio
+import sys
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+from app.services.mongodb_service import mongodb_service
+from app.tools.intent_classifier_tool import intent_classifier
+from app.utils.helpers import AsyncRateLimiter, normalize_intent, INTENT_LEVELS
+
+
+def build_classifier_input(memory: Dict) -> Tuple[str, str]:
+    """
+    Rebuild intent classifier input from a stored lead memory
+
+    Returns:
+        Tuple of (user_message, conversation_history)
+    """
+    profile = f"""Fitness Goals: {memory.get('fitness_goals', 'Unknown')}
+Past Experience: {memory.get('past_experience', 'Unknown')}
+Location: {memory.get('location_proximity', 'Unknown')}
+Joining Timeline: {memory.get('joining_timeline', 'Unknown')}
+Motivation: {memory.get('motivation', 'Unknown')}
+Preferred Time: {memory.get('preferred_time', 'Unknown')}
+Objections: {memory.get('objections', 'None')}
+Booking Status: {memory.get('booking_status', 'not_booked')}
+Messages Exchanged: {memory.get('total_messages', 0)}
+Notes: {memory.get('conversation_summary', 'None')}"""
+
+    user_message = (
+        "No verbatim message is available. Classify the lead's current intent "
+        "from everything they have told us so far (see lead profile above)."
+    )
+    return user_message, f"LEAD PROFILE:\n{profile}"
+
+
+class IntentRescorer:
+    """Pages through stored leads and re-classifies their intent"""
+
+    def __init__(
+        self,
+        page_size: int = 200,
+        concurrency: int = 10,
+        rate_per_second: float = 4.0,
+        model: Optional[str] = None,
+        checkpoint: Optional[Path] = None,
+        dry_run: bool = False
+    ):
+        self.page_size = page_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.rate_limiter = AsyncRateLimiter(rate_per_second, burst=concurrency)
+        self.model = model
+        self.checkpoint = checkpoint
+        self.dry_run = dry_run
+
+        self.before: Counter = Counter()
+        self.after: Counter = Counter()
+        self.transitions: Counter = Counter()
+        self.processed = 0
+        self.failed = 0
+        self.written = 0
+        self.conflicts = 0
+        self.failed_ids: Set[str] = set()
+        self.started_at = time.perf_counter()
+
+    def load_checkpoint(self) -> Optional[str]:
+        if self.checkpoint and self.checkpoint.exists():
+            last_id = self.checkpoint.read_text().strip() or None
+            if last_id:
+                print(f"[RESCORE] Resuming after session_id: {last_id}")
+            return last_id
+        return None
+
+    @property
+    def failed_path(self) -> Optional[Path]:
+        return self.checkpoint.with_name(self.checkpoint.name + ".failed") if self.checkpoint else None
+
+    def load_failed(self) -> None:
+        """Leads a previous run couldn't classify, retried before new pages"""
+        if self.failed_path and self.failed_path.exists():
+            self.failed_ids = {line.strip() for line in self.failed_path.read_text().splitlines() if line.strip()}
+            if self.failed_ids:
+                print(f"[RESCORE] Retrying {len(self.failed_ids)} leads that failed last time")
+
+    def save_failed(self) -> None:
+        if not self.failed_path or self.dry_run:
+            return
+        if self.failed_ids:
+            self.failed_path.write_text("".join(f"{session_id}\n" for session_id in sorted(self.failed_ids)))
+        else:
+            self.failed_path.unlink(missing_ok=True)
+
+    async def classify(self, memory: Dict) -> Optional[str]:
+        """Classify one lead; None when the classifier failed"""
+        user_message, history = build_classifier_input(memory)
+        async with self.semaphore:
+            await self.rate_limiter.acquire()
+            result = await intent_classifier.classify_intent(user_message, history, model=self.model)
+
+        # The classifier falls back to "medium" on errors - don't write that back
+        if "classification_error" in result.key_indicators:
+            return None
+        return result.intent_level
+
+    async def process_page(self, page: List[Dict]) -> None:
+        """Classify and write back a page; its failed leads are kept in failed_ids"""
+        results = await asyncio.gather(*(self.classify(memory) for memory in page))
+
+        updates: Dict[str, tuple] = {}
+        rescored_at = datetime.utcnow().isoformat()
+        for memory, new_intent in zip(page, results):
+            self.processed += 1
+            if new_intent is None:
+                self.failed += 1
+                self.failed_ids.add(memory["_id"])
+                continue
+            self.failed_ids.discard(memory["_id"])
+
+            old_intent = normalize_intent(memory.get("last_intent"))
+            self.before[old_intent] += 1
+            self.after[new_intent] += 1
+            self.transitions[(old_intent, new_intent)] += 1
+
+            if new_intent != old_intent:
+                updates[memory["_id"]] = (
+                    memory,
+                    {"last_intent": new_intent, "intent_rescored_at": rescored_at}
+                )
+
+        if updates and not self.dry_run:
+            written = await mongodb_service.bulk_update_fields(updates)
+            self.written += written
+            self.conflicts += len(updates) - written
+
+    async def retry_failed(self) -> None:
+        """Re-run the leads listed as failed, a page at a time"""
+        retry_ids = sorted(self.failed_ids)
+        for start in range(0, len(retry_ids), self.page_size):
+            ids = retry_ids[start:start + self.page_size]
+            page = await mongodb_service.collection.find({"_id": {"$in": ids}}).to_list(length=len(ids))
+            self.failed_ids.difference_update(set(ids) - {memory["_id"] for memory in page})  # Deleted since
+            await self.process_page(page)
+            self.save_failed()
+
+    async def run(self) -> None:
+        last_id = self.load_checkpoint()
+        self.load_failed()
+        await self.retry_failed()
+
+        while True:
+            query = {"_id": {"$gt": last_id}} if last_id else {}
+            page = await mongodb_service.collection.find(query).sort("_id", 1).to_list(length=self.page_size)
+            if not page:
+                break
+
+            await self.process_page(page)
+            last_id = page[-1]["_id"]
+            # Failed leads are saved first: the checkpoint moves past them
+            self.save_failed()
+            if self.checkpoint and not self.dry_run:
+                self.checkpoint.write_text(str(last_id))
+
+            elapsed = max(time.perf_counter() - self.started_at, 1e-9)
+            print(
+                f"[RESCORE] processed={self.processed} written={self.written} failed={self.failed} "
+                f"changed_meanwhile={self.conflicts} ({self.processed / elapsed:.2f} leads/s)"
+            )
+
+    def report(self) -> str:
+        """Distribution before/after plus the transition matrix"""
+        total = sum(self.before.values()) or 1
+        lines = ["", "INTENT DISTRIBUTION" + (" (dry run - nothing written)" if self.dry_run else "")]
+        lines.append(f"{'intent':<10}{'before':>10}{'after':>10}{'shift':>10}")
+        for level in INTENT_LEVELS:
+            before, after = self.before[level], self.after[level]
+            lines.append(f"{level:<10}{before:>10}{after:>10}{(after - before) / total:>+10.1%}")
+
+        changed = sum(count for (old, new), count in self.transitions.items() if old != new)
+        lines.append(f"\nChanged: {changed}/{total} ({changed / total:.1%}), classifier failures: {self.failed}")
+        if self.conflicts:
+            lines.append(f"Not written, changed by a live chat meanwhile: {self.conflicts}")
+        if self.failed_ids and self.failed_path and not self.dry_run:
+            lines.append(f"Left for the next run: {len(self.failed_ids)} (see {self.failed_path})")
+
+        lines.append("\nTRANSITIONS (rows: before, columns: after)")
+        lines.append(f"{'':<10}" + "".join(f"{level:>10}" for level in INTENT_LEVELS))
+        for old in INTENT_LEVELS:
+            lines.append(f"{old:<10}" + "".join(f"{self.transitions[(old, new)]:>10}" for new in INTENT_LEVELS))
+
+        return "\n".join(lines)
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Re-classify stored lead intents")
+    parser.add_argument("--page-size", type=int, default=200, help="Leads per page / bulk_write")
+    parser.add_argument("--concurrency", type=int, default=10, help="Parallel classifier calls")
+    parser.add_argument("--rate", type=float, default=4.0, help="Max classifier calls per second")
+    parser.add_argument("--model", help="Override the classifier model")
+    parser.add_argument("--checkpoint", default="rescore.checkpoint", help="File storing the last processed session_id")
+    parser.add_argument("--dry-run", action="store_true", help="Report the distribution shift without writing")
+    return parser.parse_args(argv)
+
+
+async def run_rescore(args) -> int:
+    rescorer = IntentRescorer(
+        page_size=args.page_size,
+        concurrency=args.concurrency,
+        rate_per_second=args.rate,
+        model=args.model,
+        checkpoint=Path(args.checkpoint) if args.checkpoint else None,
+        dry_run=args.dry_run
+    )
+
+    await mongodb_service.connect()
+    try:
+        await rescorer.run()
+    finally:
+        await mongodb_service.disconnect()
+        print(rescorer.report())
+
+    return 1 if rescorer.failed_ids and not args.dry_run else 0
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    sys.exit(asyncio.run(run_rescore(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,41 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse, PlainTextResponse
 import uvicorn
+import asyncio
+import json
+import time
 import uuid
 from pathlib import Path
+from typing import Optional
 
 from app.config import settings
-from app.models.schemas import ChatRequest, ChatResponse
-from app.agents.main_agent import main_agent
+from app.models.schemas import ChatRequest, ChatResponse, BatchChatRequest, FollowUpRequest
+from app.agents.main_agent import tenant_agents
+from app.agents.model_router import model_router
 from app.services.mongodb_service import mongodb_service
+from app.services.memory_wal import memory_wal
+from app.services.transcript_store import transcript_store
+from app.services.analytics_service import analytics_service
+from app.services.usage_service import usage_service
+from app.services.export_service import LeadExporter, build_export_query, EXPORT_FORMATS
+from app.services.event_bus import event_bus, ALL_LEADS, IGNORED_FIELDS
+from app.services.connection_manager import connection_manager, ChatConnection, TokenStreamHandler
+from app.services.calendly_service import calendly_service
+from app.services.booking_mirror import booking_mirror, verify_signature, WebhookSignatureError
+from app.services.availability_index import availability_indexes
+from app.services.admission import admission_controller, AdmissionRejected
+from app.services.chat_batch import run_chat_batch
+from app.services.metrics import metrics
+from app.services.tenants import TenantMiddleware, tenant_registry, get_current_tenant
+from app.services.knowledge_base import gym_knowledge
+from app.services.profiler import request_profiler, check_admin_token, ProfilingMiddleware, PROFILE_FORMATS, PROFILE_HEADER
+from app.utils.logger import setup_logging, shutdown_logging, get_logging_stats, get_logger, RequestContextMiddleware
+from app.agents.memory_manager import memory_manager
+from app.tools.intent_classifier_tool import intent_classifier
+
+logger = get_logger(__name__)
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -27,20 +53,135 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Gym branch per request: "/t/<tenant>/..." path prefix or X-Tenant-ID header
+app.add_middleware(TenantMiddleware)
+app.add_middleware(ProfilingMiddleware)  # X-Profile-Token header: profile this request's turns
+app.add_middleware(RequestContextMiddleware)  # Outermost: request ids cover tenant errors too
+
 # Mount frontend static files
 frontend_path = Path(__file__).parent.parent.parent / "frontend"
 if frontend_path.exists():
     app.mount("/static", StaticFiles(directory=str(frontend_path)), name="static")
 
+# Background tasks started with the app
+background_tasks = []
+
+# Set once warm-up has finished (or immediately when warm-up is disabled)
+readiness = {"ready": False, "warmup": {}}
+
+async def _ping_llm(llm) -> None:
+    """Open the HTTP connection behind an LLM client with a 1-token completion"""
+    await llm.bind(max_tokens=1).ainvoke("ping")
+
+async def warmup():
+    """
+    Build the agents and pre-open LLM, Calendly and MongoDB connections
+    
+    Runs in the background after startup so the server accepts connections
+    right away; /ready returns 503 until it completes.
+    """
+    started = time.perf_counter()
+    results = {}
+    
+    try:
+        # Construct the lazy singletons (LLM clients, agent executors)
+        agent = tenant_agents.get()
+        memory_manager.get_instance()
+        classifier = intent_classifier.get_instance()
+        results["agents_built_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        
+        checks = {
+            "calendly": calendly_service.warm_up(),
+            "mongodb": mongodb_service.client.admin.command("ping")
+        }
+        if settings.warmup_llm_connections:
+            checks["llm_agent"] = _ping_llm(agent.llm)
+            checks["llm_classifier"] = _ping_llm(classifier.llm)
+        
+        outcomes = await asyncio.gather(*checks.values(), return_exceptions=True)
+        for name, outcome in zip(checks, outcomes):
+            ok = outcome is not False and not isinstance(outcome, Exception)
+            results[name] = "ok" if ok else "failed"
+            if isinstance(outcome, Exception):
+                logger.warning("Warm-up check failed", extra={"check": name, "error": str(outcome) or type(outcome).__name__})
+    except Exception as e:
+        logger.exception("Warm-up error")
+        results["error"] = str(e)
+    
+    results["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    readiness["warmup"] = results
+    readiness["ready"] = True
+    logger.info("Warm-up finished", extra={"total_ms": results["total_ms"], "force": True})
+
+async def sync_availability_mirror():
+    """Keep the local availability mirror fresh between webhooks"""
+    while True:
+        await calendly_service.sync_mirror()
+        await asyncio.sleep(settings.availability_mirror_sync_seconds)
+
+async def replay_memory_wal():
+    """Drain memory writes queued in the WAL once MongoDB accepts them again"""
+    while True:
+        await mongodb_service.replay_wal()
+        await asyncio.sleep(settings.memory_wal_replay_seconds)
+
 @app.on_event("startup")
 async def startup_event():
     """Connect to MongoDB on startup"""
+    setup_logging()
+    if settings.memory_wal_enabled:
+        memory_wal.load()
+    gym_knowledge.reload_all()  # Fails startup if a gym data file is missing or invalid
     await mongodb_service.connect()
+    
+    if settings.gym_info_reload_seconds > 0:
+        background_tasks.append(asyncio.create_task(gym_knowledge.watch()))
+    
+    if settings.memory_wal_enabled:
+        background_tasks.append(asyncio.create_task(replay_memory_wal()))
+    
+    if settings.transcripts_enabled:
+        background_tasks.append(asyncio.create_task(transcript_store.run()))
+    
+    if settings.memory_change_stream_enabled:
+        background_tasks.append(
+            asyncio.create_task(event_bus.watch_change_stream(
+                mongodb_service.db,
+                {tenant.memory_collection: tenant.tenant_id for tenant in tenant_registry.all()}
+            ))
+        )
+    
+    if settings.availability_mirror_enabled:
+        background_tasks.append(asyncio.create_task(sync_availability_mirror()))
+    
+    if settings.warmup_on_startup:
+        background_tasks.append(asyncio.create_task(warmup()))
+    else:
+        readiness["ready"] = True
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Disconnect from MongoDB on shutdown"""
+    for task in background_tasks:
+        task.cancel()
+    if calendly_service.is_initialized:
+        await calendly_service.close()
+    if settings.memory_wal_enabled:
+        # Anything left stays in this process's WAL file, taken over by the next start
+        try:
+            await asyncio.wait_for(mongodb_service.replay_wal(), settings.mongodb_write_timeout_seconds * 3)
+        except asyncio.TimeoutError:
+            logger.warning("Memory writes left in the WAL for next start", extra={"pending": memory_wal.get_stats()["pending"]})
+        memory_wal.close()
+    if settings.transcripts_enabled:
+        try:
+            await asyncio.wait_for(transcript_store.flush_all(), settings.mongodb_write_timeout_seconds * 3)
+        except asyncio.TimeoutError:
+            pass
+        if transcript_store.buffer:
+            logger.warning("Queued transcript messages lost on shutdown", extra={"lost": len(transcript_store.buffer)})
     await mongodb_service.disconnect()
+    shutdown_logging()
 
 @app.get("/")
 async def root():
@@ -57,39 +198,199 @@ async def health_check():
         "status": "healthy",
         "service": "gym-sales-agent",
         "version": "2.0.0",
-        "mongodb": "connected" if mongodb_service.client else "disconnected"
+        "mongodb": "connected" if mongodb_service.client else "disconnected",
+        "live_updates": event_bus.get_stats(),
+        "admission": admission_controller.get_stats(),
+        "tenant_agents": tenant_agents.get_stats(),
+        "gym_knowledge": gym_knowledge.get_stats(),
+        "memory_wal": memory_wal.get_stats() if settings.memory_wal_enabled else None,
+        "transcripts": transcript_store.get_stats() if settings.transcripts_enabled else None,
+        "logging": get_logging_stats(),
+        "profiling": request_profiler.get_stats() if settings.profiling_enabled else None
     }
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until startup warm-up has finished"""
+    if not readiness["ready"]:
+        raise HTTPException(status_code=503, detail="Warming up")
+    return {"status": "ready", **readiness}
+
 @app.post("/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """Main chat endpoint"""
     try:
         session_id = request.session_id or str(uuid.uuid4())
         
-        result = await main_agent.process_message(
-            user_message=request.message,
-            session_id=session_id
-        )
+        agent = tenant_agents.get()
+        priority = await agent.get_priority(session_id, request.message)
+        async with admission_controller.admit(priority):
+            result = await agent.process_message(
+                user_message=request.message,
+                session_id=session_id
+            )
         
         return ChatResponse(
             response=result["response"],
             session_id=result["session_id"],
             intent_level=result.get("intent_level"),
-            booking_made=result.get("booking_made", False)
+            booking_made=result.get("booking_made", False),
+            usage=result.get("usage")
         )
         
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly",
+            headers={"Retry-After": str(e.retry_after)}
+        )
     except Exception as e:
-        print(f"Error in chat endpoint: {str(e)}")
+        logger.exception("Error in chat endpoint")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Run many (session_id, message) pairs, streaming results as NDJSON
+    
+    Each message's result is written as soon as its turn finishes; messages
+    of the same session run in the order given. The last line is
+    {"done": true, ...} with counts per status.
+    """
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="messages must not be empty")
+    if len(request.messages) > settings.chat_batch_max_messages:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {settings.chat_batch_max_messages} messages per batch"
+        )
+    
+    agent = tenant_agents.get()
+    
+    async def result_lines():
+        counts = {}
+        async for result in run_chat_batch(agent, request.messages, settings.chat_batch_concurrency):
+            counts[result["status"]] = counts.get(result["status"], 0) + 1
+            yield json.dumps(result, default=str) + "\n"
+        yield json.dumps({"done": True, "total": len(request.messages), "counts": counts}) + "\n"
+    
+    return StreamingResponse(result_lines(), media_type="application/x-ndjson")
+
+@app.websocket("/ws/chat")
+async def chat_ws(websocket: WebSocket, session_id: Optional[str] = None):
+    """
+    Persistent chat connection for one session
+    
+    Client frames: {"type": "message", "message": "..."}, {"type": "ping"}, {"type": "pong"}
+    Server frames: session, token, response, intent, memory, follow_up, busy, error, ping, pong
+    """
+    await websocket.accept()
+    session_id = session_id or str(uuid.uuid4())
+    
+    connection = ChatConnection(websocket, session_id)
+    connection_manager.register(connection)
+    connection.start()
+    await connection.send({"type": "session", "session_id": session_id})
+    
+    # Turns run one at a time per connection; a few more may wait
+    inbox: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_max_pending_messages)
+    subscription = event_bus.subscribe(session_id)
+    
+    async def run_turns():
+        while True:
+            message = await inbox.get()
+            try:
+                agent = tenant_agents.get()
+                priority = await agent.get_priority(session_id, message)
+                async with admission_controller.admit(priority):
+                    result = await agent.process_message(
+                        user_message=message,
+                        session_id=session_id,
+                        callbacks=[TokenStreamHandler(connection)]
+                    )
+            except AdmissionRejected as e:
+                await connection.send({
+                    "type": "busy",
+                    "response": "We're getting a lot of messages right now - please try again in a moment.",
+                    "retry_after": e.retry_after
+                })
+                continue
+            await connection.send({
+                "type": "error" if result.get("error") else "response",
+                "response": result["response"],
+                "session_id": result["session_id"],
+                "intent_level": result.get("intent_level"),
+                "booking_made": result.get("booking_made", False),
+                "usage": result.get("usage")
+            })
+    
+    async def forward_events():
+        while True:
+            event = await subscription.get()
+            await connection.send(event)
+    
+    tasks = [asyncio.create_task(run_turns()), asyncio.create_task(forward_events())]
+    
+    try:
+        while not connection.closed:
+            raw = await websocket.receive_text()
+            connection.touch()
+            
+            try:
+                frame = json.loads(raw)
+            except ValueError:
+                await connection.send({"type": "error", "response": "Invalid JSON frame"})
+                continue
+            
+            frame_type = frame.get("type")
+            if frame_type == "message":
+                message = (frame.get("message") or "").strip()
+                if not message:
+                    continue
+                try:
+                    inbox.put_nowait(message)
+                except asyncio.QueueFull:
+                    await connection.send({
+                        "type": "busy",
+                        "response": "Still working on your previous messages - please wait a moment."
+                    })
+            elif frame_type == "ping":
+                await connection.send({"type": "pong"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        for task in tasks:
+            task.cancel()
+        event_bus.unsubscribe(subscription)
+        connection_manager.unregister(connection)
+        await connection.close()
+
+@app.post("/sessions/{session_id}/follow-up")
+async def send_follow_up(session_id: str, request: FollowUpRequest):
+    """Push a server-initiated follow-up to a session connected over /ws/chat"""
+    delivered = await connection_manager.send_to_session(session_id, {
+        "type": "follow_up",
+        "session_id": session_id,
+        "response": request.message
+    })
+    
+    if not delivered:
+        raise HTTPException(status_code=404, detail="Session is not connected")
+    
+    tenant_agents.get().add_agent_message(session_id, request.message)
+    return {
+        "success": True,
+        "session_id": session_id
+    }
+
 @app.get("/memory/{session_id}")
 async def get_memory(session_id: str):
     """Get memory for a session (for debugging/viewing)"""
     try:
         memory = await mongodb_service.get_memory(session_id)
         
-        if not memory:
-            raise HTTPException(status_code=404, detail="Memory not found for this session")
+        if memory is None:
+            raise HTTPException(status_code=503, detail="Memory is temporarily unavailable")
         
         return {
             "success": True,
@@ -102,6 +403,70 @@ async def get_memory(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+async def _subscribe_to_memory(session_id: str):
+    """Subscribe to a session's memory changes; returns (subscription, snapshot event)"""
+    snapshot = None
+    if session_id != ALL_LEADS:
+        snapshot = await mongodb_service.get_memory(session_id)
+    
+    subscription = event_bus.subscribe(session_id, snapshot)
+    snapshot_event = None
+    if snapshot:
+        snapshot_event = {
+            "type": "snapshot",
+            "session_id": session_id,
+            "fields": {k: v for k, v in snapshot.items() if k not in IGNORED_FIELDS}
+        }
+    return subscription, snapshot_event
+
+@app.get("/memory/{session_id}/events")
+async def memory_events(session_id: str, request: Request):
+    """
+    Server-Sent Events stream of memory and intent changes for a session
+    
+    Sends the current memory as a "snapshot" event, then only changed fields.
+    Use "*" as session_id to follow every lead of the current gym branch.
+    """
+    subscription, snapshot_event = await _subscribe_to_memory(session_id)
+    
+    async def event_stream():
+        try:
+            if snapshot_event:
+                yield f"event: snapshot\ndata: {json.dumps(snapshot_event, default=str)}\n\n"
+            
+            while not await request.is_disconnected():
+                event = await subscription.get(timeout=settings.event_keepalive_seconds)
+                if event is None:
+                    yield ": keepalive\n\n"
+                    continue
+                yield f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+        finally:
+            event_bus.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.websocket("/ws/memory/{session_id}")
+async def memory_events_ws(websocket: WebSocket, session_id: str):
+    """WebSocket variant of /memory/{session_id}/events"""
+    await websocket.accept()
+    subscription, snapshot_event = await _subscribe_to_memory(session_id)
+    
+    try:
+        if snapshot_event:
+            await websocket.send_text(json.dumps(snapshot_event, default=str))
+        
+        while True:
+            event = await subscription.get(timeout=settings.event_keepalive_seconds)
+            await websocket.send_text(json.dumps(event or {"type": "ping"}, default=str))
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        event_bus.unsubscribe(subscription)
+
 @app.delete("/memory/{session_id}")
 async def delete_memory(session_id: str):
     """Delete memory for a session"""
@@ -126,7 +491,7 @@ async def delete_memory(session_id: str):
 async def reset_session(session_id: str):
     """Reset a conversation session (clears chat history, keeps memory)"""
     try:
-        main_agent.reset_session(session_id)
+        tenant_agents.get().reset_session(session_id)
         return {
             "success": True,
             "message": "Session reset successfully (memory preserved)",
@@ -135,11 +500,195 @@ async def reset_session(session_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/analytics")
+async def get_analytics(days: int = 7):
+    """Lead funnel counts by intent, timeline, objection and booking status"""
+    try:
+        if not mongodb_service.client:
+            raise HTTPException(status_code=503, detail="MongoDB not connected")
+        
+        summary = await analytics_service.get_summary(days=days)
+        return {
+            "success": True,
+            **summary
+        }
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/analytics/rebuild")
+async def rebuild_analytics(request: Request):
+    """Recount the current funnel counters from every stored lead (needs the X-Profile-Token admin header)"""
+    if not check_admin_token(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Profile-Token header")
+    if not mongodb_service.client:
+        raise HTTPException(status_code=503, detail="MongoDB not connected")
+
+    try:
+        current = await analytics_service.rebuild(mongodb_service.memory_collections())
+        return {
+            "success": True,
+            "current": current
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/export/leads")
+async def export_leads(
+    request: Request,
+    format: str = "ndjson",
+    gzip: bool = False,
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    intent: Optional[str] = None,
+    resume_after: Optional[str] = None
+):
+    """
+    Stream every lead memory as NDJSON or CSV
+    
+    Rows are ordered by session_id; pass the last received session_id as
+    `resume_after` to continue an interrupted export. Lead memories hold
+    health details and contact info, so this needs the X-Profile-Token
+    admin header.
+    """
+    if not check_admin_token(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Profile-Token header")
+    if format not in EXPORT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {EXPORT_FORMATS}")
+    if not mongodb_service.client:
+        raise HTTPException(status_code=503, detail="MongoDB not connected")
+    
+    exporter = LeadExporter(mongodb_service.collection)
+    query = build_export_query(since, until, intent, resume_after)
+    
+    media_type = "application/x-ndjson" if format == "ndjson" else "text/csv"
+    filename = f"leads.{format}" + (".gz" if gzip else "")
+    headers = {"Content-Disposition": f'attachment; filename="{filename}"'}
+    if gzip:
+        media_type = "application/gzip"
+    
+    return StreamingResponse(
+        exporter.iter_bytes(query, format, gzip=gzip, header=not resume_after),
+        media_type=media_type,
+        headers=headers
+    )
+
+@app.get("/usage/{session_id}")
+async def get_usage(session_id: str):
+    """Token usage and estimated cost for a session, per component and model"""
+    if not mongodb_service.client:
+        raise HTTPException(status_code=503, detail="MongoDB not connected")
+    
+    try:
+        usage = await usage_service.get_usage(session_id)
+        
+        if not usage:
+            raise HTTPException(status_code=404, detail="No usage recorded for this session")
+        
+        return {
+            "success": True,
+            "usage": usage
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics():
+    """Prometheus metrics (admission queue, shed counts, latency histograms)"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/router/stats")
+async def router_stats(recent: int = 20):
+    """Model routing decisions and per-model latency/cost"""
+    return {
+        "success": True,
+        **model_router.get_stats(recent=recent)
+    }
+
+def _require_profiling_admin(request: Request) -> None:
+    if not settings.profiling_enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not check_admin_token(request.headers.get(PROFILE_HEADER)):
+        raise HTTPException(status_code=401, detail="Invalid or missing X-Profile-Token header")
+
+@app.get("/profiles")
+async def list_profiles(request: Request, limit: int = 50):
+    """Captured per-turn profiles, newest first (needs the X-Profile-Token header)"""
+    _require_profiling_admin(request)
+    return {
+        "success": True,
+        **request_profiler.get_stats(),
+        "profiles": request_profiler.store.list()[:limit]
+    }
+
+@app.get("/profiles/{profile_id}")
+async def download_profile(profile_id: str, request: Request):
+    """Download a captured profile (speedscope JSON or HTML, per profiling_format when it was taken)"""
+    _require_profiling_admin(request)
+    found = request_profiler.store.get(profile_id)
+    if not found:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    path, meta = found
+    return FileResponse(path, media_type=PROFILE_FORMATS[meta["format"]][1], filename=meta["file"])
+
+@app.post("/webhooks/calendly")
+async def calendly_webhook(request: Request):
+    """
+    Calendly webhook receiver (invitee.created / invitee.canceled)
+    
+    Verifies the Calendly-Webhook-Signature header and applies the event to
+    the local bookings and availability mirror.
+    """
+    if not settings.calendly_webhook_signing_key:
+        raise HTTPException(status_code=503, detail="Webhook signing key not configured")
+    
+    body = await request.body()
+    try:
+        verify_signature(
+            body,
+            request.headers.get("Calendly-Webhook-Signature"),
+            settings.calendly_webhook_signing_key,
+            settings.calendly_webhook_tolerance_seconds
+        )
+    except WebhookSignatureError as e:
+        raise HTTPException(status_code=401, detail=str(e))
+    
+    try:
+        event = json.loads(body)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid JSON body")
+    
+    try:
+        applied = await booking_mirror.apply_event(event)
+        if applied:
+            availability_indexes.get().invalidate()
+        return {
+            "success": True,
+            "event": event.get("event"),
+            "applied": applied
+        }
+    except Exception as e:
+        logger.exception("Error applying Calendly webhook")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/bookings/mirror")
+async def booking_mirror_stats():
+    """Sync state of the local availability mirror and active booking count"""
+    try:
+        return {
+            "success": True,
+            **await booking_mirror.get_stats()
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.get("/test-calendly")
 async def test_calendly():
     """Test Calendly integration"""
-    from app.services.calendly_service import calendly_service
-    
     try:
         slots = await calendly_service.get_available_slots(days_ahead=7)
         return {
@@ -173,7 +722,8 @@ async def test_mongodb():
             "success": True,
             "message": "MongoDB connection healthy",
             "database": settings.mongodb_database,
-            "collection": "user_memories",
+            "tenant": get_current_tenant().tenant_id,
+            "collection": get_current_tenant().memory_collection,
             "total_memories": count
         }
         
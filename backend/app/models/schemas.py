@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, Literal
+from typing import List, Optional, Literal
 from datetime import datetime
 
 class ChatRequest(BaseModel):
@@ -11,6 +11,20 @@ class ChatResponse(BaseModel):
     session_id: str
     intent_level: Optional[str] = None
     booking_made: bool = False
+    usage: Optional[dict] = None  # Tokens and estimated cost of this turn
+
+class BatchChatMessage(BaseModel):
+    session_id: str
+    message: str
+    message_id: Optional[str] = None  # Gateway's id, echoed on the result
+
+class BatchChatRequest(BaseModel):
+    """Messages for one or more sessions, in arrival order"""
+    messages: List[BatchChatMessage]
+
+class FollowUpRequest(BaseModel):
+    """Server-initiated message pushed to a connected chat session"""
+    message: str
 
 class IntentClassification(BaseModel):
     intent_level: Literal["high", "medium", "low"]
@@ -42,6 +56,7 @@ class LeadMemory(BaseModel):
     conversation_summary: str = "None"
     total_messages: int = 0
     last_intent: str = "unknown"
+    booking_status: str = "not_booked"
 
 class MemoryUpdateRequest(BaseModel):
     """Memory update request from main agent"""
@@ -0,0 +1,233 @@
+import asyncio
+import heapq
+import itertools
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Dict, List, Tuple
+
+from app.config import settings
+from app.services.metrics import metrics
+from app.utils.helpers import LazySingleton
+
+SHED_QUEUE_FULL = "queue_full"
+SHED_TIMEOUT = "queue_timeout"
+SHED_PREEMPTED = "preempted"
+
+# Scheduling classes, most urgent first
+PRIORITY_HIGH = 0  # High intent or in the booking flow
+PRIORITY_MEDIUM = 1  # Medium intent, new leads
+PRIORITY_LOW = 2  # Browsing
+PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_MEDIUM: "medium", PRIORITY_LOW: "low"}
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request can't start an agent run in time"""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionController:
+    """
+    Caps concurrent agent runs per worker process
+
+    At most `max_inflight` runs execute at once. Up to `max_queue` more wait
+    for at most `queue_timeout` seconds. Anything beyond that is rejected
+    immediately, so overload turns into fast 503s instead of every request
+    slowing down together behind the LLM.
+
+    Waiters are served by priority with aging: each request is keyed on its
+    arrival time plus `priority * aging_seconds`, so a high-intent lead jumps
+    ahead of browsers that arrived up to `aging_seconds` per class earlier,
+    but a low-priority request that has waited long enough still beats new
+    high-priority arrivals and can't starve. When the queue is full, a more
+    urgent arrival preempts the least urgent waiter instead of being shed.
+    With `prioritize=False` the queue is plain FIFO.
+
+    Usage:
+        async with admission_controller.admit(priority=PRIORITY_HIGH):
+            result = await main_agent.process_message(...)
+    """
+
+    def __init__(
+        self,
+        max_inflight: int,
+        max_queue: int,
+        queue_timeout: float,
+        enabled: bool = True,
+        prioritize: bool = True,
+        aging_seconds: float = 3.0
+    ):
+        self.enabled = enabled
+        self.prioritize = prioritize
+        self.aging_seconds = aging_seconds
+        self.max_inflight = max_inflight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.inflight = 0
+        # Heap of (sort key, sequence, future); entries whose future is done
+        # (timed out, cancelled, preempted) are skipped when popped
+        self.waiters: List[Tuple[float, int, asyncio.Future]] = []
+        self.queued = 0
+        self._sequence = itertools.count()
+        # Moving average of run time, used for Retry-After
+        self.avg_run_seconds = 5.0
+
+        self.inflight_gauge = metrics.gauge("chat_inflight_runs", "Agent runs currently executing")
+        self.queue_gauge = metrics.gauge("chat_queue_depth", "Requests waiting for an agent run slot")
+        self.admitted_total = metrics.counter("chat_admitted_total", "Requests admitted to run the agent")
+        self.shed_total = metrics.counter("chat_shed_total", "Requests rejected by admission control", ["reason"])
+        self.wait_seconds = metrics.histogram(
+            "chat_queue_wait_seconds", "Time admitted requests spent waiting for a slot", ["priority"],
+            buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+        )
+        self.run_seconds = metrics.histogram("chat_run_seconds", "Agent run time of admitted requests")
+        self.latency_seconds = metrics.histogram(
+            "chat_latency_seconds", "Queue wait plus run time of admitted requests", ["priority"]
+        )
+
+    def retry_after(self) -> int:
+        """Seconds until a slot is likely free, from queue depth and average run time"""
+        rounds = (self.queued + 1) / max(self.max_inflight, 1)
+        return max(1, math.ceil(rounds * self.avg_run_seconds))
+
+    def _shed(self, reason: str) -> AdmissionRejected:
+        self.shed_total.inc(reason=reason)
+        return AdmissionRejected(reason, self.retry_after())
+
+    @staticmethod
+    def _granted(waiter: asyncio.Future) -> bool:
+        """True if a slot was handed to this waiter (not timed out or preempted)"""
+        return waiter.done() and not waiter.cancelled() and waiter.exception() is None
+
+    def _sort_key(self, priority: int, arrived: float) -> float:
+        if not self.prioritize:
+            return arrived
+        return arrived + priority * self.aging_seconds
+
+    def _preempt(self, key: float) -> bool:
+        """Shed the least urgent waiter if it sorts after `key`; returns True if one was shed"""
+        live = [entry for entry in self.waiters if not entry[2].done()]
+        if not live:
+            return False
+        victim = max(live)
+        if victim[0] <= key:
+            return False
+        victim[2].set_exception(self._shed(SHED_PREEMPTED))
+        return True
+
+    async def _acquire(self, priority: int) -> float:
+        """Wait for a run slot; returns seconds waited"""
+        if self.inflight < self.max_inflight and not self.queued:
+            self.inflight += 1
+            return 0.0
+
+        started = time.perf_counter()
+        key = self._sort_key(priority, started)
+        if self.queued >= self.max_queue and not (self.prioritize and self._preempt(key)):
+            raise self._shed(SHED_QUEUE_FULL)
+
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (key, next(self._sequence), waiter))
+        self.queued += 1
+        self.queue_gauge.set(self.queued)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if self._granted(waiter):
+                # The slot was handed over just as the deadline hit: take it
+                return time.perf_counter() - started
+            waiter.cancel()
+            raise self._shed(SHED_TIMEOUT)
+        except asyncio.CancelledError:
+            if self._granted(waiter):
+                self._release()  # Pass the slot we were handed to the next waiter
+            waiter.cancel()
+            raise
+        finally:
+            self.queued -= 1
+            if not self.queued:
+                self.waiters.clear()  # Drop leftover entries of shed waiters
+            self.queue_gauge.set(self.queued)
+
+        return time.perf_counter() - started
+
+    def _release(self) -> None:
+        """Hand the slot to the most urgent live waiter, or free it"""
+        while self.waiters:
+            _, _, waiter = heapq.heappop(self.waiters)
+            if not waiter.done():
+                waiter.set_result(None)  # inflight count carries over to the waiter
+                return
+        self.inflight -= 1
+
+    @asynccontextmanager
+    async def admit(self, priority: int = PRIORITY_MEDIUM):
+        """
+        Run the enclosed block once a slot is free
+
+        Args:
+            priority: PRIORITY_HIGH, PRIORITY_MEDIUM or PRIORITY_LOW
+
+        Raises:
+            AdmissionRejected: Queue full, queue deadline hit, or preempted
+        """
+        if not self.enabled:
+            yield
+            return
+
+        label = PRIORITY_NAMES.get(priority, PRIORITY_NAMES[PRIORITY_MEDIUM])
+        waited = await self._acquire(priority)
+        self.admitted_total.inc()
+        self.wait_seconds.observe(waited, priority=label)
+        self.inflight_gauge.set(self.inflight)
+
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            self.run_seconds.observe(elapsed)
+            self.latency_seconds.observe(waited + elapsed, priority=label)
+            self.avg_run_seconds = 0.9 * self.avg_run_seconds + 0.1 * elapsed
+            self._release()
+            self.inflight_gauge.set(self.inflight)
+
+    def get_stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "prioritize": self.prioritize,
+            "aging_seconds": self.aging_seconds,
+            "max_inflight": self.max_inflight,
+            "max_queue": self.max_queue,
+            "queue_timeout_seconds": self.queue_timeout,
+            "inflight": self.inflight,
+            "queued": self.queued,
+            "admitted": int(self.admitted_total.get()),
+            "shed": {
+                SHED_QUEUE_FULL: int(self.shed_total.get(reason=SHED_QUEUE_FULL)),
+                SHED_TIMEOUT: int(self.shed_total.get(reason=SHED_TIMEOUT)),
+                SHED_PREEMPTED: int(self.shed_total.get(reason=SHED_PREEMPTED))
+            },
+            "run_seconds": self.run_seconds.summary(),
+            "by_priority": {
+                name: {
+                    "queue_wait_seconds": self.wait_seconds.summary(priority=name),
+                    "latency_seconds": self.latency_seconds.summary(priority=name)
+                }
+                for name in PRIORITY_NAMES.values()
+            }
+        }
+
+# Singleton instance (limits come from settings, read on first use)
+admission_controller = LazySingleton(lambda: AdmissionController(
+    max_inflight=settings.admission_max_inflight,
+    max_queue=settings.admission_max_queue,
+    queue_timeout=settings.admission_queue_timeout_seconds,
+    enabled=settings.admission_enabled,
+    prioritize=settings.admission_priority_enabled,
+    aging_seconds=settings.admission_priority_aging_seconds
+))
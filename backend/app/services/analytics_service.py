@@ -0,0 +1,214 @@
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+from app.utils.helpers import (
+    categorize_timeline,
+    categorize_objection,
+    normalize_intent,
+    normalize_booking_status
+)
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+CURRENT_DOC_ID = "current"
+DAY_DOC_PREFIX = "day:"
+MAX_WINDOW_DAYS = 365
+
+
+class AnalyticsService:
+    """
+    Incrementally maintained funnel counters for lead memories
+
+    Two kinds of documents live in the `lead_analytics` collection:
+    - "current": how many leads are in each category right now
+    - "day:YYYY-MM-DD": how many leads moved into each category on that day
+
+    Counters are updated with $inc on every memory write, so reads never scan
+    `user_memories` and cost the same regardless of how many leads exist.
+    The "current" document is seeded from the stored leads the first time
+    the service connects (see `ensure_seeded`) and can be recounted with
+    `rebuild` if it ever drifts.
+    """
+
+    def __init__(self):
+        self.collection = None
+
+    def attach(self, db):
+        """Bind to the analytics collection of a connected database"""
+        self.collection = db["lead_analytics"]
+
+    @staticmethod
+    def categorize(memory: Optional[Dict]) -> Dict[str, str]:
+        """Category of a memory document along every tracked dimension"""
+        memory = memory or {}
+        return {
+            "intent": normalize_intent(memory.get("last_intent")),
+            "timeline": categorize_timeline(memory.get("joining_timeline")),
+            "objection": categorize_objection(memory.get("objections")),
+            "booking": normalize_booking_status(memory.get("booking_status"))
+        }
+
+    def _accumulate(
+        self,
+        old_memory: Optional[Dict],
+        new_memory: Optional[Dict],
+        current_inc: Dict[str, int],
+        day_inc: Dict[str, int]
+    ) -> None:
+        """Add the counter changes for one memory write to the $inc maps"""
+        old_cats = self.categorize(old_memory) if old_memory else None
+        new_cats = self.categorize(new_memory) if new_memory else None
+
+        if old_cats is None and new_cats is not None:
+            current_inc["total_leads"] = current_inc.get("total_leads", 0) + 1
+            day_inc["new_leads"] = day_inc.get("new_leads", 0) + 1
+        elif old_cats is not None and new_cats is None:
+            current_inc["total_leads"] = current_inc.get("total_leads", 0) - 1
+
+        for dimension in ("intent", "timeline", "objection", "booking"):
+            old_value = old_cats[dimension] if old_cats else None
+            new_value = new_cats[dimension] if new_cats else None
+            if old_value == new_value:
+                continue
+
+            if old_value is not None:
+                key = f"{dimension}.{old_value}"
+                current_inc[key] = current_inc.get(key, 0) - 1
+            if new_value is not None:
+                key = f"{dimension}.{new_value}"
+                current_inc[key] = current_inc.get(key, 0) + 1
+                day_inc[key] = day_inc.get(key, 0) + 1
+
+    async def _apply(self, current_inc: Dict[str, int], day_inc: Dict[str, int]) -> None:
+        current_inc = {k: v for k, v in current_inc.items() if v}
+        day_inc = {k: v for k, v in day_inc.items() if v}
+
+        if current_inc:
+            await self.collection.update_one(
+                {"_id": CURRENT_DOC_ID},
+                {"$inc": current_inc},
+                upsert=True
+            )
+        if day_inc:
+            day = datetime.utcnow().strftime("%Y-%m-%d")
+            await self.collection.update_one(
+                {"_id": f"{DAY_DOC_PREFIX}{day}"},
+                {"$inc": day_inc, "$setOnInsert": {"date": day}},
+                upsert=True
+            )
+
+    async def record_change(self, old_memory: Optional[Dict], new_memory: Optional[Dict]) -> None:
+        """
+        Update counters for a single memory write
+
+        Args:
+            old_memory: Stored document before the write (None if new lead)
+            new_memory: Document after the write (None if deleted)
+        """
+        await self.record_changes([(old_memory, new_memory)])
+
+    async def record_changes(self, changes: Iterable[Tuple[Optional[Dict], Optional[Dict]]]) -> None:
+        """Update counters for a batch of (old, new) memory writes with two $inc calls"""
+        if self.collection is None:
+            return
+
+        try:
+            current_inc: Dict[str, int] = {}
+            day_inc: Dict[str, int] = {}
+            for old_memory, new_memory in changes:
+                self._accumulate(old_memory, new_memory, current_inc, day_inc)
+
+            await self._apply(current_inc, day_inc)
+        except Exception as e:
+            logger.warning("Error updating analytics counters", extra={"error": str(e) or type(e).__name__})
+
+    async def rebuild(self, memory_collections: Iterable) -> Dict:
+        """
+        Recount the "current" snapshot from the stored lead memories
+
+        Replaces the snapshot in one write after scanning every collection, so
+        memory writes that land during the scan may be counted twice or not at
+        all; run it when traffic is low. Day documents are left alone.
+
+        Args:
+            memory_collections: Every tenant's memory collection
+
+        Returns:
+            The new "current" counters
+        """
+        counts: Dict[str, int] = {"total_leads": 0}
+        projection = {field: 1 for field in ("last_intent", "joining_timeline", "objections", "booking_status")}
+        for collection in memory_collections:
+            async for memory in collection.find({}, projection):
+                self._accumulate(None, memory, counts, {})
+
+        current: Dict = {}
+        for key, count in counts.items():
+            dimension, _, category = key.partition(".")
+            if category:
+                current.setdefault(dimension, {})[category] = count
+            else:
+                current[key] = count
+
+        await self.collection.replace_one(
+            {"_id": CURRENT_DOC_ID},
+            {"_id": CURRENT_DOC_ID, **current, "rebuilt_at": datetime.utcnow().isoformat()},
+            upsert=True
+        )
+        return current
+
+    async def ensure_seeded(self, memory_collections: Iterable) -> bool:
+        """Build the "current" snapshot from existing leads if there is none yet; returns whether it did"""
+        if await self.collection.find_one({"_id": CURRENT_DOC_ID}, {"_id": 1}):
+            return False
+        await self.rebuild(memory_collections)
+        return True
+
+    async def get_summary(self, days: int = 7) -> Dict:
+        """
+        Current funnel snapshot plus movement over the last `days` days
+
+        Args:
+            days: Size of the time window (capped at MAX_WINDOW_DAYS)
+
+        Returns:
+            Dictionary with "current", "window" totals and a per-day series
+        """
+        days = max(1, min(days, MAX_WINDOW_DAYS))
+        today = datetime.utcnow().date()
+        start = today - timedelta(days=days - 1)
+
+        current = await self.collection.find_one({"_id": CURRENT_DOC_ID}) or {}
+        current.pop("_id", None)
+
+        cursor = self.collection.find({
+            "_id": {
+                "$gte": f"{DAY_DOC_PREFIX}{start.isoformat()}",
+                "$lte": f"{DAY_DOC_PREFIX}{today.isoformat()}"
+            }
+        }).sort("_id", 1)
+
+        window: Dict = {"new_leads": 0}
+        series = []
+        async for day_doc in cursor:
+            day_doc.pop("_id", None)
+            series.append(day_doc)
+            window["new_leads"] += day_doc.get("new_leads", 0)
+            for dimension in ("intent", "timeline", "objection", "booking"):
+                totals = window.setdefault(dimension, {})
+                for category, count in day_doc.get(dimension, {}).items():
+                    totals[category] = totals.get(category, 0) + count
+
+        return {
+            "current": current,
+            "window": {
+                "days": days,
+                "start": start.isoformat(),
+                "end": today.isoformat(),
+                **window
+            },
+            "daily": series
+        }
+
+# Singleton instance
+analytics_service = AnalyticsService()
@@ -0,0 +1,285 @@
+import asyncio
+import bisect
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, date
+from typing import Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+from app.config import settings
+from app.services.calendly_service import calendly_service
+from app.services.tenants import get_current_tenant
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# Time-of-day periods in the gym's local time: name -> [start_hour, end_hour)
+PERIODS = {
+    "morning": (5, 12),
+    "afternoon": (12, 17),
+    "evening": (17, 21),
+    "night": (21, 24)
+}
+WEEKDAYS = ("monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday")
+WEEKDAY_ALIASES = {
+    "mon": 0, "tue": 1, "tues": 1, "wed": 2, "thu": 3, "thur": 3, "thurs": 3,
+    "fri": 4, "sat": 5, "sun": 6
+}
+PERIOD_ALIASES = {
+    "morning": "morning", "mornings": "morning", "before work": "morning", "early": "morning",
+    "afternoon": "afternoon", "afternoons": "afternoon", "lunch": "afternoon", "noon": "afternoon",
+    "evening": "evening", "evenings": "evening", "after work": "evening", "after office": "evening",
+    "night": "night", "nights": "night", "late": "night"
+}
+CLOCK_TIME = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)\b|\b([01]?\d|2[0-3]):([0-5]\d)\b", re.IGNORECASE)
+
+
+def period_of(hour: int) -> Optional[str]:
+    for name, (start, end) in PERIODS.items():
+        if start <= hour < end:
+            return name
+    return None
+
+
+@dataclass
+class TimePreference:
+    """Days, periods and clock hour parsed from free text like "weekend mornings" """
+    weekdays: Set[int] = field(default_factory=set)
+    periods: Set[str] = field(default_factory=set)
+    hour: Optional[float] = None
+    dates: Set[date] = field(default_factory=set)
+
+
+def parse_time_preference(text: Optional[str], today: Optional[date] = None) -> TimePreference:
+    """
+    Parse a time preference such as "Tuesday evening", "weekend mornings",
+    "tomorrow around 7 PM" or "weekdays after work"
+
+    Args:
+        text: Free text from the lead or the stored preferred_time
+        today: Reference date for "today"/"tomorrow" (gym local date)
+    """
+    preference = TimePreference()
+    if not text or text.strip().lower() in ("unknown", "none"):
+        return preference
+
+    lowered = text.lower()
+    words = set(re.findall(r"[a-z]+", lowered))
+    today = today or datetime.now(ZoneInfo(get_current_tenant().gym_timezone)).date()
+
+    for index, name in enumerate(WEEKDAYS):
+        if name in words or f"{name}s" in words:
+            preference.weekdays.add(index)
+    for alias, index in WEEKDAY_ALIASES.items():
+        if alias in words:
+            preference.weekdays.add(index)
+    if words & {"weekend", "weekends"}:
+        preference.weekdays.update((5, 6))
+    if words & {"weekday", "weekdays"}:
+        preference.weekdays.update(range(5))
+
+    if "today" in words or "tonight" in words:
+        preference.dates.add(today)
+    if "tomorrow" in words:
+        preference.dates.add(today + timedelta(days=1))
+
+    for alias, period in PERIOD_ALIASES.items():
+        if (" " in alias and alias in lowered) or alias in words:
+            preference.periods.add(period)
+    if "tonight" in words:
+        preference.periods.add("evening")
+
+    match = CLOCK_TIME.search(text)
+    if match:
+        if match.group(3):
+            hour = int(match.group(1)) % 12 + (12 if match.group(3).lower() == "pm" else 0)
+            minute = int(match.group(2) or 0)
+        else:
+            hour, minute = int(match.group(4)), int(match.group(5))
+        preference.hour = hour + minute / 60
+        # An explicit time is more precise than the period it falls in
+        if not preference.periods and period_of(hour):
+            preference.periods.add(period_of(hour))
+
+    return preference
+
+
+@dataclass(order=True)
+class IndexedSlot:
+    """One bookable slot, keyed by its start time in gym local time"""
+    start: datetime
+    start_time: str = field(compare=False)
+    formatted: str = field(compare=False)
+    weekday: int = field(compare=False)
+    period: Optional[str] = field(compare=False)
+
+    @property
+    def hour(self) -> float:
+        return self.start.hour + self.start.minute / 60
+
+    def to_dict(self) -> Dict:
+        return {
+            "start_time": self.start_time,
+            "formatted": self.formatted,
+            "day": WEEKDAYS[self.weekday].capitalize(),
+            "period": self.period
+        }
+
+
+class AvailabilityIndex:
+    """
+    In-memory index of trial availability by day and time of day
+
+    Slots from Calendly are kept sorted by start time (for date-range lookups
+    with bisect) and bucketed by (weekday, period), so a query like "Tuesday
+    evening" reads a single bucket instead of scanning every slot. The index is
+    rebuilt from Calendly at most once per availability_cache_seconds.
+    """
+
+    def __init__(self, days_ahead: int = 7, timezone: Optional[str] = None):
+        self.days_ahead = days_ahead
+        self.tz = ZoneInfo(timezone or settings.gym_timezone)
+        self.slots: List[IndexedSlot] = []
+        self.starts: List[datetime] = []
+        self.buckets: Dict[Tuple[int, Optional[str]], List[IndexedSlot]] = {}
+        self.built_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def build(self, raw_slots: List[Dict]) -> None:
+        """Rebuild the index from Calendly slot dicts"""
+        tz = self.tz
+        slots = []
+        for raw in raw_slots:
+            try:
+                start = datetime.fromisoformat(raw["start_time"].replace("Z", "+00:00"))
+            except (KeyError, ValueError):
+                continue
+            # Naive times (mock slots) are already local
+            start = start.astimezone(tz) if start.tzinfo else start.replace(tzinfo=tz)
+            slots.append(IndexedSlot(
+                start=start,
+                start_time=raw["start_time"],
+                formatted=start.strftime("%A, %B %d at %I:%M %p"),
+                weekday=start.weekday(),
+                period=period_of(start.hour)
+            ))
+
+        slots.sort()
+        buckets: Dict[Tuple[int, Optional[str]], List[IndexedSlot]] = {}
+        for slot in slots:
+            buckets.setdefault((slot.weekday, slot.period), []).append(slot)
+
+        self.slots = slots
+        self.starts = [slot.start for slot in slots]
+        self.buckets = buckets
+        self.built_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        """Force a rebuild on the next refresh (e.g. after a booking webhook)"""
+        self.built_at = 0.0
+
+    async def refresh(self, force: bool = False) -> None:
+        """Rebuild from Calendly if the index is older than the cache TTL"""
+        async with self._lock:
+            if not force and self.slots and time.monotonic() - self.built_at < settings.availability_cache_seconds:
+                return
+            raw_slots = await calendly_service.get_available_slots(self.days_ahead, limit=None)
+            self.build(raw_slots)
+            logger.info("Availability indexed", extra={"slots": len(self.slots), "days_ahead": self.days_ahead})
+
+    def _candidates(self, query: TimePreference) -> List[IndexedSlot]:
+        """Slots satisfying every constraint in the query"""
+        if query.dates:
+            tz = self.tz
+            candidates = []
+            for day in sorted(query.dates):
+                start = datetime.combine(day, datetime.min.time(), tzinfo=tz)
+                lo = bisect.bisect_left(self.starts, start)
+                hi = bisect.bisect_left(self.starts, start + timedelta(days=1))
+                candidates.extend(self.slots[lo:hi])
+        elif query.weekdays or query.periods:
+            weekdays = query.weekdays or set(range(7))
+            periods = query.periods or set(PERIODS) | {None}
+            candidates = [
+                slot
+                for weekday in weekdays
+                for period in periods
+                for slot in self.buckets.get((weekday, period), ())
+            ]
+        else:
+            candidates = list(self.slots)
+
+        if query.dates and query.periods:
+            candidates = [slot for slot in candidates if slot.period in query.periods]
+        return candidates
+
+    @staticmethod
+    def _score(slot: IndexedSlot, preference: TimePreference, now: datetime) -> float:
+        """Higher is better: fit with the lead's preference, then soonest"""
+        score = 0.0
+        if preference.weekdays and slot.weekday in preference.weekdays:
+            score += 2
+        if preference.periods and slot.period in preference.periods:
+            score += 2
+        if preference.hour is not None:
+            score += max(0.0, 2 - abs(slot.hour - preference.hour))
+        # Sooner slots win ties (at most one point over the whole window)
+        score -= (slot.start - now).total_seconds() / (7 * 86400)
+        return score
+
+    def search(self, query: str, preferred_time: Optional[str] = None, limit: int = 3) -> Dict:
+        """
+        Find the best slots for a query, ranked against the lead's preference
+
+        Args:
+            query: What the lead asked for, e.g. "Tuesday evening"
+            preferred_time: LeadMemory.preferred_time, used for ranking
+            limit: Number of slots to return
+
+        Returns:
+            Dictionary with the top slots and whether they match the query exactly
+        """
+        now = datetime.now(self.tz)
+        today = now.date()
+        parsed_query = parse_time_preference(query, today)
+        preference = parse_time_preference(preferred_time, today)
+        # The explicit request outranks what we remembered about the lead
+        ranking = TimePreference(
+            weekdays=parsed_query.weekdays or preference.weekdays,
+            periods=parsed_query.periods or preference.periods,
+            hour=parsed_query.hour if parsed_query.hour is not None else preference.hour
+        )
+
+        upcoming = [slot for slot in self._candidates(parsed_query) if slot.start > now]
+        exact_match = bool(upcoming)
+        if not upcoming:
+            # Nothing fits the request: offer the closest alternatives instead
+            upcoming = [slot for slot in self.slots if slot.start > now]
+
+        ranked = sorted(upcoming, key=lambda slot: self._score(slot, ranking, now), reverse=True)
+        top = ranked[:limit]
+
+        return {
+            "exact_match": exact_match,
+            "total_matching": len(upcoming) if exact_match else 0,
+            "slots": [slot.to_dict() for slot in top]
+        }
+
+
+class TenantAvailabilityIndexes:
+    """One AvailabilityIndex per tenant, since each branch has its own Calendly event type"""
+
+    def __init__(self):
+        self.indexes: Dict[str, AvailabilityIndex] = {}
+
+    def get(self) -> AvailabilityIndex:
+        """Index of the current tenant (built empty on first use)"""
+        tenant = get_current_tenant()
+        index = self.indexes.get(tenant.tenant_id)
+        if index is None:
+            index = self.indexes[tenant.tenant_id] = AvailabilityIndex(timezone=tenant.gym_timezone)
+        return index
+
+# Singleton instance
+availability_indexes = TenantAvailabilityIndexes()
@@ -0,0 +1,249 @@
+import hashlib
+import hmac
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+from pymongo import ReplaceOne
+from pymongo.errors import DuplicateKeyError
+from app.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+META_DOC_ID = "meta"  # Sync state document in calendly_availability
+
+EVENT_CREATED = "invitee.created"
+EVENT_CANCELED = "invitee.canceled"
+
+
+class WebhookSignatureError(Exception):
+    """Raised when a webhook's Calendly-Webhook-Signature header doesn't verify"""
+
+
+def _parse_time(value: str) -> datetime:
+    """Calendly ISO timestamp -> naive UTC datetime (how Mongo stores them)"""
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if parsed.tzinfo:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def sign_payload(body: bytes, signing_key: str, timestamp: Optional[int] = None) -> str:
+    """Build a Calendly-Webhook-Signature header value ("t=...,v1=...") for a body"""
+    timestamp = int(timestamp if timestamp is not None else time.time())
+    digest = hmac.new(signing_key.encode(), f"{timestamp}.".encode() + body, hashlib.sha256).hexdigest()
+    return f"t={timestamp},v1={digest}"
+
+
+def verify_signature(body: bytes, header: Optional[str], signing_key: str, tolerance_seconds: int) -> None:
+    """
+    Check a webhook body against its Calendly-Webhook-Signature header
+
+    Raises:
+        WebhookSignatureError: Missing/malformed header, bad digest or stale timestamp
+    """
+    if not header:
+        raise WebhookSignatureError("Missing signature header")
+
+    parts = dict(item.split("=", 1) for item in header.split(",") if "=" in item)
+    timestamp, signature = parts.get("t"), parts.get("v1")
+    if not timestamp or not signature or not timestamp.isdigit():
+        raise WebhookSignatureError("Malformed signature header")
+
+    expected = sign_payload(body, signing_key, int(timestamp)).split("v1=", 1)[1]
+    if not hmac.compare_digest(expected, signature):
+        raise WebhookSignatureError("Signature mismatch")
+    if abs(time.time() - int(timestamp)) > tolerance_seconds:
+        raise WebhookSignatureError("Signature timestamp outside tolerance")
+
+
+class BookingMirrorService:
+    """
+    Local mirror of Calendly bookings and trial availability
+
+    - `calendly_bookings`: one document per invitee, kept current by the
+      invitee.created / invitee.canceled webhooks
+    - `calendly_availability`: one document per slot start (UTC) with status
+      "available" or "booked", plus a "meta" document recording which window
+      was last synced from the Calendly API
+
+    Webhooks flip slots between available and booked as bookings come and go;
+    a periodic resync (availability_mirror_max_age_seconds) picks up anything
+    webhooks don't cover, such as the host's other calendar events.
+    """
+
+    def __init__(self):
+        self.bookings = None
+        self.availability = None
+
+    def attach(self, db):
+        """Bind to the mirror collections of a connected database"""
+        self.bookings = db["calendly_bookings"]
+        self.availability = db["calendly_availability"]
+
+    async def create_indexes(self):
+        await self.bookings.create_index("email")
+        await self.bookings.create_index("start_time")
+        await self.availability.create_index([("status", 1), ("start_time", 1)])
+
+    async def get_available_slots(self, days_ahead: int, limit: Optional[int] = None) -> Optional[List[Dict]]:
+        """
+        Available slots from the mirror
+
+        Returns:
+            Slots in the same shape as CalendlyService.get_available_slots, or
+            None if the mirror is stale or doesn't cover the requested window
+        """
+        if self.availability is None:
+            return None
+
+        now = datetime.utcnow()
+        end = now + timedelta(days=days_ahead)
+        meta = await self.availability.find_one({"_id": META_DOC_ID})
+        if not meta:
+            return None
+        if (now - meta["synced_at"]).total_seconds() > settings.availability_mirror_max_age_seconds:
+            return None
+        if meta["window_end"] < end - timedelta(minutes=5):
+            return None
+
+        cursor = self.availability.find(
+            {"status": "available", "start_time": {"$gt": now, "$lte": end}}
+        ).sort("start_time", 1)
+        if limit:
+            cursor = cursor.limit(limit)
+
+        return [
+            {
+                "start_time": doc["_id"],
+                "formatted": doc["start_time"].strftime("%B %d, %Y at %I:%M %p"),
+                "status": "available"
+            }
+            async for doc in cursor
+        ]
+
+    async def replace_availability(self, slots: List[Dict], days_ahead: int) -> None:
+        """
+        Store a fresh availability window fetched from the Calendly API
+
+        Slots in the window that Calendly no longer offers are marked booked
+        (taken by someone or blocked by the host) rather than deleted, so a
+        later cancellation webhook can reopen them.
+        """
+        if self.availability is None:
+            return
+
+        now = datetime.utcnow()
+        window_end = now + timedelta(days=days_ahead)
+        offered = []
+        operations = []
+        for slot in slots:
+            offered.append(slot["start_time"])
+            operations.append(ReplaceOne(
+                {"_id": slot["start_time"]},
+                {
+                    "start_time": _parse_time(slot["start_time"]),
+                    "status": "available",
+                    "synced_at": now
+                },
+                upsert=True
+            ))
+
+        try:
+            if operations:
+                await self.availability.bulk_write(operations, ordered=False)
+            await self.availability.update_many(
+                {
+                    "_id": {"$nin": offered + [META_DOC_ID]},
+                    "status": "available",
+                    "start_time": {"$gt": now, "$lte": window_end}
+                },
+                {"$set": {"status": "booked", "synced_at": now}}
+            )
+            await self.availability.delete_many({"start_time": {"$lt": now}})
+            await self.availability.update_one(
+                {"_id": META_DOC_ID},
+                {"$set": {"synced_at": now, "window_end": window_end, "slots": len(slots)}},
+                upsert=True
+            )
+        except Exception as e:
+            logger.warning("Error storing availability", extra={"slots": len(slots), "error": str(e) or type(e).__name__})
+
+    async def apply_event(self, event: Dict) -> bool:
+        """
+        Apply an invitee.created / invitee.canceled webhook
+
+        Args:
+            event: Parsed webhook body ({"event": ..., "created_at": ..., "payload": {...}})
+
+        Returns:
+            True if the mirror changed, False for ignored or already-applied events
+        """
+        event_type = event.get("event")
+        if event_type not in (EVENT_CREATED, EVENT_CANCELED):
+            return False
+
+        payload = event.get("payload") or {}
+        scheduled_event = payload.get("scheduled_event") or {}
+        invitee_uri = payload.get("uri")
+        start_time = scheduled_event.get("start_time")
+        if not invitee_uri or not start_time:
+            return False
+
+        event_type_uri = scheduled_event.get("event_type")
+        if event_type_uri and event_type_uri != settings.calendly_event_type_uri:
+            return False
+
+        status = "active" if event_type == EVENT_CREATED else "canceled"
+        event_at = _parse_time(event.get("created_at") or payload.get("updated_at") or start_time)
+
+        booking = {
+            "status": status,
+            "event_at": event_at,
+            "email": payload.get("email"),
+            "name": payload.get("name"),
+            "scheduled_event_uri": scheduled_event.get("uri"),
+            "start_time": _parse_time(start_time),
+            "end_time": _parse_time(scheduled_event["end_time"]) if scheduled_event.get("end_time") else None,
+            "cancel_reason": (payload.get("cancellation") or {}).get("reason"),
+            "rescheduled": bool(payload.get("rescheduled"))
+        }
+
+        # Only apply events newer than what we have: webhooks can arrive twice
+        # or out of order, and then the upsert collides with the existing _id
+        try:
+            await self.bookings.update_one(
+                {"_id": invitee_uri, "event_at": {"$not": {"$gte": event_at}}},
+                {"$set": booking},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+
+        await self._set_slot_status(start_time, "booked" if status == "active" else "available")
+        logger.info("Booking mirror updated", extra={"event": event_type, "start_time": start_time})
+        return True
+
+    async def _set_slot_status(self, start_time: str, status: str) -> None:
+        """Flip a mirrored slot; slots outside the synced window are left to the next sync"""
+        slot_start = _parse_time(start_time)
+        if slot_start <= datetime.utcnow():
+            return
+        await self.availability.update_one(
+            {"start_time": slot_start},
+            {"$set": {"status": status, "synced_at": datetime.utcnow()}}
+        )
+
+    async def get_stats(self) -> Dict:
+        meta = await self.availability.find_one({"_id": META_DOC_ID}) or {}
+        return {
+            "synced_at": meta.get("synced_at"),
+            "window_end": meta.get("window_end"),
+            "available_slots": await self.availability.count_documents(
+                {"status": "available", "start_time": {"$gt": datetime.utcnow()}}
+            ),
+            "active_bookings": await self.bookings.count_documents({"status": "active"})
+        }
+
+# Singleton instance
+booking_mirror = BookingMirrorService()
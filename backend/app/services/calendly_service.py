@@ -2,6 +2,12 @@ import httpx
 from datetime import datetime, timedelta
 from typing import List, Dict, Optional
 from app.config import settings
+from app.services.booking_mirror import booking_mirror
+from app.services.tenants import get_current_tenant
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class CalendlyService:
     """
@@ -11,71 +17,147 @@ class CalendlyService:
     
     def __init__(self):
         self.api_token = settings.calendly_api_token
-        self.event_type_uri = settings.calendly_event_type_uri
         self.base_url = "https://api.calendly.com"
         self.headers = {
             "Authorization": f"Bearer {self.api_token}",
             "Content-Type": "application/json"
         }
+        # Shared client so connections (and TLS sessions) are reused across calls
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def event_type_uri(self) -> str:
+        """Trial event type of the current tenant's branch"""
+        return get_current_tenant().calendly_event_type_uri
+    
+    @staticmethod
+    def _use_mirror() -> bool:
+        # The booking mirror follows the default branch's event type only
+        return settings.availability_mirror_enabled and get_current_tenant().is_default
     
-    async def get_available_slots(self, days_ahead: int = 7) -> List[Dict]:
+    def _get_client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                headers=self.headers,
+                timeout=httpx.Timeout(15.0, connect=5.0),
+                limits=httpx.Limits(max_keepalive_connections=10, max_connections=20)
+            )
+        return self._client
+    
+    async def warm_up(self) -> bool:
+        """Open a pooled connection to the Calendly API ahead of the first request"""
+        try:
+            response = await self._get_client().get(f"{self.base_url}/users/me")
+            return response.status_code < 500
+        except Exception as e:
+            logger.warning("Calendly warm-up failed", extra={"error": str(e) or type(e).__name__})
+            return False
+    
+    async def close(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+    
+    async def get_available_slots(self, days_ahead: int = 7, limit: Optional[int] = 10) -> List[Dict]:
         """
         Get available time slots for booking
         
+        Served from the local booking mirror when it's fresh (kept current by
+        the Calendly webhooks); otherwise fetched live and stored in the mirror.
+        
         Args:
             days_ahead: Number of days to look ahead for availability
+            limit: Maximum number of slots to return (None for all)
             
         Returns:
             List of available time slots with datetime and formatted string
         """
+        if self._use_mirror():
+            try:
+                slots = await booking_mirror.get_available_slots(days_ahead, limit)
+                if slots is not None:
+                    return slots
+            except Exception as e:
+                logger.warning("Booking mirror read failed, fetching live", extra={"error": str(e) or type(e).__name__})
+        
         try:
-            start_time = datetime.utcnow().isoformat()
-            end_time = (datetime.utcnow() + timedelta(days=days_ahead)).isoformat()
+            slots = await self.fetch_available_slots(days_ahead)
             
-            # Get event type details first
-            async with httpx.AsyncClient() as client:
-                event_response = await client.get(
-                    self.event_type_uri,
-                    headers=self.headers
-                )
-                event_response.raise_for_status()
-                
-                # Get available times
-                params = {
-                    "event_type": self.event_type_uri,
-                    "start_time": start_time,
-                    "end_time": end_time
-                }
-                
-                availability_response = await client.get(
-                    f"{self.base_url}/event_type_available_times",
-                    headers=self.headers,
-                    params=params
-                )
+            if slots is None:
+                # Fallback: return mock slots for testing
+                return self._generate_mock_slots(days_ahead)
+            
+            if self._use_mirror():
+                await booking_mirror.replace_availability(slots, days_ahead)
+            
+            return slots[:limit] if limit else slots
                 
-                if availability_response.status_code == 200:
-                    data = availability_response.json()
-                    slots = []
-                    
-                    for item in data.get("collection", []):
-                        for slot in item.get("spots", []):
-                            start_dt = datetime.fromisoformat(slot["start_time"].replace("Z", "+00:00"))
-                            slots.append({
-                                "start_time": slot["start_time"],
-                                "formatted": start_dt.strftime("%B %d, %Y at %I:%M %p"),
-                                "status": slot.get("status", "available")
-                            })
-                    
-                    return slots[:10]  # Return first 10 slots
-                else:
-                    # Fallback: return mock slots for testing
-                    return self._generate_mock_slots(days_ahead)
-                    
         except Exception as e:
-            print(f"Error fetching availability: {str(e)}")
+            logger.warning("Error fetching availability, using mock slots", extra={"days_ahead": days_ahead, "error": str(e) or type(e).__name__})
             # Return mock slots as fallback
             return self._generate_mock_slots(days_ahead)
     
+    async def fetch_available_slots(self, days_ahead: int = 7) -> Optional[List[Dict]]:
+        """
+        Fetch every available slot from the Calendly API (no mirror, no fallback)
+        
+        Returns:
+            List of slots, or None if Calendly didn't return availability
+        """
+        start_time = datetime.utcnow().isoformat()
+        end_time = (datetime.utcnow() + timedelta(days=days_ahead)).isoformat()
+        
+        # Get event type details first
+        client = self._get_client()
+        event_response = await client.get(
+            self.event_type_uri,
+            headers=self.headers
+        )
+        event_response.raise_for_status()
+        
+        # Get available times
+        params = {
+            "event_type": self.event_type_uri,
+            "start_time": start_time,
+            "end_time": end_time
+        }
+        
+        availability_response = await client.get(
+            f"{self.base_url}/event_type_available_times",
+            headers=self.headers,
+            params=params
+        )
+        
+        if availability_response.status_code != 200:
+            return None
+        
+        data = availability_response.json()
+        slots = []
+        
+        for item in data.get("collection", []):
+            for slot in item.get("spots", []):
+                start_dt = datetime.fromisoformat(slot["start_time"].replace("Z", "+00:00"))
+                slots.append({
+                    "start_time": slot["start_time"],
+                    "formatted": start_dt.strftime("%B %d, %Y at %I:%M %p"),
+                    "status": slot.get("status", "available")
+                })
+        
+        return slots
+    
+    async def sync_mirror(self) -> bool:
+        """Refresh the local availability mirror from the Calendly API"""
+        try:
+            slots = await self.fetch_available_slots(settings.availability_mirror_days)
+            if slots is None:
+                return False
+            await booking_mirror.replace_availability(slots, settings.availability_mirror_days)
+            return True
+        except Exception as e:
+            logger.warning("Booking mirror sync failed", extra={"error": str(e) or type(e).__name__})
+            return False
+    
     def _generate_mock_slots(self, days_ahead: int = 7) -> List[Dict]:
         """Generate mock available slots for testing"""
         slots = []
@@ -97,7 +179,7 @@ class CalendlyService:
         email: str,
         name: str,
         start_time: str,
-        timezone: str = "Asia/Kolkata"
+        timezone: Optional[str] = None
     ) -> Dict:
         """
         Create a booking/scheduling request
@@ -106,12 +188,13 @@ class CalendlyService:
             email: User's email
             name: User's full name
             start_time: ISO format datetime string
-            timezone: User's timezone
+            timezone: User's timezone (default: the current gym branch's)
             
         Returns:
             Dictionary with booking details or error
         """
         try:
+            timezone = timezone or get_current_tenant().gym_timezone
             payload = {
                 "event_type": self.event_type_uri,
                 "start_time": start_time,
@@ -122,27 +205,27 @@ class CalendlyService:
                 }
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/scheduling_links",
-                    headers=self.headers,
-                    json=payload
-                )
+            client = self._get_client()
+            response = await client.post(
+                f"{self.base_url}/scheduling_links",
+                headers=self.headers,
+                json=payload
+            )
+            
+            if response.status_code in [200, 201]:
+                data = response.json()
+                return {
+                    "success": True,
+                    "booking_url": data.get("resource", {}).get("booking_url"),
+                    "scheduled_time": start_time,
+                    "message": "Booking link created successfully!"
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": f"Failed to create booking: {response.text}"
+                }
                 
-                if response.status_code in [200, 201]:
-                    data = response.json()
-                    return {
-                        "success": True,
-                        "booking_url": data.get("resource", {}).get("booking_url"),
-                        "scheduled_time": start_time,
-                        "message": "Booking link created successfully!"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": f"Failed to create booking: {response.text}"
-                    }
-                    
         except Exception as e:
             return {
                 "success": False,
@@ -165,29 +248,29 @@ class CalendlyService:
             if reason:
                 payload["reason"] = reason
                 
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    f"{self.base_url}/scheduled_events/{booking_uuid}/cancellation",
-                    headers=self.headers,
-                    json=payload
-                )
+            client = self._get_client()
+            response = await client.post(
+                f"{self.base_url}/scheduled_events/{booking_uuid}/cancellation",
+                headers=self.headers,
+                json=payload
+            )
+            
+            if response.status_code in [200, 201]:
+                return {
+                    "success": True,
+                    "message": "Booking cancelled successfully"
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": f"Failed to cancel: {response.text}"
+                }
                 
-                if response.status_code in [200, 201]:
-                    return {
-                        "success": True,
-                        "message": "Booking cancelled successfully"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": f"Failed to cancel: {response.text}"
-                    }
-                    
         except Exception as e:
             return {
                 "success": False,
                 "message": f"Error cancelling booking: {str(e)}"
             }
 
-# Singleton instance
-calendly_service = CalendlyService()
\ No newline at end of file
+# Singleton instance (built on first use)
+calendly_service = LazySingleton(CalendlyService)
\ No newline at end of file
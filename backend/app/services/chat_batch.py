@@ -0,0 +1,99 @@
+import asyncio
+from collections import deque
+from typing import AsyncIterator, Dict, List, Sequence
+from app.models.schemas import BatchChatMessage
+from app.services.admission import admission_controller, AdmissionRejected
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"  # The turn failed; later messages of the session still run
+STATUS_BUSY = "busy"  # Shed by admission control; retry after retry_after seconds
+STATUS_SKIPPED = "skipped"  # Not run because an earlier message of the session was shed
+
+
+def _result(index: int, item: BatchChatMessage, status: str, **fields) -> Dict:
+    return {
+        "index": index,
+        "message_id": item.message_id,
+        "session_id": item.session_id,
+        "status": status,
+        **fields
+    }
+
+
+async def _run_turn(agent, index: int, item: BatchChatMessage) -> Dict:
+    """One message through admission control and the agent, as a result line"""
+    try:
+        priority = await agent.get_priority(item.session_id, item.message)
+        async with admission_controller.admit(priority):
+            result = await agent.process_message(user_message=item.message, session_id=item.session_id)
+    except AdmissionRejected as e:
+        return _result(index, item, STATUS_BUSY, retry_after=e.retry_after)
+    except Exception as e:
+        logger.warning("Batch message failed", extra={"session_id": item.session_id, "error": str(e)})
+        return _result(index, item, STATUS_ERROR, error=str(e))
+
+    return _result(
+        index,
+        item,
+        STATUS_ERROR if result.get("error") else STATUS_OK,
+        response=result["response"],
+        intent_level=result.get("intent_level"),
+        booking_made=result.get("booking_made", False),
+        usage=result.get("usage")
+    )
+
+
+async def run_chat_batch(agent, messages: Sequence[BatchChatMessage], concurrency: int) -> AsyncIterator[Dict]:
+    """
+    Run a batch of lead messages, yielding each result as soon as it's ready
+
+    Messages are grouped by session. A session's messages run one after
+    another in batch order, so each turn sees the previous one's history;
+    up to `concurrency` sessions run at once, and every turn still goes
+    through admission control like a /chat request. If a turn is shed, the
+    session's remaining messages are returned as "skipped" rather than run
+    out of order, so the gateway can resend them together.
+
+    Order is only kept within one batch: the same session posted in two
+    concurrent batches (or batch and /chat) isn't serialized.
+
+    Args:
+        agent: The tenant's MainSalesAgent
+        messages: The batch, in arrival order
+        concurrency: Most sessions run at once
+
+    Yields:
+        One result per message (with its `index` in the batch), in
+        completion order
+    """
+    sessions: Dict[str, List[int]] = {}
+    for index, item in enumerate(messages):
+        sessions.setdefault(item.session_id, []).append(index)
+
+    waiting = deque(sessions.values())
+    results: asyncio.Queue = asyncio.Queue()
+
+    async def run_session(indexes: List[int]) -> None:
+        for position, index in enumerate(indexes):
+            result = await _run_turn(agent, index, messages[index])
+            results.put_nowait(result)
+            if result["status"] == STATUS_BUSY:
+                for skipped in indexes[position + 1:]:
+                    results.put_nowait(_result(skipped, messages[skipped], STATUS_SKIPPED))
+                return
+
+    async def worker() -> None:
+        while waiting:
+            await run_session(waiting.popleft())
+
+    workers = [asyncio.create_task(worker()) for _ in range(min(max(1, concurrency), len(waiting)))]
+    try:
+        for _ in range(len(messages)):
+            yield await results.get()
+    finally:
+        # The client went away (or the batch is done): stop starting turns
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,151 @@
+from fastapi import WebSocket
+from langchain.callbacks.base import AsyncCallbackHandler
+from typing import Dict, Optional, Tuple
+import asyncio
+import json
+import time
+
+from app.config import settings
+from app.services.tenants import get_current_tenant
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+SEND_TIMEOUT_SECONDS = 10
+
+
+class ChatConnection:
+    """
+    One persistent WebSocket chat connection
+
+    Outbound frames go through a bounded queue drained by a single sender
+    task. Token frames are droppable: if the client can't keep up they are
+    discarded (the final "response" frame always carries the full text).
+    Any other frame waits for room, and a client that stays blocked longer
+    than SEND_TIMEOUT_SECONDS is disconnected.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str, tenant_id: Optional[str] = None):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.tenant_id = tenant_id or get_current_tenant().tenant_id
+        self.outbound: asyncio.Queue = asyncio.Queue(maxsize=settings.ws_send_queue_size)
+        self.last_seen = time.monotonic()
+        self.dropped_tokens = 0
+        self.closed = False
+        self._tasks = []
+
+    def start(self) -> None:
+        self._tasks = [
+            asyncio.create_task(self._sender()),
+            asyncio.create_task(self._heartbeat())
+        ]
+
+    async def _sender(self) -> None:
+        try:
+            while True:
+                frame = await self.outbound.get()
+                await self.websocket.send_text(json.dumps(frame, default=str))
+        except Exception:
+            await self.close()
+
+    async def _heartbeat(self) -> None:
+        interval = settings.ws_heartbeat_seconds
+        while not self.closed:
+            await asyncio.sleep(interval)
+            if time.monotonic() - self.last_seen > interval * 2:
+                logger.info("Heartbeat timeout, closing connection", extra={"session_id": self.session_id, "tenant_id": self.tenant_id})
+                await self.close(code=1011)
+                return
+            await self.send({"type": "ping"})
+
+    def touch(self) -> None:
+        """Mark the client as alive (any inbound frame counts)"""
+        self.last_seen = time.monotonic()
+
+    def send_token(self, text: str) -> None:
+        """Queue a streamed token; dropped if the client is behind"""
+        try:
+            self.outbound.put_nowait({"type": "token", "text": text})
+        except asyncio.QueueFull:
+            self.dropped_tokens += 1
+
+    async def send(self, frame: Dict) -> bool:
+        """Queue a frame that must be delivered; closes the connection if the client is stuck"""
+        if self.closed:
+            return False
+        try:
+            await asyncio.wait_for(self.outbound.put(frame), SEND_TIMEOUT_SECONDS)
+            return True
+        except asyncio.TimeoutError:
+            logger.warning("Client too slow, closing connection", extra={"session_id": self.session_id, "tenant_id": self.tenant_id})
+            await self.close(code=1013)
+            return False
+
+    async def close(self, code: int = 1000) -> None:
+        if self.closed:
+            return
+        self.closed = True
+        current = asyncio.current_task()
+        for task in self._tasks:
+            if task is not current:
+                task.cancel()
+        try:
+            await self.websocket.close(code=code)
+        except Exception:
+            pass
+
+
+class TokenStreamHandler(AsyncCallbackHandler):
+    """Forwards LLM tokens of the agent's answer to a WebSocket connection"""
+
+    def __init__(self, connection: ChatConnection):
+        self.connection = connection
+
+    async def on_llm_new_token(self, token: str, **kwargs) -> None:
+        # Function-call generations stream empty content tokens
+        if token:
+            self.connection.send_token(token)
+
+
+class ConnectionManager:
+    """
+    Registry of live chat connections, used for server-initiated pushes
+
+    Connections are keyed by (tenant id, session id), like event bus topics,
+    so gym branches never reach each other's leads when session ids collide;
+    the tenant defaults to the current one.
+    """
+
+    def __init__(self):
+        self.connections: Dict[Tuple[str, str], ChatConnection] = {}
+
+    @staticmethod
+    def _key(session_id: str, tenant_id: Optional[str] = None) -> Tuple[str, str]:
+        return (tenant_id or get_current_tenant().tenant_id, session_id)
+
+    def register(self, connection: ChatConnection) -> None:
+        key = self._key(connection.session_id, connection.tenant_id)
+        previous = self.connections.get(key)
+        self.connections[key] = connection
+        if previous and previous is not connection:
+            # One connection per session: the newest one wins
+            asyncio.create_task(previous.close(code=4000))
+
+    def unregister(self, connection: ChatConnection) -> None:
+        key = self._key(connection.session_id, connection.tenant_id)
+        if self.connections.get(key) is connection:
+            del self.connections[key]
+
+    def get(self, session_id: str, tenant_id: Optional[str] = None) -> Optional[ChatConnection]:
+        return self.connections.get(self._key(session_id, tenant_id))
+
+    async def send_to_session(self, session_id: str, frame: Dict, tenant_id: Optional[str] = None) -> bool:
+        """Push a frame to a session's open connection; False if it isn't connected"""
+        connection = self.connections.get(self._key(session_id, tenant_id))
+        if not connection:
+            return False
+        return await connection.send(frame)
+
+# Singleton instance
+connection_manager = ConnectionManager()
@@ -0,0 +1,209 @@
+import asyncio
+from datetime import datetime
+from typing import Dict, Optional, Set, Tuple
+from app.config import settings
+from app.services.tenants import get_current_tenant
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+ALL_LEADS = "*"  # Session id whose topic receives events for every session of a tenant
+
+Topic = Tuple[str, str]  # (tenant id, session id or ALL_LEADS)
+
+# Metadata that changes on every write and isn't worth pushing on its own
+IGNORED_FIELDS = {"_id", "last_updated", "created_at"}
+
+
+class Subscription:
+    """A single subscriber's bounded event queue"""
+
+    __slots__ = ("topic", "queue", "dropped")
+
+    def __init__(self, topic: Topic, queue_size: int):
+        self.topic = topic
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.dropped = 0
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Dict]:
+        """Next event, or None if nothing arrived within `timeout` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class EventBus:
+    """
+    In-process publish/subscribe for lead memory and intent changes
+
+    Topics are (tenant id, session id) pairs, plus (tenant id, ALL_LEADS) for
+    every session of one gym branch; the tenant defaults to the current one,
+    so branches never see each other's leads even when session ids collide.
+    Publishers hand over the fields that changed; each subscriber receives
+    only the delta against the last state the bus has seen for that session.
+    Delivery never blocks the publisher: a subscriber whose queue is full has
+    its backlog replaced by a single "resync" event carrying the full known
+    state.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.subscribers: Dict[Topic, Set[Subscription]] = {}
+        self.snapshots: Dict[Topic, Dict] = {}
+        self.change_stream_active = False
+        self.published = 0
+
+    @staticmethod
+    def topic(session_id: str, tenant_id: Optional[str] = None) -> Topic:
+        return (tenant_id or get_current_tenant().tenant_id, session_id)
+
+    def subscribe(self, session_id: str, snapshot: Optional[Dict] = None, tenant_id: Optional[str] = None) -> Subscription:
+        """
+        Register a subscriber for a session (or ALL_LEADS)
+
+        Args:
+            session_id: Session id to follow
+            snapshot: Current state of the session, used as the delta baseline
+            tenant_id: Branch of the session (default: the current tenant)
+        """
+        topic = self.topic(session_id, tenant_id)
+        subscription = Subscription(topic, self.queue_size)
+        self.subscribers.setdefault(topic, set()).add(subscription)
+        if snapshot is not None and session_id != ALL_LEADS:
+            self.snapshots[topic] = {k: v for k, v in snapshot.items() if k not in IGNORED_FIELDS}
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self.subscribers.get(subscription.topic)
+        if not subscribers:
+            return
+        subscribers.discard(subscription)
+        if not subscribers:
+            del self.subscribers[subscription.topic]
+            self.snapshots.pop(subscription.topic, None)
+
+    def has_subscribers(self, session_id: str, tenant_id: Optional[str] = None) -> bool:
+        tenant_id = tenant_id or get_current_tenant().tenant_id
+        return (tenant_id, session_id) in self.subscribers or (tenant_id, ALL_LEADS) in self.subscribers
+
+    def _deliver(self, subscription: Subscription, topic: Topic, event: Dict) -> None:
+        try:
+            subscription.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Slow consumer: drop its backlog and send the full state instead
+            subscription.dropped += subscription.queue.qsize()
+            while not subscription.queue.empty():
+                subscription.queue.get_nowait()
+            subscription.queue.put_nowait({
+                "type": "resync",
+                "tenant": event["tenant"],
+                "session_id": event["session_id"],
+                "fields": dict(self.snapshots.get(topic, event["fields"])),
+                "timestamp": event["timestamp"]
+            })
+
+    def publish(
+        self,
+        session_id: str,
+        fields: Dict,
+        event_type: str = "memory",
+        tenant_id: Optional[str] = None
+    ) -> Optional[Dict]:
+        """
+        Publish changed fields for a session
+
+        Args:
+            session_id: Session the change belongs to
+            fields: Field values after the change (may include unchanged ones)
+            event_type: "memory" or "intent"
+            tenant_id: Branch of the session (default: the current tenant)
+
+        Returns:
+            The delivered event, or None if nothing changed or nobody listens
+        """
+        topic = self.topic(session_id, tenant_id)
+        tenant_id = topic[0]
+        if not self.has_subscribers(session_id, tenant_id):
+            return None
+
+        snapshot = self.snapshots.get(topic)
+        delta = {
+            key: value for key, value in fields.items()
+            if key not in IGNORED_FIELDS and (snapshot is None or snapshot.get(key) != value)
+        }
+        if not delta:
+            return None
+        if snapshot is not None:
+            snapshot.update(delta)
+
+        event = {
+            "type": event_type,
+            "tenant": tenant_id,
+            "session_id": session_id,
+            "fields": delta,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        for subscription in tuple(self.subscribers.get(topic, ())):
+            self._deliver(subscription, topic, event)
+        for subscription in tuple(self.subscribers.get((tenant_id, ALL_LEADS), ())):
+            self._deliver(subscription, topic, event)
+
+        self.published += 1
+        return event
+
+    def publish_memory_change(self, session_id: str, old_doc: Optional[Dict], new_doc: Dict) -> None:
+        """Publish a memory write made by this process as the current tenant (skipped when the change stream feeds the bus)"""
+        if self.change_stream_active or not self.has_subscribers(session_id):
+            return
+        if old_doc and self.topic(session_id) not in self.snapshots:
+            changed = {k: v for k, v in new_doc.items() if old_doc.get(k) != v}
+        else:
+            changed = new_doc
+        self.publish(session_id, changed, event_type="memory")
+
+    async def watch_change_stream(self, db, memory_collections: Dict[str, str]) -> None:
+        """
+        Feed the bus from one MongoDB change stream over every tenant's memory collection
+
+        Requires a replica set; on standalone servers this logs and returns,
+        leaving save_memory to publish its own writes.
+
+        Args:
+            db: Database holding the memory collections
+            memory_collections: Memory collection name -> tenant id
+        """
+        pipeline = [{"$match": {"ns.coll": {"$in": list(memory_collections)}}}]
+        try:
+            async with db.watch(pipeline, full_document="updateLookup") as stream:
+                self.change_stream_active = True
+                logger.info("Memory change stream active", extra={"collections": len(memory_collections), "force": True})
+                async for change in stream:
+                    tenant_id = memory_collections.get(change.get("ns", {}).get("coll"))
+                    session_id = change.get("documentKey", {}).get("_id")
+                    if tenant_id is None or session_id is None or not self.has_subscribers(session_id, tenant_id):
+                        continue
+
+                    if change.get("operationType") == "update":
+                        fields = change.get("updateDescription", {}).get("updatedFields", {})
+                    else:
+                        fields = change.get("fullDocument") or {}
+                    self.publish(session_id, fields, event_type="memory", tenant_id=tenant_id)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Change stream unavailable, using in-process events", extra={"error": str(e) or type(e).__name__})
+        finally:
+            self.change_stream_active = False
+
+    def get_stats(self) -> Dict:
+        return {
+            "topics": len(self.subscribers),
+            "subscribers": sum(len(s) for s in self.subscribers.values()),
+            "published": self.published,
+            "change_stream_active": self.change_stream_active
+        }
+
+# Singleton instance
+event_bus = LazySingleton(lambda: EventBus(queue_size=settings.event_subscriber_queue_size))
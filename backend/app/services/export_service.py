@@ -0,0 +1,148 @@
+from typing import AsyncIterator, Dict, Optional
+import csv
+import io
+import json
+import zlib
+
+# Column order for exports: session id, every LeadMemory field, timestamps
+EXPORT_FIELDS = [
+    "session_id",
+    "fitness_goals",
+    "past_experience",
+    "location_proximity",
+    "joining_timeline",
+    "motivation",
+    "preferred_time",
+    "health_physical_info",
+    "objections",
+    "conversation_summary",
+    "total_messages",
+    "last_intent",
+    "booking_status",
+    "created_at",
+    "last_updated"
+]
+
+EXPORT_FORMATS = ("ndjson", "csv")
+DEFAULT_BATCH_SIZE = 500
+FLUSH_BYTES = 64 * 1024
+
+
+def build_export_query(
+    since: Optional[str] = None,
+    until: Optional[str] = None,
+    intent: Optional[str] = None,
+    resume_after: Optional[str] = None
+) -> Dict:
+    """
+    Build the MongoDB filter for an export
+
+    Args:
+        since: Only leads with last_updated >= this ISO timestamp
+        until: Only leads with last_updated < this ISO timestamp
+        intent: Only leads with this last_intent
+        resume_after: Resume token - the session_id of the last exported lead
+
+    Returns:
+        MongoDB query document
+    """
+    query: Dict = {}
+
+    last_updated = {}
+    if since:
+        last_updated["$gte"] = since
+    if until:
+        last_updated["$lt"] = until
+    if last_updated:
+        query["last_updated"] = last_updated
+
+    if intent:
+        query["last_intent"] = intent
+
+    if resume_after:
+        query["_id"] = {"$gt": resume_after}
+
+    return query
+
+
+def _to_row(doc: Dict) -> Dict:
+    row = {field: doc.get(field) for field in EXPORT_FIELDS}
+    row["session_id"] = doc.get("_id")
+    return row
+
+
+class LeadExporter:
+    """
+    Streams lead memories out of MongoDB without materializing the collection
+
+    Documents are read through a batched cursor sorted by _id and encoded one
+    batch at a time, so memory use depends on batch size, not collection size.
+    """
+
+    def __init__(self, collection, batch_size: int = DEFAULT_BATCH_SIZE):
+        self.collection = collection
+        self.batch_size = batch_size
+        self.last_id: Optional[str] = None
+        self.exported = 0
+
+    async def iter_documents(self, query: Dict) -> AsyncIterator[Dict]:
+        """Yield matching documents in _id order from a batched cursor"""
+        cursor = self.collection.find(query).sort("_id", 1).batch_size(self.batch_size)
+        async for doc in cursor:
+            self.last_id = doc.get("_id")
+            self.exported += 1
+            yield doc
+
+    async def iter_text(
+        self,
+        query: Dict,
+        export_format: str = "ndjson",
+        header: bool = True
+    ) -> AsyncIterator[str]:
+        """Yield encoded NDJSON or CSV text in chunks of roughly FLUSH_BYTES"""
+        if export_format not in EXPORT_FORMATS:
+            raise ValueError(f"Unsupported export format: {export_format}")
+
+        buffer = io.StringIO()
+        writer = None
+        if export_format == "csv":
+            writer = csv.DictWriter(buffer, fieldnames=EXPORT_FIELDS, extrasaction="ignore")
+            if header:
+                writer.writeheader()
+
+        async for doc in self.iter_documents(query):
+            row = _to_row(doc)
+            if writer:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(row, default=str, ensure_ascii=False))
+                buffer.write("\n")
+
+            if buffer.tell() >= FLUSH_BYTES:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+
+        if buffer.tell():
+            yield buffer.getvalue()
+
+    async def iter_bytes(
+        self,
+        query: Dict,
+        export_format: str = "ndjson",
+        gzip: bool = False,
+        header: bool = True
+    ) -> AsyncIterator[bytes]:
+        """Yield the export as bytes, optionally gzip-compressed on the fly"""
+        compressor = zlib.compressobj(6, zlib.DEFLATED, 16 + zlib.MAX_WBITS) if gzip else None
+
+        async for chunk in self.iter_text(query, export_format, header):
+            data = chunk.encode("utf-8")
+            if compressor:
+                # Sync flush so everything yielded so far can be decompressed
+                data = compressor.compress(data) + compressor.flush(zlib.Z_SYNC_FLUSH)
+            if data:
+                yield data
+
+        if compressor:
+            yield compressor.flush()
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from types import MappingProxyType
+from typing import Any, Callable, Dict, Mapping, Optional
+from app.config import settings
+from app.services.tenants import Tenant, get_current_tenant, tenant_registry
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+BACKEND_DIR = Path(__file__).resolve().parents[2]
+
+REQUIRED_SECTIONS = (
+    "operating_hours", "facilities", "trainers", "classes",
+    "membership_plans", "trial", "success_stories"
+)
+
+# Values computed from a snapshot for a tenant: name -> builder(data, tenant).
+# Registered with @derived by the modules that render gym data.
+DERIVATIONS: Dict[str, Callable[[Mapping, Tenant], Any]] = {}
+
+
+def derived(name: str):
+    """Register a builder whose result is computed once per knowledge base version and tenant"""
+    def register(builder: Callable[[Mapping, Tenant], Any]):
+        DERIVATIONS[name] = builder
+        return builder
+    return register
+
+
+class KnowledgeBaseError(Exception):
+    """Raised when a gym data file can't be read or is missing required sections"""
+
+
+def _freeze(value):
+    """Deep read-only copy: dicts become mappingproxies, lists become tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+def resolve_data_path(path: str) -> Path:
+    """Data file paths are relative to the backend directory"""
+    path = Path(path)
+    return path if path.is_absolute() else BACKEND_DIR / path
+
+
+def to_json(value, **kwargs) -> str:
+    """json.dumps that accepts frozen snapshot data"""
+    return json.dumps(value, default=dict, ensure_ascii=False, **kwargs)
+
+
+@dataclass(frozen=True)
+class KnowledgeSnapshot:
+    """One parsed version of a gym data file; never modified once published"""
+    version: str
+    data: Mapping
+    source_mtime: float
+    loaded_at: float
+    _derived: Dict = field(default_factory=dict, compare=False, repr=False)
+
+    def derived(self, name: str, tenant: Optional[Tenant] = None) -> Any:
+        """A registered derivation for a tenant, built on first use for this version"""
+        tenant = tenant or get_current_tenant()
+        key = (name, tenant.tenant_id)
+        value = self._derived.get(key)
+        if value is None:
+            value = self._derived[key] = DERIVATIONS[name](self.data, tenant)
+        return value
+
+
+class KnowledgeBase:
+    """
+    Gym facts loaded from a JSON (or YAML) data file
+
+    The file is parsed into an immutable KnowledgeSnapshot. `reload` re-reads
+    it when its mtime changes and publishes the new snapshot with a single
+    reference swap, so requests always see one complete version and never
+    wait on a reload. A file that fails to parse or validate is ignored and
+    the previous version stays live.
+    """
+
+    def __init__(self, path: str):
+        self.path = resolve_data_path(path)
+        self.snapshot: Optional[KnowledgeSnapshot] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def _parse(self, mtime: float) -> KnowledgeSnapshot:
+        try:
+            text = self.path.read_text(encoding="utf-8")
+            if self.path.suffix in (".yaml", ".yml"):
+                import yaml  # Installed with langchain
+                data = yaml.safe_load(text)
+            else:
+                data = json.loads(text)
+        except Exception as e:
+            raise KnowledgeBaseError(f"Can't read {self.path}: {str(e)}")
+
+        if not isinstance(data, dict):
+            raise KnowledgeBaseError(f"{self.path} must contain an object")
+        missing = [section for section in REQUIRED_SECTIONS if section not in data]
+        if missing:
+            raise KnowledgeBaseError(f"{self.path} is missing sections: {', '.join(missing)}")
+
+        return KnowledgeSnapshot(
+            version=str(data.get("version") or int(mtime)),
+            data=_freeze(data),
+            source_mtime=mtime,
+            loaded_at=time.time()
+        )
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Publish a new snapshot if the file changed
+
+        Derivations for every tenant are built before the swap, so the first
+        requests on a new version don't pay for them.
+
+        Returns:
+            True if a new version was published
+        """
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime
+            except OSError as e:
+                self.last_error = str(e)
+                if self.snapshot is None:
+                    raise KnowledgeBaseError(f"Gym data file not found: {self.path}")
+                return False
+
+            if not force and self.snapshot is not None and mtime == self.snapshot.source_mtime:
+                return False
+
+            try:
+                snapshot = self._parse(mtime)
+                tenants = [t for t in tenant_registry.all() if resolve_data_path(t.gym_info_file) == self.path]
+                for tenant in tenants:
+                    for name in DERIVATIONS:
+                        snapshot.derived(name, tenant)
+            except Exception as e:
+                self.last_error = str(e)
+                if self.snapshot is None:
+                    raise
+                logger.warning("Gym data invalid, keeping current version", extra={"file": self.path.name, "version": self.snapshot.version, "error": str(e)})
+                return False
+
+            previous = self.snapshot
+            self.snapshot = snapshot
+            self.last_error = None
+            if previous is not None:
+                logger.info("Gym data reloaded", extra={"file": self.path.name, "previous_version": previous.version, "version": snapshot.version, "force": True})
+            return True
+
+    def current(self) -> KnowledgeSnapshot:
+        """Live snapshot (the file is loaded on first use)"""
+        snapshot = self.snapshot
+        if snapshot is None:
+            self.reload()
+            snapshot = self.snapshot
+        return snapshot
+
+    def get_stats(self) -> Dict:
+        snapshot = self.snapshot
+        return {
+            "path": str(self.path),
+            "version": snapshot.version if snapshot else None,
+            "loaded_at": snapshot.loaded_at if snapshot else None,
+            "last_error": self.last_error
+        }
+
+
+class GymKnowledge:
+    """Knowledge bases by data file; each tenant reads the file named by its gym_info_file"""
+
+    def __init__(self):
+        self.bases: Dict[str, KnowledgeBase] = {}
+
+    def get(self, tenant: Optional[Tenant] = None) -> KnowledgeBase:
+        tenant = tenant or get_current_tenant()
+        base = self.bases.get(tenant.gym_info_file)
+        if base is None:
+            base = self.bases.setdefault(tenant.gym_info_file, KnowledgeBase(tenant.gym_info_file))
+        return base
+
+    def snapshot(self, tenant: Optional[Tenant] = None) -> KnowledgeSnapshot:
+        """Live snapshot of a tenant's gym data (default: the current tenant)"""
+        return self.get(tenant).current()
+
+    def reload_all(self) -> None:
+        for tenant in tenant_registry.all():
+            self.get(tenant)
+        for base in list(self.bases.values()):
+            base.reload()
+
+    async def watch(self):
+        """Poll data files for changes; parsing runs off the event loop"""
+        while True:
+            await asyncio.sleep(settings.gym_info_reload_seconds)
+            try:
+                await asyncio.to_thread(self.reload_all)
+            except Exception as e:
+                logger.exception("Gym data reload failed")
+
+    def get_stats(self) -> Dict:
+        return {name: base.get_stats() for name, base in self.bases.items()}
+
+# Singleton instance
+gym_knowledge = GymKnowledge()
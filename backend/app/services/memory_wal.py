@@ -0,0 +1,290 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import IO, Awaitable, Callable, Dict, List, Optional, Tuple
+from app.config import settings
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger
+
+try:
+    import fcntl
+except ImportError:  # Windows: no locking, so no adopting other processes' logs
+    fcntl = None
+
+logger = get_logger(__name__)
+
+LOCK_SUFFIX = ".lock"
+LOCK_WAIT_SECONDS = 5.0  # A process adopting our previous log holds its lock briefly
+
+
+def _lock_path(log_path: Path) -> Path:
+    return log_path.with_name(log_path.name + LOCK_SUFFIX)
+
+
+class MemoryWAL:
+    """
+    Local append-only log of memory writes that haven't reached MongoDB
+
+    When Mongo is slow or down, `save_memory` appends the full memory document
+    here (one JSON line per write) and returns. Only the newest entry per
+    session matters, since memory writes replace the whole document, so the
+    log keeps an in-memory index of the latest pending document per
+    (tenant, session).
+    Reads check that index first, so a lead's own writes stay visible while
+    the database is unreachable.
+
+    `replay` drains the index into Mongo in batches and rewrites the file with
+    whatever is still pending. On startup `load` rebuilds the index from the
+    file, so writes accepted before a crash are replayed too.
+
+    Every process has its own file, `path` with ".<owner>" before the suffix
+    (the pid for web processes, "worker-<index>" for queue workers), since
+    compacting a shared file would drop the other processes' pending writes.
+    A process holds a lock on "<file>.lock" while it runs; `load` also takes
+    over the files of processes that are gone (their lock is free), newest
+    document per session winning.
+    """
+
+    def __init__(self, path: str, owner: str, fsync: bool = False):
+        self.base_path = Path(path)
+        self.owner = owner
+        self.fsync = fsync
+        self.pending: Dict[Tuple[str, str], Tuple[int, Dict]] = {}
+        self._sequence = 0
+        self._file = None
+        self._lock_file: Optional[IO] = None
+        self.replayed = 0
+        self.adopted = 0
+        self.last_error: Optional[str] = None
+        self.last_replay_at: Optional[float] = None
+
+    @property
+    def path(self) -> Path:
+        """This process's log, e.g. wal/memory.worker-3.jsonl"""
+        return self.base_path.with_name(f"{self.base_path.stem}.{self.owner}{self.base_path.suffix}")
+
+    def load(self) -> int:
+        """
+        Lock this process's log and rebuild the pending index from it and
+        from the logs of processes that are gone
+
+        Returns:
+            Entries pending
+
+        Raises:
+            RuntimeError: Another running process uses the same owner
+        """
+        self.pending.clear()
+        self._lock_own_log()
+        self._read_log(self.path)
+
+        orphans = self._lock_orphans()
+        for log_path, _ in orphans:
+            adopted = self._read_log(log_path)
+            self.adopted += adopted
+            if adopted:
+                logger.info("Adopted memory WAL of a stopped process", extra={"wal": str(log_path), "entries": adopted})
+        if orphans:
+            # Our own file holds the adopted entries before theirs go away
+            self._compact()
+            for log_path, lock_file in orphans:
+                log_path.unlink(missing_ok=True)
+                _lock_path(log_path).unlink(missing_ok=True)
+                lock_file.close()
+
+        if self.pending:
+            logger.info("Loaded pending memory writes", extra={"wal": str(self.path), "pending": len(self.pending)})
+        return len(self.pending)
+
+    def close(self) -> None:
+        """Release this process's log (left in place when writes are still pending)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._lock_file is not None:
+            if not self.pending:
+                _lock_path(self.path).unlink(missing_ok=True)
+            self._lock_file.close()
+            self._lock_file = None
+
+    def _try_lock(self, log_path: Path) -> Optional[IO]:
+        """Exclusive lock on a log's lock file; None when a running process holds it"""
+        log_path.parent.mkdir(parents=True, exist_ok=True)
+        lock_file = _lock_path(log_path).open("a")
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            # Removed by a process that adopted the log while we waited: not the live lock file
+            if os.stat(lock_file.name).st_ino != os.fstat(lock_file.fileno()).st_ino:
+                raise FileNotFoundError(lock_file.name)
+        except OSError:
+            lock_file.close()
+            return None
+        return lock_file
+
+    def _lock_own_log(self) -> None:
+        deadline = time.monotonic() + LOCK_WAIT_SECONDS
+        while self._lock_file is None:
+            self._lock_file = self._try_lock(self.path)
+            if self._lock_file is None:
+                if time.monotonic() >= deadline:
+                    raise RuntimeError(f"Memory WAL {self.path} is locked by another running process")
+                time.sleep(0.1)
+
+    def _lock_orphans(self) -> List[Tuple[Path, IO]]:
+        """Logs of other owners whose lock is free, locked by us (never on Windows)"""
+        if fcntl is None:
+            return []
+        directory = self.base_path.parent
+        candidates = {self.base_path}  # Shared log of versions before per-process files
+        candidates.update(
+            lock.with_name(lock.name[:-len(LOCK_SUFFIX)])
+            for lock in directory.glob(f"{self.base_path.stem}.*{self.base_path.suffix}{LOCK_SUFFIX}")
+        )
+        candidates.update(directory.glob(f"{self.base_path.stem}.*{self.base_path.suffix}"))
+        candidates.discard(self.path)
+
+        orphans = []
+        for log_path in sorted(candidates):
+            if not log_path.exists() and not _lock_path(log_path).exists():
+                continue
+            lock_file = self._try_lock(log_path)
+            if lock_file is not None:
+                orphans.append((log_path, lock_file))
+        return orphans
+
+    def _read_log(self, log_path: Path) -> int:
+        """Merge a log file into the pending index; returns entries read"""
+        if not log_path.exists():
+            return 0
+        read = 0
+        with log_path.open(encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue  # Torn final line from a crash mid-write
+                key = (entry.get("tenant") or settings.default_tenant_id, entry["session_id"])
+                doc = entry["doc"]
+                current = self.pending.get(key)
+                # Within a file later lines are newer; across files compare the documents
+                if current and str(current[1].get("last_updated") or "") > str(doc.get("last_updated") or ""):
+                    continue
+                self._sequence += 1
+                self.pending[key] = (self._sequence, doc)
+                read += 1
+        return read
+
+    def _open(self):
+        if self._file is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._file = self.path.open("a", encoding="utf-8")
+        return self._file
+
+    def append(self, tenant_id: str, session_id: str, memory_doc: Dict) -> None:
+        """Durably record a memory write (flushed to the OS, fsynced if configured)"""
+        self._sequence += 1
+        entry = {
+            "seq": self._sequence,
+            "tenant": tenant_id,
+            "session_id": session_id,
+            "ts": time.time(),
+            "doc": memory_doc
+        }
+        f = self._open()
+        f.write(json.dumps(entry, default=str) + "\n")
+        f.flush()
+        if self.fsync:
+            os.fsync(f.fileno())
+        self.pending[(tenant_id, session_id)] = (self._sequence, memory_doc)
+
+    def get(self, tenant_id: str, session_id: str) -> Optional[Dict]:
+        """Newest pending memory document for a session, if any"""
+        entry = self.pending.get((tenant_id, session_id))
+        return dict(entry[1]) if entry else None
+
+    def discard(self, tenant_id: str, session_id: str) -> None:
+        """Drop a session's pending write (the lead was deleted)"""
+        if self.pending.pop((tenant_id, session_id), None) is not None:
+            self._compact()
+
+    def _compact(self) -> None:
+        """Rewrite the log with only the entries still pending"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if not self.pending:
+            self.path.unlink(missing_ok=True)
+            return
+        tmp_path = self.path.with_suffix(".tmp")
+        with tmp_path.open("w", encoding="utf-8") as f:
+            for (tenant_id, session_id), (seq, doc) in sorted(self.pending.items(), key=lambda item: item[1][0]):
+                entry = {"seq": seq, "tenant": tenant_id, "session_id": session_id, "doc": doc}
+                f.write(json.dumps(entry, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+
+    async def replay(self, write_batch: Callable[[str, Dict[str, Dict]], Awaitable[int]], batch_size: int) -> int:
+        """
+        Drain pending writes into the database
+
+        Args:
+            write_batch: Upserts one tenant's {session_id: memory document} batch
+            batch_size: Documents per bulk write
+
+        Returns:
+            Number of documents replayed; stops at the first failing batch
+        """
+        if not self.pending:
+            return 0
+
+        replayed = 0
+        by_tenant: Dict[str, list] = {}
+        for key, entry in sorted(self.pending.items(), key=lambda item: item[1][0]):
+            by_tenant.setdefault(key[0], []).append((key, entry))
+        try:
+            for tenant_id, snapshot in by_tenant.items():
+                for start in range(0, len(snapshot), batch_size):
+                    batch = snapshot[start:start + batch_size]
+                    await write_batch(tenant_id, {key[1]: doc for key, (_, doc) in batch})
+                    for key, (seq, _) in batch:
+                        # Keep entries rewritten while the batch was in flight
+                        if self.pending.get(key, (None,))[0] == seq:
+                            del self.pending[key]
+                    replayed += len(batch)
+            self.last_error = None
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            # Logged once per outage, not on every retry
+            if error != self.last_error:
+                logger.warning("Memory WAL replay paused", extra={"pending": len(self.pending), "error": error})
+            self.last_error = error
+        finally:
+            if replayed:
+                self._compact()
+                self.replayed += replayed
+                self.last_replay_at = time.time()
+                logger.info("Replayed memory writes", extra={"replayed": replayed, "pending": len(self.pending)})
+
+        return replayed
+
+    def get_stats(self) -> Dict:
+        return {
+            "path": str(self.path),
+            "pending": len(self.pending),
+            "replayed": self.replayed,
+            "adopted": self.adopted,
+            "last_replay_at": self.last_replay_at,
+            "last_error": self.last_error
+        }
+
+# Singleton instance (path comes from settings, read on first use); queue workers
+# set owner to "worker-<index>" before load()
+memory_wal = LazySingleton(lambda: MemoryWAL(
+    settings.memory_wal_path,
+    owner=f"pid-{os.getpid()}",
+    fsync=settings.memory_wal_fsync
+))
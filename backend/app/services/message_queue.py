@@ -0,0 +1,351 @@
+import asyncio
+import json
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import Collection, Dict, List, NamedTuple, Optional, Sequence, Tuple
+from app.config import settings
+
+QUEUE_BACKENDS = ("redis", "sqlite")
+
+
+class QueueMessage(NamedTuple):
+    """An inbound entry delivered to a consumer (fields are strings)"""
+    stream: str
+    entry_id: str
+    fields: Dict[str, str]
+    deliveries: int = 1
+
+
+def shard_for(session_id: str, shard_count: int) -> int:
+    """Inbound shard of a session; every producer must use the same rule"""
+    return zlib.crc32(session_id.encode()) % shard_count
+
+
+def _inbound_fields(session_id: str, message: str, tenant: Optional[str], message_id: Optional[str]) -> Dict[str, str]:
+    fields = {"session_id": session_id, "message": message}
+    if tenant:
+        fields["tenant"] = tenant
+    if message_id:
+        fields["message_id"] = message_id
+    return fields
+
+
+class RedisStreamsQueue:
+    """
+    Inbound messages, replies and dead letters on Redis Streams
+
+    Inbound messages are sharded by session over `shard_count` streams,
+    "<prefix>:in:<shard>", each read through the consumer group `group`. A
+    shard is read by one worker process at a time, so a session's messages
+    reach a single consumer in the order they were added. Replies are added
+    to "<prefix>:out" and messages that can't be processed to
+    "<prefix>:dead", both trimmed to about `maxlen` entries.
+
+    An entry stays in the group's pending list until it's acknowledged (and
+    then deleted); `claim` hands pending entries of a crashed or retired
+    consumer to another one, with their delivery count.
+
+    Needs the `redis` package (imported on connect, so the web app doesn't).
+    """
+
+    def __init__(self, url: str, prefix: str, group: str, shard_count: int, maxlen: int):
+        self.url = url
+        self.prefix = prefix
+        self.group = group
+        self.shard_count = shard_count
+        self.maxlen = maxlen
+        self.outbound_stream = f"{prefix}:out"
+        self.dead_letter_stream = f"{prefix}:dead"
+        self.redis = None
+
+    def inbound_stream(self, shard: int) -> str:
+        return f"{self.prefix}:in:{shard}"
+
+    async def connect(self):
+        import redis.asyncio as aioredis
+        self.redis = aioredis.from_url(self.url, decode_responses=True)
+
+    async def close(self):
+        if self.redis is not None:
+            await self.redis.close()
+            self.redis = None
+
+    async def setup(self, shards: Sequence[int]):
+        """Create the consumer group on each shard's stream (no-op when it exists)"""
+        from redis.exceptions import ResponseError
+        for shard in shards:
+            try:
+                await self.redis.xgroup_create(self.inbound_stream(shard), self.group, id="0", mkstream=True)
+            except ResponseError as e:
+                if "BUSYGROUP" not in str(e):
+                    raise
+
+    async def publish_inbound(
+        self,
+        session_id: str,
+        message: str,
+        tenant: Optional[str] = None,
+        message_id: Optional[str] = None
+    ) -> str:
+        stream = self.inbound_stream(shard_for(session_id, self.shard_count))
+        return await self.redis.xadd(stream, _inbound_fields(session_id, message, tenant, message_id))
+
+    async def read(self, consumer: str, shards: Sequence[int], count: int, block_ms: int) -> List[QueueMessage]:
+        """New entries of the given shards, oldest first per shard (waits up to block_ms)"""
+        response = await self.redis.xreadgroup(
+            self.group,
+            consumer,
+            {self.inbound_stream(shard): ">" for shard in shards},
+            count=count,
+            block=block_ms
+        )
+        return [
+            QueueMessage(stream, entry_id, fields)
+            for stream, entries in response or []
+            for entry_id, fields in entries
+        ]
+
+    async def claim(
+        self,
+        consumer: str,
+        shards: Sequence[int],
+        idle_ms: int,
+        owner: Optional[str] = None,
+        skip: Collection[Tuple[str, str]] = (),
+        count: int = 100
+    ) -> List[QueueMessage]:
+        """
+        Take over entries delivered but not acknowledged for at least idle_ms
+
+        Args:
+            consumer: Consumer the entries are handed to
+            shards: Shards to look in
+            idle_ms: Minimum time since the entry was last delivered
+            owner: Only entries pending for this consumer (e.g. itself after a restart)
+            skip: (stream, entry id) pairs not to claim (the caller's in-flight ones)
+            count: Most entries per shard
+
+        Returns:
+            Claimed entries, oldest first per shard, with their delivery count
+        """
+        claimed: List[QueueMessage] = []
+        for shard in shards:
+            stream = self.inbound_stream(shard)
+            pending = await self.redis.xpending_range(
+                stream, self.group, min="-", max="+", count=count, consumername=owner, idle=idle_ms or None
+            )
+            deliveries = {
+                p["message_id"]: p["times_delivered"] for p in pending if (stream, p["message_id"]) not in skip
+            }
+            if not deliveries:
+                continue
+            entries = await self.redis.xclaim(stream, self.group, consumer, idle_ms, list(deliveries))
+            for entry_id, fields in entries:
+                if fields is None:
+                    # Deleted while pending: nothing left to process
+                    await self.redis.xack(stream, self.group, entry_id)
+                    continue
+                claimed.append(QueueMessage(stream, entry_id, fields, deliveries[entry_id] + 1))
+        return claimed
+
+    async def ack(self, message: QueueMessage):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(message.stream, self.group, message.entry_id)
+            pipe.xdel(message.stream, message.entry_id)
+            await pipe.execute()
+
+    async def publish_outbound(self, fields: Dict[str, str]) -> str:
+        return await self.redis.xadd(self.outbound_stream, fields, maxlen=self.maxlen, approximate=True)
+
+    async def dead_letter(self, message: QueueMessage, reason: str) -> str:
+        return await self.redis.xadd(
+            self.dead_letter_stream,
+            {**message.fields, "source_id": message.entry_id, "deliveries": str(message.deliveries), "reason": reason},
+            maxlen=self.maxlen,
+            approximate=True
+        )
+
+    async def read_replies(self, after_id: str = "0", count: int = 100) -> List[QueueMessage]:
+        """Outbound entries after an id (for gateways without a consumer group, and tests)"""
+        entries = await self.redis.xrange(self.outbound_stream, min=f"({after_id}" if after_id != "0" else "-", count=count)
+        return [QueueMessage(self.outbound_stream, entry_id, fields) for entry_id, fields in entries]
+
+
+class SQLiteQueue:
+    """
+    Local stand-in for RedisStreamsQueue on a SQLite file (tests, single machine)
+
+    Same streams, sharding and methods; every stream is rows of one table.
+    An inbound row is claimed by a consumer when it's read and deleted when
+    acknowledged, which gives the same at-least-once delivery and per-shard
+    ordering as one Redis consumer group. Several worker processes can share
+    the file (writes are serialized by SQLite's lock).
+    """
+
+    def __init__(self, path: str, prefix: str, shard_count: int, maxlen: int):
+        self.path = Path(path)
+        self.prefix = prefix
+        self.shard_count = shard_count
+        self.maxlen = maxlen
+        self.outbound_stream = f"{prefix}:out"
+        self.dead_letter_stream = f"{prefix}:dead"
+        self.db: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()  # Calls run in worker threads
+
+    def inbound_stream(self, shard: int) -> str:
+        return f"{self.prefix}:in:{shard}"
+
+    async def connect(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                stream TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                consumer TEXT,
+                delivered_at REAL,
+                deliveries INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS entries_stream ON entries (stream, consumer, id)")
+
+    async def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+
+    async def setup(self, shards: Sequence[int]):
+        pass
+
+    async def _run(self, fn, *args):
+        def locked():
+            with self._lock:
+                return fn(*args)
+        return await asyncio.to_thread(locked)
+
+    def _add(self, stream: str, fields: Dict[str, str]) -> str:
+        cursor = self.db.execute("INSERT INTO entries (stream, fields) VALUES (?, ?)", (stream, json.dumps(fields)))
+        if stream in (self.outbound_stream, self.dead_letter_stream):
+            # Approximate trim, like MAXLEN ~ (ids are shared by every stream)
+            self.db.execute(
+                "DELETE FROM entries WHERE stream = ? AND id <= ?",
+                (stream, cursor.lastrowid - self.maxlen)
+            )
+        return str(cursor.lastrowid)
+
+    def _deliver(self, rows, consumer: str) -> List[QueueMessage]:
+        now = time.time()
+        self.db.executemany(
+            "UPDATE entries SET consumer = ?, delivered_at = ?, deliveries = deliveries + 1 WHERE id = ?",
+            [(consumer, now, row[0]) for row in rows]
+        )
+        return [QueueMessage(row[1], str(row[0]), json.loads(row[2]), row[3] + 1) for row in rows]
+
+    def _transaction(self, fn):
+        self.db.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn()
+        except BaseException:
+            self.db.execute("ROLLBACK")
+            raise
+        self.db.execute("COMMIT")
+        return result
+
+    async def publish_inbound(
+        self,
+        session_id: str,
+        message: str,
+        tenant: Optional[str] = None,
+        message_id: Optional[str] = None
+    ) -> str:
+        stream = self.inbound_stream(shard_for(session_id, self.shard_count))
+        return await self._run(self._add, stream, _inbound_fields(session_id, message, tenant, message_id))
+
+    async def read(self, consumer: str, shards: Sequence[int], count: int, block_ms: int) -> List[QueueMessage]:
+        streams = [self.inbound_stream(shard) for shard in shards]
+        placeholders = ",".join("?" * len(streams))
+
+        def take():
+            rows = self.db.execute(
+                f"SELECT id, stream, fields, deliveries FROM entries "
+                f"WHERE stream IN ({placeholders}) AND consumer IS NULL ORDER BY id LIMIT ?",
+                (*streams, count)
+            ).fetchall()
+            return self._deliver(rows, consumer)
+
+        deadline = time.monotonic() + block_ms / 1000
+        while True:
+            messages = await self._run(self._transaction, take)
+            if messages or time.monotonic() >= deadline:
+                return messages
+            await asyncio.sleep(min(0.05, max(0.0, deadline - time.monotonic())))
+
+    async def claim(
+        self,
+        consumer: str,
+        shards: Sequence[int],
+        idle_ms: int,
+        owner: Optional[str] = None,
+        skip: Collection[Tuple[str, str]] = (),
+        count: int = 100
+    ) -> List[QueueMessage]:
+        streams = [self.inbound_stream(shard) for shard in shards]
+        placeholders = ",".join("?" * len(streams))
+
+        def take():
+            rows = self.db.execute(
+                f"SELECT id, stream, fields, deliveries FROM entries "
+                f"WHERE stream IN ({placeholders}) AND consumer IS NOT NULL AND delivered_at <= ? "
+                f"AND (? IS NULL OR consumer = ?) ORDER BY id LIMIT ?",
+                (*streams, time.time() - idle_ms / 1000, owner, owner, count * len(streams))
+            ).fetchall()
+            return self._deliver([row for row in rows if (row[1], str(row[0])) not in skip], consumer)
+
+        return await self._run(self._transaction, take)
+
+    async def ack(self, message: QueueMessage):
+        await self._run(self.db.execute, "DELETE FROM entries WHERE id = ?", (int(message.entry_id),))
+
+    async def publish_outbound(self, fields: Dict[str, str]) -> str:
+        return await self._run(self._add, self.outbound_stream, fields)
+
+    async def dead_letter(self, message: QueueMessage, reason: str) -> str:
+        return await self._run(self._add, self.dead_letter_stream, {
+            **message.fields,
+            "source_id": message.entry_id,
+            "deliveries": str(message.deliveries),
+            "reason": reason
+        })
+
+    async def read_replies(self, after_id: str = "0", count: int = 100) -> List[QueueMessage]:
+        rows = await self._run(lambda: self.db.execute(
+            "SELECT id, fields FROM entries WHERE stream = ? AND id > ? ORDER BY id LIMIT ?",
+            (self.outbound_stream, int(after_id), count)
+        ).fetchall())
+        return [QueueMessage(self.outbound_stream, str(row[0]), json.loads(row[1])) for row in rows]
+
+
+def create_queue(backend: Optional[str] = None):
+    """Queue for settings.worker_queue_backend (or the given backend); call connect() before use"""
+    backend = backend or settings.worker_queue_backend
+    if backend == "redis":
+        return RedisStreamsQueue(
+            settings.worker_redis_url,
+            settings.worker_stream_prefix,
+            settings.worker_group,
+            settings.worker_shards,
+            settings.worker_stream_maxlen
+        )
+    if backend == "sqlite":
+        return SQLiteQueue(
+            settings.worker_sqlite_path,
+            settings.worker_stream_prefix,
+            settings.worker_shards,
+            settings.worker_stream_maxlen
+        )
+    raise ValueError(f"Unknown queue backend {backend!r} (expected one of {QUEUE_BACKENDS})")
@@ -1,7 +1,19 @@
+import asyncio
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReplaceOne, ReturnDocument
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List
 from app.config import settings
+from app.services.analytics_service import analytics_service
+from app.services.usage_service import usage_service
+from app.services.booking_mirror import booking_mirror
+from app.services.event_bus import event_bus
+from app.services.memory_wal import memory_wal
+from app.services.transcript_store import transcript_store
+from app.services.tenants import get_current_tenant, tenant_registry, use_tenant
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
 
 class MongoDBService:
     """
@@ -11,125 +23,354 @@ class MongoDBService:
     def __init__(self):
         self.client: Optional[AsyncIOMotorClient] = None
         self.db = None
-        self.collection = None
+    
+    @property
+    def collection(self):
+        """Memory collection of the current tenant (user_memories for the default gym)"""
+        if self.db is None:
+            return None
+        return self.db[get_current_tenant().memory_collection]
+    
+    def memory_collections(self) -> List:
+        """Memory collections of every configured tenant"""
+        return [self.db[tenant.memory_collection] for tenant in tenant_registry.all()]
     
     async def connect(self):
         """Connect to MongoDB"""
         try:
-            self.client = AsyncIOMotorClient(settings.mongodb_url)
+            self.client = AsyncIOMotorClient(
+                settings.mongodb_url,
+                minPoolSize=settings.mongodb_min_pool_size,
+                serverSelectionTimeoutMS=settings.mongodb_server_selection_timeout_ms
+            )
             self.db = self.client[settings.mongodb_database]
-            self.collection = self.db["user_memories"]
+            analytics_service.attach(self.db)
+            usage_service.attach(self.db)
+            booking_mirror.attach(self.db)
+            transcript_store.attach(self.db)
             
             # Test connection
             await self.client.admin.command('ping')
-            print("✅ MongoDB connected successfully")
+            
+            # Indexes for time-window and funnel queries, on every branch's collection
+            for collection in self.memory_collections():
+                await collection.create_index("last_updated")
+                await collection.create_index("last_intent")
+            await booking_mirror.create_indexes()
+            
+            # First start with analytics: count the leads that already exist
+            if await analytics_service.ensure_seeded(self.memory_collections()):
+                logger.info("Analytics counters seeded from existing leads")
+            logger.info("MongoDB connected")
         except Exception as e:
-            print(f"❌ MongoDB connection failed: {str(e)}")
+            logger.error("MongoDB connection failed", extra={"error": str(e)})
             raise
     
     async def disconnect(self):
         """Disconnect from MongoDB"""
         if self.client:
             self.client.close()
-            print("MongoDB disconnected")
+            logger.info("MongoDB disconnected")
+    
+    @staticmethod
+    def new_memory(session_id: str) -> Dict:
+        """Default memory structure for a lead we know nothing about"""
+        return {
+            "_id": session_id,
+            "fitness_goals": "Unknown",
+            "past_experience": "Unknown",
+            "location_proximity": "Unknown",
+            "joining_timeline": "Unknown",
+            "motivation": "Unknown",
+            "preferred_time": "Unknown",
+            "health_physical_info": "Unknown",
+            "objections": "None",
+            "conversation_summary": "None",
+            "total_messages": 0,
+            "last_intent": "unknown",
+            "booking_status": "not_booked",
+            "created_at": datetime.utcnow().isoformat(),
+            "last_updated": datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def build_memory_doc(session_id: str, memory_data: Dict) -> Dict:
+        """Memory document to store, with every required field filled in"""
+        return {
+            "_id": session_id,
+            "fitness_goals": memory_data.get("fitness_goals", "Unknown"),
+            "past_experience": memory_data.get("past_experience", "Unknown"),
+            "location_proximity": memory_data.get("location_proximity", "Unknown"),
+            "joining_timeline": memory_data.get("joining_timeline", "Unknown"),
+            "motivation": memory_data.get("motivation", "Unknown"),
+            "preferred_time": memory_data.get("preferred_time", "Unknown"),
+            "health_physical_info": memory_data.get("health_physical_info", "Unknown"),
+            "objections": memory_data.get("objections", "None"),
+            "conversation_summary": memory_data.get("conversation_summary", "None"),
+            "total_messages": memory_data.get("total_messages", 0),
+            "last_intent": memory_data.get("last_intent", "unknown"),
+            "booking_status": memory_data.get("booking_status", "not_booked"),
+            "last_updated": datetime.utcnow().isoformat()
+        }
+    
+    @staticmethod
+    def _pending_memory(session_id: str) -> Optional[Dict]:
+        """Memory written to the WAL but not yet replayed to MongoDB"""
+        if not settings.memory_wal_enabled:
+            return None
+        return memory_wal.get(get_current_tenant().tenant_id, session_id)
+    
+    @staticmethod
+    async def _read(operation):
+        """Await a read, giving up after mongodb_read_timeout_seconds"""
+        return await asyncio.wait_for(operation, settings.mongodb_read_timeout_seconds)
     
     async def get_memory(self, session_id: str) -> Optional[Dict]:
         """
         Retrieve memory for a session
         
+        Writes still waiting in the WAL win over what MongoDB has, so a lead
+        sees its own updates while the database is unreachable.
+        
         Args:
             session_id: Session identifier
             
         Returns:
-            Memory document or None if not found
+            Memory document (the new_memory() defaults for a lead with none
+            stored), or None if MongoDB is unreachable or slower than
+            mongodb_read_timeout_seconds - the lead may well be known
         """
+        pending = self._pending_memory(session_id)
+        if pending:
+            return pending
+        
         try:
-            memory = await self.collection.find_one({"_id": session_id})
+            memory = await self._read(self.collection.find_one({"_id": session_id}))
             
             # If no memory exists, return default structure
             if not memory:
-                return {
-                    "_id": session_id,
-                    "fitness_goals": "Unknown",
-                    "past_experience": "Unknown",
-                    "location_proximity": "Unknown",
-                    "joining_timeline": "Unknown",
-                    "motivation": "Unknown",
-                    "preferred_time": "Unknown",
-                    "health_physical_info": "Unknown",
-                    "objections": "None",
-                    "conversation_summary": "None",
-                    "total_messages": 0,
-                    "last_intent": "unknown",
-                    "created_at": datetime.utcnow().isoformat(),
-                    "last_updated": datetime.utcnow().isoformat()
-                }
+                return self.new_memory(session_id)
             
             return memory
             
         except Exception as e:
-            print(f"Error retrieving memory: {str(e)}")
+            logger.warning("Error retrieving memory", extra={"session_id": session_id, "error": str(e) or type(e).__name__})
+            return None
+    
+    async def get_lead_fields(self, session_id: str, fields: List[str]) -> Optional[Dict]:
+        """
+        Read a few memory fields without loading the whole document
+        
+        Args:
+            session_id: Session identifier
+            fields: Field names to return
+            
+        Returns:
+            The requested fields that exist ({} if the lead is unknown), or
+            None if MongoDB is unreachable or slower than mongodb_read_timeout_seconds
+        """
+        pending = self._pending_memory(session_id)
+        if pending:
+            return {field: pending[field] for field in fields if field in pending}
+        
+        try:
+            doc = await self._read(self.collection.find_one({"_id": session_id}, {field: 1 for field in fields}))
+            if not doc:
+                return {}
+            doc.pop("_id", None)
+            return doc
+        except Exception as e:
+            logger.warning("Error reading lead fields", extra={"session_id": session_id, "error": str(e) or type(e).__name__})
             return None
     
     async def save_memory(self, session_id: str, memory_data: Dict) -> bool:
         """
         Save or update memory for a session
         
+        If MongoDB errors or takes longer than mongodb_write_timeout_seconds,
+        the write goes to the local WAL instead and is replayed once the
+        database recovers. Later writes for the same lead also go through the
+        WAL until then, so they can't overtake it.
+        
         Args:
             session_id: Session identifier
             memory_data: Dictionary with all memory fields
             
         Returns:
-            Success boolean
+            Success boolean (True once stored in MongoDB or the WAL)
         """
+        # Ensure required fields
+        memory_doc = self.build_memory_doc(session_id, memory_data)
+        
+        if self._pending_memory(session_id):
+            return self._save_to_wal(session_id, memory_doc, memory_data)
+        
         try:
-            # Ensure required fields
-            memory_doc = {
-                "_id": session_id,
-                "fitness_goals": memory_data.get("fitness_goals", "Unknown"),
-                "past_experience": memory_data.get("past_experience", "Unknown"),
-                "location_proximity": memory_data.get("location_proximity", "Unknown"),
-                "joining_timeline": memory_data.get("joining_timeline", "Unknown"),
-                "motivation": memory_data.get("motivation", "Unknown"),
-                "preferred_time": memory_data.get("preferred_time", "Unknown"),
-                "health_physical_info": memory_data.get("health_physical_info", "Unknown"),
-                "objections": memory_data.get("objections", "None"),
-                "conversation_summary": memory_data.get("conversation_summary", "None"),
-                "total_messages": memory_data.get("total_messages", 0),
-                "last_intent": memory_data.get("last_intent", "unknown"),
-                "last_updated": datetime.utcnow().isoformat()
-            }
+            existing = await asyncio.wait_for(
+                self._write_memory(session_id, memory_doc),
+                settings.mongodb_write_timeout_seconds
+            )
+        except Exception as e:
+            logger.warning("Error saving memory", extra={"session_id": session_id, "error": str(e) or type(e).__name__})
+            if settings.memory_wal_enabled:
+                return self._save_to_wal(session_id, memory_doc, memory_data)
+            return False
+        
+        await analytics_service.record_change(existing, memory_doc)
+        event_bus.publish_memory_change(session_id, existing, memory_doc)
+        return True
+    
+    async def _write_memory(self, session_id: str, memory_doc: Dict) -> Optional[Dict]:
+        """
+        Insert or update a memory document; returns the previous one
+        
+        A single find_one_and_update, so the previous document (which feeds
+        the analytics deltas) is exactly the one this write replaced, even
+        when two writes for the same lead race.
+        """
+        created_at = datetime.utcnow().isoformat()
+        existing = await self.collection.find_one_and_update(
+            {"_id": session_id},
+            {
+                "$set": {k: v for k, v in memory_doc.items() if k not in ("_id", "created_at")},
+                "$setOnInsert": {"created_at": created_at}  # Preserved on updates
+            },
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
+        )
+        memory_doc["created_at"] = existing.get("created_at") if existing else created_at
+        logger.debug("Memory updated" if existing else "Memory created", extra={"session_id": session_id})
+        return existing
+    
+    def _save_to_wal(self, session_id: str, memory_doc: Dict, memory_data: Dict) -> bool:
+        """Queue a memory write for replay; analytics and events follow on replay"""
+        try:
+            memory_doc["created_at"] = memory_data.get("created_at")
+            memory_wal.append(get_current_tenant().tenant_id, session_id, memory_doc)
+            logger.info("Memory queued in WAL", extra={"session_id": session_id})
+            return True
+        except Exception as e:
+            logger.error("Error writing memory WAL", extra={"session_id": session_id, "error": str(e)})
+            return False
+    
+    async def replay_wal(self) -> int:
+        """Drain WAL entries into MongoDB; returns documents written"""
+        async def write_batch(tenant_id: str, memories: Dict[str, Dict]) -> int:
+            with use_tenant(tenant_registry.get(tenant_id)):
+                return await self.bulk_upsert_memories(memories)
+        
+        return await memory_wal.replay(write_batch, settings.memory_wal_batch_size)
+    
+    async def bulk_upsert_memories(self, memories: Dict[str, Dict]) -> int:
+        """
+        Save many memories with a single bulk_write of upserts
+        
+        Args:
+            memories: Mapping of session_id -> memory fields
             
-            # Check if memory exists
-            existing = await self.collection.find_one({"_id": session_id})
+        Returns:
+            Number of documents written
+        """
+        if not memories:
+            return 0
+        
+        # One read for the whole batch to preserve created_at and feed analytics
+        existing_docs = {}
+        async for doc in self.collection.find({"_id": {"$in": list(memories.keys())}}):
+            existing_docs[doc["_id"]] = doc
+        
+        operations = []
+        changes = []
+        for session_id, memory_data in memories.items():
+            memory_doc = self.build_memory_doc(session_id, memory_data)
+            existing = existing_docs.get(session_id)
+            memory_doc["created_at"] = (
+                existing.get("created_at") if existing
+                else memory_data.get("created_at") or datetime.utcnow().isoformat()
+            )
+            operations.append(ReplaceOne({"_id": session_id}, memory_doc, upsert=True))
+            changes.append((existing, memory_doc))
+        
+        result = await self.collection.bulk_write(operations, ordered=False)
+        await analytics_service.record_changes(changes)
+        for existing, memory_doc in changes:
+            event_bus.publish_memory_change(memory_doc["_id"], existing, memory_doc)
+        
+        return result.upserted_count + result.matched_count
+    
+    async def bulk_update_fields(self, updates: Dict[str, tuple]) -> int:
+        """
+        $set fields on many memories, each only if those fields haven't changed
+        
+        Each update is a find_one_and_update filtered on the fields' values in
+        the given document (run concurrently), so a lead written in the
+        meantime - say a live chat changed its last_intent - is left alone, and
+        the analytics deltas and events come from the document actually
+        replaced.
+        
+        Args:
+            updates: Mapping of session_id -> (document read earlier, fields to set)
             
-            if existing:
-                # Preserve created_at
-                memory_doc["created_at"] = existing.get("created_at")
-                await self.collection.replace_one(
-                    {"_id": session_id},
-                    memory_doc
-                )
-                print(f"✅ Memory updated for session: {session_id}")
-            else:
-                # Create new memory
-                memory_doc["created_at"] = datetime.utcnow().isoformat()
-                await self.collection.insert_one(memory_doc)
-                print(f"✅ Memory created for session: {session_id}")
+        Returns:
+            Number of documents modified (the rest had changed since they were read)
+        """
+        if not updates:
+            return 0
+        
+        async def update(session_id: str, current: Dict, fields: Dict) -> Optional[Dict]:
+            return await self.collection.find_one_and_update(
+                {"_id": session_id, **{name: current.get(name) for name in fields}},
+                {"$set": fields},
+                return_document=ReturnDocument.BEFORE
+            )
+        
+        previous = await asyncio.gather(*(
+            update(session_id, current, fields) for session_id, (current, fields) in updates.items()
+        ))
+        changes = [
+            (old, {**old, **fields})
+            for old, (current, fields) in zip(previous, updates.values())
+            if old is not None
+        ]
+        await analytics_service.record_changes(changes)
+        for old, new in changes:
+            event_bus.publish_memory_change(old["_id"], old, new)
+        
+        return len(changes)
+    
+    async def delete_memory(self, session_id: str) -> bool:
+        """Delete memory for a session"""
+        if settings.memory_wal_enabled:
+            memory_wal.discard(get_current_tenant().tenant_id, session_id)
+        try:
+            deleted = await self.collection.find_one_and_delete({"_id": session_id})
+            if not deleted:
+                return False
             
+            await analytics_service.record_change(deleted, None)
             return True
-            
         except Exception as e:
-            print(f"❌ Error saving memory: {str(e)}")
+            logger.warning("Error deleting memory", extra={"session_id": session_id, "error": str(e)})
             return False
     
-    async def delete_memory(self, session_id: str) -> bool:
-        """Delete memory for a session"""
+    async def update_lead_fields(self, session_id: str, fields: Dict) -> bool:
+        """
+        Update individual memory fields (e.g. last_intent, booking_status)
+        
+        Args:
+            session_id: Session identifier
+            fields: Field names and their new values
+            
+        Returns:
+            Success boolean
+        """
         try:
-            result = await self.collection.delete_one({"_id": session_id})
-            return result.deleted_count > 0
+            existing = self._pending_memory(session_id) or await self._read(self.collection.find_one({"_id": session_id}))
+            memory_data = dict(existing or {})
+            memory_data.update(fields)
+            return await self.save_memory(session_id, memory_data)
         except Exception as e:
-            print(f"Error deleting memory: {str(e)}")
+            logger.warning("Error updating lead fields", extra={"session_id": session_id, "error": str(e)})
             return False
 
 # Singleton instance
@@ -0,0 +1,274 @@
+import asyncio
+import hmac
+import json
+import random
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+from app.config import settings
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger, log_context
+
+logger = get_logger(__name__)
+
+PROFILE_HEADER = "x-profile-token"
+
+# Output format -> (file extension, media type)
+PROFILE_FORMATS = {
+    "speedscope": ("speedscope.json", "application/json"),
+    "html": ("html", "text/html")
+}
+
+# Set by ProfilingMiddleware for requests carrying a valid X-Profile-Token
+profile_requested: ContextVar[bool] = ContextVar("profile_requested", default=False)
+
+T = TypeVar("T")
+
+
+def check_admin_token(value: Optional[str]) -> bool:
+    """Whether a header value matches settings.profiling_admin_token (never, when no token is set)"""
+    token = settings.profiling_admin_token
+    if not token or not value:
+        return False
+    return hmac.compare_digest(value.encode(), token.encode())
+
+
+class ProfileStore:
+    """
+    Captured profiles on disk, newest `max_profiles` kept
+
+    Each profile is two files in `directory`: the profile itself
+    ("<id>.speedscope.json" or "<id>.html") and "<id>.meta.json" with the
+    turn it was taken from, so the list survives restarts.
+    """
+
+    def __init__(self, directory: str, max_profiles: int):
+        self.directory = Path(directory)
+        self.max_profiles = max(1, max_profiles)
+        self.entries: Dict[str, Dict] = {}
+        self._loaded = False
+        self._lock = threading.Lock()  # save() runs in a worker thread
+
+    def _load(self) -> None:
+        if self._loaded:
+            return
+        self._loaded = True
+        for meta_path in self.directory.glob("*.meta.json"):
+            try:
+                meta = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                continue
+            if (self.directory / meta["file"]).exists():
+                self.entries[meta["profile_id"]] = meta
+
+    def save(self, meta: Dict, content: str) -> None:
+        """Write a profile and its metadata, deleting the oldest beyond max_profiles (blocking)"""
+        with self._lock:
+            self._load()
+            self.directory.mkdir(parents=True, exist_ok=True)
+            (self.directory / meta["file"]).write_text(content, encoding="utf-8")
+            (self.directory / f"{meta['profile_id']}.meta.json").write_text(json.dumps(meta), encoding="utf-8")
+            self.entries[meta["profile_id"]] = meta
+
+            ordered = sorted(self.entries.values(), key=lambda entry: entry["created_at"])
+            for old in ordered[:max(0, len(ordered) - self.max_profiles)]:
+                for name in (old["file"], f"{old['profile_id']}.meta.json"):
+                    (self.directory / name).unlink(missing_ok=True)
+                del self.entries[old["profile_id"]]
+
+    def list(self) -> List[Dict]:
+        """Metadata of every stored profile, newest first"""
+        with self._lock:
+            self._load()
+            return sorted(self.entries.values(), key=lambda entry: entry["created_at"], reverse=True)
+
+    def get(self, profile_id: str) -> Optional[Tuple[Path, Dict]]:
+        """(file path, metadata) of a stored profile, or None"""
+        with self._lock:
+            self._load()
+            meta = self.entries.get(profile_id)
+        if meta is None:
+            return None
+        path = self.directory / meta["file"]
+        return (path, meta) if path.exists() else None
+
+
+class RequestProfiler:
+    """
+    Statistical profiles of single agent turns, taken on demand
+
+    A turn is profiled when its request carried a valid X-Profile-Token header
+    (see ProfilingMiddleware) or, with `sample_rate` > 0, at random. The
+    profiler is pyinstrument in async mode: it samples the stack every
+    `interval_ms` and only attributes time to the profiled turn's task, so
+    concurrent turns don't show up in it (time spent awaiting OpenAI, MongoDB
+    or Calendly appears as "await" frames).
+
+    pyinstrument is an optional dependency, imported on the first profiled
+    turn; without it turns run unprofiled and a warning is logged once.
+    Rendering and writing the profile happen in a worker thread after the
+    turn has returned.
+    """
+
+    def __init__(
+        self,
+        store: ProfileStore,
+        interval_ms: float,
+        sample_rate: float,
+        output_format: str,
+        max_concurrent: int
+    ):
+        if output_format not in PROFILE_FORMATS:
+            raise ValueError(f"profiling_format must be one of {list(PROFILE_FORMATS)}")
+        self.store = store
+        self.interval = interval_ms / 1000
+        self.sample_rate = sample_rate
+        self.output_format = output_format
+        self.max_concurrent = max_concurrent
+        self.active = 0
+        self.captured = 0
+        self.skipped = 0
+        self.failed = 0
+        self.unavailable = False
+        self._profiler_class = None
+        self._pending: set = set()
+
+    def trigger(self) -> Optional[str]:
+        """Why the current turn should be profiled ("header" or "sampled"), or None"""
+        if profile_requested.get():
+            return "header"
+        if self.sample_rate > 0 and random.random() < self.sample_rate:
+            return "sampled"
+        return None
+
+    def _new_profiler(self):
+        if self._profiler_class is None:
+            if self.unavailable:
+                return None
+            try:
+                from pyinstrument import Profiler
+            except ImportError:
+                self.unavailable = True
+                logger.warning("Profiling is enabled but pyinstrument isn't installed; turns run unprofiled")
+                return None
+            self._profiler_class = Profiler
+        return self._profiler_class(interval=self.interval, async_mode="enabled")
+
+    async def run(self, turn: Awaitable[T], trigger: str, **fields) -> T:
+        """
+        Await a turn under the profiler and store its profile in the background
+
+        Args:
+            turn: The turn's coroutine (not started yet)
+            trigger: Why it's profiled ("header" or "sampled")
+            **fields: Stored with the profile (session_id, tenant)
+
+        Returns:
+            The turn's result; a turn over the concurrency limit, or without
+            pyinstrument, runs unprofiled
+        """
+        if self.active >= self.max_concurrent:
+            self.skipped += 1
+            return await turn
+        profiler = self._new_profiler()
+        if profiler is None:
+            return await turn
+
+        self.active += 1
+        started = time.perf_counter()
+        profiler.start()
+        try:
+            return await turn
+        finally:
+            session = profiler.stop()
+            self.active -= 1
+            extension, _ = PROFILE_FORMATS[self.output_format]
+            now = datetime.utcnow()
+            profile_id = f"{now:%Y%m%dT%H%M%S}-{uuid.uuid4().hex[:8]}"
+            meta = {
+                "profile_id": profile_id,
+                "file": f"{profile_id}.{extension}",
+                "format": self.output_format,
+                "created_at": now.isoformat(timespec="milliseconds") + "Z",
+                "duration_ms": round((time.perf_counter() - started) * 1000, 1),
+                "samples": session.sample_count,
+                "trigger": trigger,
+                "request_id": log_context.get().get("request_id"),
+                **fields
+            }
+            task = asyncio.create_task(self._save(session, meta))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    def _render_and_save(self, session, meta: Dict) -> None:
+        from pyinstrument.renderers import HTMLRenderer, SpeedscopeRenderer
+        renderer = SpeedscopeRenderer() if self.output_format == "speedscope" else HTMLRenderer()
+        self.store.save(meta, renderer.render(session))
+
+    async def _save(self, session, meta: Dict) -> None:
+        try:
+            await asyncio.to_thread(self._render_and_save, session, meta)
+        except Exception as e:
+            self.failed += 1
+            logger.warning("Couldn't store profile", extra={"profile_id": meta["profile_id"], "error": str(e)})
+            return
+        self.captured += 1
+        logger.info("Profile captured", extra={
+            "profile_id": meta["profile_id"],
+            "duration_ms": meta["duration_ms"],
+            "trigger": meta["trigger"],
+            "force": True
+        })
+
+    def get_stats(self) -> Dict:
+        return {
+            "available": not self.unavailable,
+            "sample_rate": self.sample_rate,
+            "format": self.output_format,
+            "active": self.active,
+            "captured": self.captured,
+            "skipped": self.skipped,
+            "failed": self.failed
+        }
+
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware that flags requests carrying a valid X-Profile-Token header
+
+    The agent turns such a request runs are profiled (on a WebSocket, every
+    turn of the connection). Passes requests straight through when
+    settings.profiling_enabled is off.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not settings.profiling_enabled or scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        value = dict(scope.get("headers", ())).get(PROFILE_HEADER.encode())
+        if value is None or not check_admin_token(value.decode("latin-1")):
+            await self.app(scope, receive, send)
+            return
+
+        token = profile_requested.set(True)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            profile_requested.reset(token)
+
+# Singleton instance (settings are read on first use)
+request_profiler = LazySingleton(lambda: RequestProfiler(
+    store=ProfileStore(settings.profiling_dir, settings.profiling_max_profiles),
+    interval_ms=settings.profiling_interval_ms,
+    sample_rate=settings.profiling_sample_rate,
+    output_format=settings.profiling_format,
+    max_concurrent=settings.profiling_max_concurrent
+))
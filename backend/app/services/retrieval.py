@@ -0,0 +1,114 @@
+import math
+import re
+from collections import Counter
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = frozenset("""
+about am an and any are as at be but by can could do does for from have how if in is it
+its me my no not of on or our please so that the their them then there these this to us was we
+what when where which who will with would you your yours hi hello hey ok okay thanks thank
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords, with plural and -ing endings stripped"""
+    tokens = []
+    for token in TOKEN_PATTERN.findall(text.lower()):
+        if len(token) < 2 or token in STOPWORDS:
+            continue
+        if token.endswith(("sses", "ches", "shes", "xes")):
+            token = token[:-2]
+        elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        if len(token) > 5 and token.endswith("ing"):
+            token = token[:-3]
+        tokens.append(token)
+    return tokens
+
+
+class Chunk(NamedTuple):
+    """A retrievable piece of text under a section heading; keywords are indexed but never shown to the model"""
+    chunk_id: str
+    section: str
+    text: str
+    keywords: str = ""
+
+
+class BM25Index:
+    """
+    Okapi BM25 over a small, fixed set of chunks
+
+    Built once per knowledge base version (a few dozen chunks at most), so the
+    whole index is a list of term-frequency Counters searched by a linear scan.
+    """
+
+    def __init__(self, chunks: Sequence[Chunk], k1: float = 1.2, b: float = 0.75):
+        self.chunks = list(chunks)
+        self.k1 = k1
+        self.b = b
+        self.term_freqs: List[Counter] = [Counter(tokenize(f"{c.section} {c.text} {c.keywords}")) for c in self.chunks]
+        self.lengths = [sum(tf.values()) for tf in self.term_freqs]
+        self.avg_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+        doc_freqs: Counter = Counter()
+        for tf in self.term_freqs:
+            doc_freqs.update(tf.keys())
+        n = len(self.chunks)
+        self.idf: Dict[str, float] = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5)) for term, df in doc_freqs.items()
+        }
+
+    def scores(self, query: str) -> List[float]:
+        terms = [term for term in set(tokenize(query)) if term in self.idf]
+        scores = []
+        for tf, length in zip(self.term_freqs, self.lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self.avg_length)
+            scores.append(sum(
+                self.idf[term] * tf[term] * (self.k1 + 1) / (tf[term] + norm)
+                for term in terms if term in tf
+            ))
+        return scores
+
+    def search(
+        self,
+        query: str,
+        top_k: int = 3,
+        min_score: float = 0.0,
+        context: str = "",
+        context_weight: float = 0.5
+    ) -> List[Tuple[Chunk, float]]:
+        """
+        Best matching chunks for a query
+
+        Args:
+            query: Free text (the lead's latest message)
+            top_k: Most chunks to return
+            min_score: Chunks scoring below this are dropped
+            context: Earlier text (the lead's previous message) that resolves
+                follow-ups like "weekend mornings please". Only used when the
+                query matches something itself, so small talk ("hi", "ok
+                thanks") retrieves nothing however rich the previous message
+            context_weight: How much a context match counts against a query match
+
+        Returns:
+            (chunk, score) pairs, best first
+        """
+        scores = self.scores(query)
+        if not any(scores):
+            return []
+        if context:
+            scores = [score + context_weight * extra for score, extra in zip(scores, self.scores(context))]
+        ranked = sorted(
+            ((chunk, score) for chunk, score in zip(self.chunks, scores) if score > 0 and score >= min_score),
+            key=lambda item: item[1],
+            reverse=True
+        )
+        return ranked[:top_k]
+
+    def get(self, chunk_id: str) -> Optional[Chunk]:
+        for chunk in self.chunks:
+            if chunk.chunk_id == chunk_id:
+                return chunk
+        return None
@@ -0,0 +1,173 @@
+import json
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Dict, List, Optional
+from pydantic import BaseModel, ConfigDict
+from starlette.responses import JSONResponse
+from app.config import settings
+from app.utils.helpers import LazySingleton
+
+TENANT_HEADER = "x-tenant-id"
+TENANT_PATH_PREFIX = "/t/"
+TENANT_ID_PATTERN = re.compile(r"^[a-z0-9][a-z0-9_-]{0,62}$")
+
+DEFAULT_MEMORY_COLLECTION = "user_memories"
+
+
+class UnknownTenantError(Exception):
+    """Raised for a tenant id that isn't configured"""
+
+
+class Tenant(BaseModel):
+    """One gym branch: its gym details and data file, Calendly event type and memory collection"""
+    tenant_id: str
+    gym_name: str
+    gym_location: str
+    gym_trial_price: int
+    gym_facilities: str
+    gym_timezone: str
+    calendly_event_type_uri: str
+    memory_collection: str
+    gym_info_file: str
+    is_default: bool = False
+
+    model_config = ConfigDict(frozen=True)
+
+
+class TenantRegistry:
+    """
+    Configured tenants, by id
+
+    The default tenant is the gym described by the top-level settings and keeps
+    the original `user_memories` collection. Other branches come from
+    settings.tenants_file, a JSON object of tenant id -> overrides:
+
+        {"andheri": {"gym_name": "FitLife Andheri", "gym_location": "...",
+                     "calendly_event_type_uri": "https://api.calendly.com/event_types/..."}}
+
+    Fields left out fall back to the default gym's values, except
+    memory_collection, which defaults to "user_memories_<tenant id>".
+    """
+
+    def __init__(self, default: Tenant, tenants: Optional[Dict[str, Tenant]] = None):
+        self.default = default
+        self.tenants = {default.tenant_id: default, **(tenants or {})}
+
+    @classmethod
+    def from_settings(cls) -> "TenantRegistry":
+        default = Tenant(
+            tenant_id=settings.default_tenant_id,
+            gym_name=settings.gym_name,
+            gym_location=settings.gym_location,
+            gym_trial_price=settings.gym_trial_price,
+            gym_facilities=settings.gym_facilities,
+            gym_timezone=settings.gym_timezone,
+            calendly_event_type_uri=settings.calendly_event_type_uri,
+            memory_collection=DEFAULT_MEMORY_COLLECTION,
+            gym_info_file=settings.gym_info_file,
+            is_default=True
+        )
+
+        overrides = {}
+        if settings.tenants_file:
+            overrides = json.loads(Path(settings.tenants_file).read_text(encoding="utf-8"))
+
+        return cls(default, {
+            tenant_id: cls.build_tenant(default, tenant_id, fields)
+            for tenant_id, fields in overrides.items()
+        })
+
+    @staticmethod
+    def build_tenant(default: Tenant, tenant_id: str, fields: Dict) -> Tenant:
+        """A branch that inherits whatever it doesn't override from the default gym"""
+        if not TENANT_ID_PATTERN.match(tenant_id):
+            raise ValueError(f"Invalid tenant id {tenant_id!r}: use lowercase letters, digits, - and _")
+        return Tenant(**{
+            **default.model_dump(),
+            "memory_collection": f"{DEFAULT_MEMORY_COLLECTION}_{tenant_id}",
+            **fields,
+            "tenant_id": tenant_id,
+            "is_default": False
+        })
+
+    def get(self, tenant_id: Optional[str] = None) -> Tenant:
+        """
+        Look up a tenant (the default one when no id is given)
+
+        Raises:
+            UnknownTenantError: No tenant with this id is configured
+        """
+        if not tenant_id:
+            return self.default
+        tenant = self.tenants.get(tenant_id.lower())
+        if tenant is None:
+            raise UnknownTenantError(tenant_id)
+        return tenant
+
+    def all(self) -> List[Tenant]:
+        return list(self.tenants.values())
+
+# Tenant of the request being handled (None outside requests = default tenant)
+current_tenant: ContextVar[Optional[Tenant]] = ContextVar("current_tenant", default=None)
+
+
+def get_current_tenant() -> Tenant:
+    return current_tenant.get() or tenant_registry.default
+
+
+@contextmanager
+def use_tenant(tenant: Tenant):
+    """Run a block (background job, replay) as a given tenant"""
+    token = current_tenant.set(tenant)
+    try:
+        yield tenant
+    finally:
+        current_tenant.reset(token)
+
+
+class TenantMiddleware:
+    """
+    ASGI middleware that picks the tenant for each HTTP/WebSocket request
+
+    The tenant comes from a "/t/<tenant id>" path prefix (stripped before
+    routing, so "/t/andheri/chat" is served by the "/chat" route) or from the
+    X-Tenant-ID header; requests with neither use the default tenant. Unknown
+    tenants get a 404 (WebSockets are closed with code 4404).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        tenant_id = None
+        path = scope["path"]
+        if path.startswith(TENANT_PATH_PREFIX):
+            tenant_id, _, rest = path[len(TENANT_PATH_PREFIX):].partition("/")
+            scope = dict(scope, path="/" + rest, raw_path=("/" + rest).encode())
+        else:
+            for name, value in scope.get("headers", ()):
+                if name == TENANT_HEADER.encode():
+                    tenant_id = value.decode("latin-1").strip()
+                    break
+
+        try:
+            tenant = tenant_registry.get(tenant_id)
+        except UnknownTenantError:
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close", "code": 4404})
+                return
+            response = JSONResponse({"detail": f"Unknown tenant: {tenant_id}"}, status_code=404)
+            await response(scope, receive, send)
+            return
+
+        with use_tenant(tenant):
+            await self.app(scope, receive, send)
+
+# Singleton instance (tenants come from settings, read on first use)
+tenant_registry = LazySingleton(TenantRegistry.from_settings)
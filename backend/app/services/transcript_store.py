@@ -0,0 +1,244 @@
+import asyncio
+import time
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Optional, Tuple
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from app.config import settings
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+OP_APPEND = "append"
+OP_CLEAR = "clear"
+
+
+class TranscriptStore:
+    """
+    Chat history persisted to the `transcripts` collection
+
+    One document per (tenant, session), `_id` "<tenant id>:<session id>",
+    holding the newest `max_messages` messages. Messages are only ever
+    appended (a `$push` capped with `$slice`); a reset empties the list.
+
+    `append` and `clear` never wait on MongoDB: they queue the operation in
+    memory and a background task (`run`) flushes the queue as one ordered bulk
+    write every `flush_seconds`, or sooner once `batch_size` operations are
+    waiting. If MongoDB is unreachable the queue is kept (up to
+    `max_buffered` operations, oldest dropped first) and retried.
+
+    `load_recent` rebuilds a session's last messages after a restart, merged
+    with whatever is still queued for it.
+    """
+
+    def __init__(self, max_messages: int, batch_size: int, flush_seconds: float, max_buffered: int):
+        self.max_messages = max_messages
+        self.batch_size = max(1, batch_size)
+        self.flush_seconds = flush_seconds
+        self.max_buffered = max_buffered
+        self.collection = None
+        self.buffer: Deque[Tuple[str, str, str, Optional[Dict]]] = deque()
+        self._wakeup = asyncio.Event()
+        self.written = 0
+        self.dropped = 0
+        self.rehydrated = 0
+        self.last_error: Optional[str] = None
+        self.last_flush_at: Optional[float] = None
+
+    def attach(self, db):
+        """Bind to the transcripts collection of a connected database"""
+        self.collection = db["transcripts"]
+
+    @staticmethod
+    def _doc_id(tenant_id: str, session_id: str) -> str:
+        return f"{tenant_id}:{session_id}"
+
+    def _enqueue(self, entry: Tuple[str, str, str, Optional[Dict]]) -> None:
+        if len(self.buffer) >= self.max_buffered:
+            self.buffer.popleft()
+            self.dropped += 1
+        self.buffer.append(entry)
+        if len(self.buffer) >= self.batch_size:
+            self._wakeup.set()
+
+    def append(self, tenant_id: str, session_id: str, role: str, text: str) -> None:
+        """Queue a message for the session's transcript"""
+        self._enqueue((tenant_id, session_id, OP_APPEND, {"role": role, "text": text, "ts": datetime.utcnow()}))
+
+    def clear(self, tenant_id: str, session_id: str) -> None:
+        """Queue emptying the session's transcript (messages queued before it are dropped too)"""
+        self._enqueue((tenant_id, session_id, OP_CLEAR, None))
+
+    def _build_operations(self, batch: List[Tuple]) -> Tuple[List[UpdateOne], List[List[Tuple]]]:
+        """
+        One $push per run of consecutive appends to a session, one $set per clear
+
+        Returns:
+            Operations in the order they must be applied, and the queue
+            entries behind each operation (requeued if it isn't applied)
+        """
+        operations: List[UpdateOne] = []
+        sources: List[List[Tuple]] = []
+        runs: Dict[Tuple[str, str], List[Tuple]] = {}
+        now = datetime.utcnow()
+
+        def push(key: Tuple[str, str]) -> None:
+            entries = runs.pop(key)
+            operations.append(UpdateOne(
+                {"_id": self._doc_id(*key)},
+                {
+                    "$push": {"messages": {"$each": [entry[3] for entry in entries], "$slice": -self.max_messages}},
+                    "$inc": {"user_messages": sum(1 for entry in entries if entry[3]["role"] == "user")},
+                    "$set": {"last_updated": now},
+                    "$setOnInsert": {"tenant": key[0], "session_id": key[1], "created_at": now}
+                },
+                upsert=True
+            ))
+            sources.append(entries)
+
+        for entry in batch:
+            key = (entry[0], entry[1])
+            if entry[2] == OP_APPEND:
+                runs.setdefault(key, []).append(entry)
+                continue
+            if key in runs:
+                push(key)
+            operations.append(UpdateOne(
+                {"_id": self._doc_id(*key)},
+                {"$set": {"messages": [], "user_messages": 0, "last_updated": now}}
+            ))
+            sources.append([entry])
+
+        for key in list(runs):
+            push(key)
+        return operations, sources
+
+    async def flush(self) -> int:
+        """
+        Write up to batch_size queued operations
+
+        Returns:
+            Number of queue entries written; on failure the unwritten ones go
+            back to the front of the queue
+        """
+        if self.collection is None or not self.buffer:
+            return 0
+
+        batch = [self.buffer.popleft() for _ in range(min(len(self.buffer), self.batch_size))]
+        operations, sources = self._build_operations(batch)
+        try:
+            await self.collection.bulk_write(operations, ordered=True)
+        except Exception as e:
+            # Ordered bulk writes stop at the first error; everything before it was applied
+            failed_at = 0
+            if isinstance(e, BulkWriteError) and e.details.get("writeErrors"):
+                failed_at = e.details["writeErrors"][0]["index"]
+            unwritten = [entry for entries in sources[failed_at:] for entry in entries]
+            self.buffer.extendleft(reversed(unwritten))
+            while len(self.buffer) > self.max_buffered:
+                self.buffer.popleft()
+                self.dropped += 1
+            self.last_error = str(e)
+            logger.warning("Transcript flush failed", extra={"queued": len(self.buffer), "dropped": self.dropped, "error": str(e) or type(e).__name__})
+            written = len(batch) - len(unwritten)
+        else:
+            self.last_error = None
+            written = len(batch)
+
+        self.written += written
+        self.last_flush_at = time.time()
+        return written
+
+    async def flush_all(self) -> int:
+        """Flush until the queue is empty or a write fails"""
+        written = 0
+        while self.buffer:
+            flushed = await self.flush()
+            if not flushed or self.last_error:
+                break
+            written += flushed
+        return written
+
+    async def run(self):
+        """Background flusher: every flush_seconds, or as soon as a full batch is queued"""
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.flush_seconds)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush_all()
+            except Exception as e:
+                logger.exception("Transcript flusher error")
+
+    async def load_recent(self, tenant_id: str, session_id: str, limit: int) -> Optional[Tuple[List[Tuple[str, str]], int]]:
+        """
+        A session's newest messages, for rebuilding it after a restart
+
+        Args:
+            tenant_id: Tenant the session belongs to
+            session_id: Session identifier
+            limit: Most messages to return
+
+        Returns:
+            ([(role, text), ...] oldest first, lead messages in the whole
+            transcript), or None if the session has no transcript or it
+            couldn't be read within transcript_load_timeout_seconds
+        """
+        messages: List[Tuple[str, str]] = []
+        user_messages = 0
+        found = False
+
+        if self.collection is not None:
+            try:
+                doc = await asyncio.wait_for(
+                    self.collection.find_one(
+                        {"_id": self._doc_id(tenant_id, session_id)},
+                        {"messages": {"$slice": -limit}, "user_messages": 1}
+                    ),
+                    settings.transcript_load_timeout_seconds
+                )
+            except Exception as e:
+                logger.warning("Couldn't load transcript", extra={"tenant_id": tenant_id, "session_id": session_id, "error": str(e) or type(e).__name__})
+                doc = None
+            if doc:
+                found = True
+                messages = [(m["role"], m["text"]) for m in doc.get("messages", [])]
+                user_messages = doc.get("user_messages", 0)
+
+        # Writes not flushed yet (e.g. MongoDB was down) still belong to the session
+        for entry_tenant, entry_session, op, message in list(self.buffer):
+            if entry_tenant != tenant_id or entry_session != session_id:
+                continue
+            found = True
+            if op == OP_CLEAR:
+                messages, user_messages = [], 0
+            else:
+                messages.append((message["role"], message["text"]))
+                user_messages += message["role"] == "user"
+
+        if not found:
+            return None
+        self.rehydrated += 1
+        return messages[-limit:], user_messages
+
+    def get_stats(self) -> Dict:
+        return {
+            "queued": len(self.buffer),
+            "written": self.written,
+            "dropped": self.dropped,
+            "rehydrated": self.rehydrated,
+            "last_flush_at": self.last_flush_at,
+            "last_error": self.last_error
+        }
+
+# Singleton instance (limits come from settings, read on first use)
+transcript_store = LazySingleton(lambda: TranscriptStore(
+    max_messages=settings.transcript_max_messages,
+    batch_size=settings.transcript_batch_size,
+    flush_seconds=settings.transcript_flush_seconds,
+    max_buffered=settings.transcript_max_buffered
+))
@@ -0,0 +1,223 @@
+import asyncio
+import time
+from collections import OrderedDict
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from pymongo import ReturnDocument
+from app.config import settings
+from app.utils.logger import get_logger
+
+logger = get_logger(__name__)
+
+# LLM callers tracked per turn
+COMPONENT_AGENT = "main_agent"
+COMPONENT_CLASSIFIER = "intent_classifier"
+COMPONENT_MEMORY = "memory_manager"
+
+MAX_STORED_TURNS = 50  # Per-turn breakdowns kept on each usage document
+
+
+def _field_key(name: str) -> str:
+    """Model names like "gpt-5.1" can't be used as-is in dotted $inc paths"""
+    return name.replace(".", "_")
+
+
+class TurnUsage:
+    """Tokens and estimated cost of one conversation turn, by component and model"""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.started_at = datetime.utcnow().isoformat()
+        self.components: Dict[str, Dict] = {}
+        self.models: Dict[str, Dict] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost_usd = 0.0
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, component: str, model: str, prompt_tokens: int, completion_tokens: int, cost_usd: float) -> None:
+        for bucket in (
+            self.components.setdefault(component, {}),
+            self.models.setdefault(model, {})
+        ):
+            bucket["calls"] = bucket.get("calls", 0) + 1
+            bucket["prompt_tokens"] = bucket.get("prompt_tokens", 0) + prompt_tokens
+            bucket["completion_tokens"] = bucket.get("completion_tokens", 0) + completion_tokens
+            bucket["cost_usd"] = bucket.get("cost_usd", 0.0) + cost_usd
+
+        self.prompt_tokens += prompt_tokens
+        self.completion_tokens += completion_tokens
+        self.cost_usd += cost_usd
+
+    def to_dict(self) -> Dict:
+        return {
+            "started_at": self.started_at,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "total_tokens": self.total_tokens,
+            "cost_usd": round(self.cost_usd, 6),
+            "components": self.components,
+            "models": {_field_key(model): bucket for model, bucket in self.models.items()}
+        }
+
+
+# Usage of the turn being processed in the current task; LLM calls made while
+# handling a turn (agent, tools) add to it via ModelRouter.record
+current_turn_usage: ContextVar[Optional[TurnUsage]] = ContextVar("current_turn_usage", default=None)
+
+
+class UsageService:
+    """
+    Per-session token and cost accounting
+
+    One document per session in the `lead_usage` collection (same _id as
+    `user_memories`) holds running totals, per-component and per-model $inc
+    counters and the last MAX_STORED_TURNS turn breakdowns. Session totals are
+    cached in-process so budget checks don't hit MongoDB on every turn; the
+    cache keeps the usage_totals_cache_size most recent sessions, each for
+    usage_totals_cache_seconds, so spend recorded by other processes (web
+    workers, queue workers) is seen within that long.
+    """
+
+    def __init__(self):
+        self.collection = None
+        self.totals: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()  # session id -> (cached at, totals)
+
+    def attach(self, db):
+        """Bind to the usage collection of a connected database"""
+        self.collection = db["lead_usage"]
+
+    def start_turn(self, session_id: str) -> TurnUsage:
+        """Begin collecting usage for a turn in the current task"""
+        turn = TurnUsage(session_id)
+        current_turn_usage.set(turn)
+        return turn
+
+    @staticmethod
+    def current_turn() -> Optional[TurnUsage]:
+        return current_turn_usage.get()
+
+    def _cached_totals(self, session_id: str) -> Optional[Dict]:
+        entry = self.totals.get(session_id)
+        if entry is None:
+            return None
+        cached_at, totals = entry
+        if time.monotonic() - cached_at > settings.usage_totals_cache_seconds:
+            del self.totals[session_id]
+            return None
+        self.totals.move_to_end(session_id)
+        return totals
+
+    def _cache_totals(self, session_id: str, totals: Dict) -> None:
+        self.totals[session_id] = (time.monotonic(), totals)
+        self.totals.move_to_end(session_id)
+        while len(self.totals) > settings.usage_totals_cache_size:
+            self.totals.popitem(last=False)
+
+    async def get_session_totals(self, session_id: str) -> Dict:
+        """Total tokens and cost recorded for a session so far"""
+        totals = self._cached_totals(session_id)
+        if totals is not None:
+            return totals
+
+        totals = {"total_tokens": 0, "cost_usd": 0.0}
+        if self.collection is not None:
+            try:
+                doc = await asyncio.wait_for(
+                    self.collection.find_one({"_id": session_id}, {"total_tokens": 1, "cost_usd": 1}),
+                    settings.mongodb_read_timeout_seconds
+                )
+                if doc:
+                    totals = {"total_tokens": doc.get("total_tokens", 0), "cost_usd": doc.get("cost_usd", 0.0)}
+            except Exception as e:
+                logger.warning("Error loading usage totals", extra={"session_id": session_id, "error": str(e) or type(e).__name__})
+
+        self._cache_totals(session_id, totals)
+        return totals
+
+    @staticmethod
+    def is_over_budget(totals: Dict) -> bool:
+        """Whether a session has used up its token or cost budget (0 = unlimited)"""
+        if settings.session_token_budget and totals.get("total_tokens", 0) >= settings.session_token_budget:
+            return True
+        if settings.session_cost_budget_usd and totals.get("cost_usd", 0.0) >= settings.session_cost_budget_usd:
+            return True
+        return False
+
+    async def finish_turn(self, turn: TurnUsage, degraded: bool = False) -> None:
+        """
+        Persist a turn's usage and stop collecting for the current task
+
+        Args:
+            turn: Usage collected while the turn ran
+            degraded: Whether the turn ran in budget-exceeded mode
+        """
+        current_turn_usage.set(None)
+
+        if self.collection is None:
+            totals = self._cached_totals(turn.session_id) or {"total_tokens": 0, "cost_usd": 0.0}
+            self._cache_totals(turn.session_id, {
+                "total_tokens": totals["total_tokens"] + turn.total_tokens,
+                "cost_usd": totals["cost_usd"] + turn.cost_usd
+            })
+            return
+
+        inc = {
+            "turns": 1,
+            "prompt_tokens": turn.prompt_tokens,
+            "completion_tokens": turn.completion_tokens,
+            "total_tokens": turn.total_tokens,
+            "cost_usd": turn.cost_usd
+        }
+        if degraded:
+            inc["degraded_turns"] = 1
+        for prefix, buckets in (("components", turn.components), ("models", turn.models)):
+            for name, bucket in buckets.items():
+                for key, value in bucket.items():
+                    inc[f"{prefix}.{_field_key(name)}.{key}"] = value
+
+        try:
+            # The updated totals include spend other processes recorded for the session.
+            # Bounded like memory writes, so an outage doesn't hold up the reply.
+            doc = await asyncio.wait_for(
+                self.collection.find_one_and_update(
+                    {"_id": turn.session_id},
+                    {
+                        "$inc": inc,
+                        "$set": {"last_updated": datetime.utcnow()},
+                        "$setOnInsert": {"created_at": datetime.utcnow()},
+                        "$push": {"recent_turns": {"$each": [turn.to_dict()], "$slice": -MAX_STORED_TURNS}}
+                    },
+                    projection={"total_tokens": 1, "cost_usd": 1},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                ),
+                settings.mongodb_write_timeout_seconds
+            )
+            self._cache_totals(turn.session_id, {"total_tokens": doc["total_tokens"], "cost_usd": doc["cost_usd"]})
+        except Exception as e:
+            self.totals.pop(turn.session_id, None)  # Reload from MongoDB next turn
+            logger.warning("Error saving usage", extra={"session_id": turn.session_id, "error": str(e) or type(e).__name__})
+
+    async def get_usage(self, session_id: str) -> Optional[Dict]:
+        """Stored usage document for a session, with its budget status (None if unknown or not connected)"""
+        if self.collection is None:
+            return None
+        doc = await self.collection.find_one({"_id": session_id})
+        if not doc:
+            return None
+
+        doc["session_id"] = doc.pop("_id")
+        doc["budget"] = {
+            "token_budget": settings.session_token_budget,
+            "cost_budget_usd": settings.session_cost_budget_usd,
+            "exceeded": self.is_over_budget(doc)
+        }
+        return doc
+
+# Singleton instance
+usage_service = UsageService()
@@ -1,23 +1,29 @@
-from langchain.tools import Tool
+from langchain.tools import Tool, StructuredTool
+from langchain.pydantic_v1 import BaseModel, Field
 from app.services.calendly_service import calendly_service
+from app.services.availability_index import availability_indexes
+from app.services.mongodb_service import mongodb_service
 import json
 import asyncio
 
+def _run_sync(coroutine):
+    """Run a coroutine from a sync tool call"""
+    try:
+        loop = asyncio.get_event_loop()
+    except RuntimeError:
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+    
+    return loop.run_until_complete(coroutine)
+
 # ============= GET AVAILABLE SLOTS =============
 
-def get_available_slots_sync(days_ahead: str = "7") -> str:
+async def get_available_slots_async(days_ahead: str = "7") -> str:
     """Get available time slots for gym trial booking"""
     try:
         days = int(days_ahead)
         
-        # Run async function in sync context
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        slots = loop.run_until_complete(calendly_service.get_available_slots(days))
+        slots = await calendly_service.get_available_slots(days)
         
         if not slots:
             return json.dumps({
@@ -42,9 +48,63 @@ def get_available_slots_sync(days_ahead: str = "7") -> str:
             "message": f"Error: {str(e)}"
         })
 
+def get_available_slots_sync(days_ahead: str = "7") -> str:
+    """Synchronous wrapper for get_available_slots_async"""
+    return _run_sync(get_available_slots_async(days_ahead))
+
+# ============= FIND MATCHING SLOTS =============
+
+MATCHING_SLOTS_LIMIT = 3
+
+class FindSlotsInput(BaseModel):
+    """Input schema for the slot search tool"""
+    session_id: str = Field(description="The current session ID from the conversation")
+    query: str = Field(default="", description="The lead's requested day/time, e.g. 'Tuesday evening', 'weekend mornings', 'tomorrow 7 PM'. Empty for the best slots overall.")
+
+async def find_matching_slots_async(session_id: str, query: str = "") -> str:
+    """Top slots for a day/time request, ranked against the lead's stored preferred_time"""
+    try:
+        availability_index = availability_indexes.get()
+        await availability_index.refresh()
+        
+        preferred_time = None
+        if session_id and session_id != "session_id_here":
+            memory = await mongodb_service.get_memory(session_id)
+            preferred_time = (memory or {}).get("preferred_time")
+        
+        result = availability_index.search(query, preferred_time, limit=MATCHING_SLOTS_LIMIT)
+        
+        if not result["slots"]:
+            return json.dumps({
+                "success": False,
+                "message": "No available slots found"
+            })
+        
+        if result["exact_match"]:
+            message = f"{result['total_matching']} slots match; best {len(result['slots'])} shown"
+        else:
+            message = "Nothing matches that request; these are the closest alternatives"
+        
+        return json.dumps({
+            "success": True,
+            "exact_match": result["exact_match"],
+            "slots": result["slots"],
+            "message": message
+        })
+        
+    except Exception as e:
+        return json.dumps({
+            "success": False,
+            "message": f"Error: {str(e)}"
+        })
+
+def find_matching_slots_sync(session_id: str, query: str = "") -> str:
+    """Synchronous wrapper for find_matching_slots_async"""
+    return _run_sync(find_matching_slots_async(session_id, query))
+
 # ============= BOOK TRIAL SLOT =============
 
-def book_trial_slot_sync(booking_data: str) -> str:
+async def book_trial_slot_async(booking_data: str) -> str:
     """Book a gym trial slot - input must be JSON string"""
     try:
         data = json.loads(booking_data)
@@ -59,19 +119,10 @@ def book_trial_slot_sync(booking_data: str) -> str:
                 "message": "Missing required fields: email, name, or slot_time"
             })
         
-        # Run async function in sync context
-        try:
-            loop = asyncio.get_event_loop()
-        except RuntimeError:
-            loop = asyncio.new_event_loop()
-            asyncio.set_event_loop(loop)
-        
-        result = loop.run_until_complete(
-            calendly_service.create_booking(
-                email=email,
-                name=name,
-                start_time=slot_time
-            )
+        result = await calendly_service.create_booking(
+            email=email,
+            name=name,
+            start_time=slot_time
         )
         
         return json.dumps(result, indent=2)
@@ -87,16 +138,32 @@ def book_trial_slot_sync(booking_data: str) -> str:
             "message": f"Booking error: {str(e)}"
         })
 
+def book_trial_slot_sync(booking_data: str) -> str:
+    """Synchronous wrapper for book_trial_slot_async"""
+    return _run_sync(book_trial_slot_async(booking_data))
+
 # ============= CREATE TOOLS =============
 
 get_availability_tool = Tool(
     name="get_available_slots",
     description="Check available time slots for gym trial bookings. Input: number of days to look ahead (default 7). Returns list of available slots.",
-    func=get_available_slots_sync
+    func=get_available_slots_sync,
+    coroutine=get_available_slots_async
+)
+
+find_slots_tool = StructuredTool.from_function(
+    func=find_matching_slots_sync,
+    coroutine=find_matching_slots_async,
+    name="find_matching_slots",
+    description="""Find the best trial slots for a day/time request such as "Tuesday evening", "weekend mornings" or "tomorrow 7 PM".
+    Results are ranked against the lead's remembered preferred time, and only the top 3 are returned, each with its exact start_time for booking.
+    Prefer this over get_available_slots whenever the lead mentions any day or time preference.""",
+    args_schema=FindSlotsInput
 )
 
 book_trial_tool = Tool(
     name="book_gym_trial",
     description="Book a gym trial slot. Input MUST be a single JSON string: '{\"email\": \"user@email.com\", \"name\": \"Full Name\", \"slot_time\": \"2024-12-18T09:00:00\"}'. Only use after user confirms booking.",
-    func=book_trial_slot_sync
+    func=book_trial_slot_sync,
+    coroutine=book_trial_slot_async
 )
\ No newline at end of file
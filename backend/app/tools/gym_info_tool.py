@@ -1,69 +1,74 @@
 from langchain.tools import Tool
-from app.config import settings
 import json
+from typing import Dict, Mapping
+from app.services.tenants import Tenant
+from app.services.knowledge_base import derived, gym_knowledge, to_json
 
-# Mock gym database - in production, this would come from a real database
-GYM_INFO_DATABASE = {
-    "facilities": {
-        "cardio_zone": {
-            "equipment": ["Treadmills (15)", "Ellipticals (10)", "Rowing Machines (5)", "Spin Bikes (12)"],
-            "features": "Air-conditioned, TV screens, water stations"
+# Topics of the tool payloads and the query words that select them (first match wins)
+TOPIC_KEYWORDS = [
+    ("facilities", ("facility", "facilities", "equipment")),
+    ("classes", ("class", "schedule")),
+    ("trainers", ("trainer", "coach")),
+    ("operating_hours", ("hour", "timing", "time")),
+    ("membership_plans", ("price", "plan", "membership", "cost")),
+    ("trial_benefits", ("trial", "benefit")),
+    ("success_stories", ("success", "result", "testimonial"))
+]
+
+@derived("gym_info_payloads")
+def build_gym_info_payloads(data: Mapping, tenant: Tenant) -> Dict[str, str]:
+    """Every tool response for one gym data version, serialized once"""
+    trial = data["trial"]
+    facilities = {
+        name: {key: value for key, value in facility.items() if key != "highlight"}
+        if isinstance(facility, Mapping) else facility
+        for name, facility in data["facilities"].items()
+    }
+    payloads = {
+        "facilities": {
+            "topic": "facilities",
+            "data": facilities,
+            "summary": f"{tenant.gym_name} offers: {tenant.gym_facilities}"
+        },
+        "classes": {
+            "topic": "classes",
+            "data": data["classes"],
+            "summary": f"We offer {len(data['classes'])} different group fitness classes"
+        },
+        "trainers": {
+            "topic": "trainers",
+            "data": data["trainers"],
+            "summary": f"We have {len(data['trainers'])} certified personal trainers"
         },
-        "strength_training": {
-            "equipment": ["Free weights up to 50kg", "Cable machines", "Smith machine", "Leg press", "Chest press"],
-            "features": "Olympic lifting platform, Full dumbbell rack"
+        "operating_hours": {
+            "topic": "operating_hours",
+            "data": data["operating_hours"]
         },
-        "swimming_pool": {
-            "details": "Olympic-size pool (50m), Separate kids pool, Heated in winter",
-            "timings": "6 AM - 10 PM",
-            "features": "Professional swimming coaches available"
+        "membership_plans": {
+            "topic": "membership_plans",
+            "data": data["membership_plans"],
+            "trial_price": tenant.gym_trial_price
         },
-        "yoga_studio": {
-            "details": "Peaceful studio with meditation area",
-            "classes": "Morning yoga (7 AM), Evening yoga (6 PM), Weekend workshops",
-            "features": "All equipment provided"
+        "trial_benefits": {
+            "topic": "trial_benefits",
+            "data": trial["benefits"],
+            "price": tenant.gym_trial_price,
+            "summary": f"Trial includes full gym access, PT session, and fitness assessment for ₹{tenant.gym_trial_price}"
         },
-        "amenities": ["Steam room", "Sauna", "Locker rooms", "Shower facilities", "Juice bar", "Free parking"]
-    },
-    "classes": [
-        {"name": "HIIT Training", "timing": "Mon/Wed/Fri 6 AM, 7 PM", "level": "All levels"},
-        {"name": "Zumba", "timing": "Tue/Thu/Sat 6 PM", "level": "Beginners welcome"},
-        {"name": "Yoga", "timing": "Daily 7 AM, 6 PM", "level": "All levels"},
-        {"name": "CrossFit", "timing": "Mon/Wed/Fri 8 AM, 5 PM", "level": "Intermediate+"},
-        {"name": "Spinning", "timing": "Tue/Thu 7 AM, 8 PM", "level": "All levels"},
-        {"name": "Boxing", "timing": "Mon/Thu 6 PM", "level": "All levels"}
-    ],
-    "trainers": [
-        {"name": "Rahul Sharma", "specialization": "Strength & Bodybuilding", "experience": "8 years"},
-        {"name": "Priya Patel", "specialization": "Weight Loss & Nutrition", "experience": "6 years"},
-        {"name": "Amit Kumar", "specialization": "CrossFit & Functional Training", "experience": "5 years"},
-        {"name": "Sneha Reddy", "specialization": "Yoga & Flexibility", "experience": "10 years"}
-    ],
-    "operating_hours": {
-        "weekdays": "5 AM - 11 PM",
-        "weekends": "6 AM - 10 PM",
-        "holidays": "7 AM - 8 PM"
-    },
-    "membership_plans": [
-        {"name": "Monthly", "price": 2500, "features": "All facilities, Group classes"},
-        {"name": "Quarterly", "price": 6500, "features": "All facilities, Group classes, 2 PT sessions"},
-        {"name": "Annual", "price": 20000, "features": "All facilities, Unlimited classes, 10 PT sessions, Guest passes"}
-    ],
-    "trial_benefits": [
-        "Full gym access for 1 day",
-        "1 complimentary personal training session (30 mins)",
-        "Fitness assessment and body composition analysis",
-        "Nutrition consultation",
-        "Access to all group classes scheduled that day",
-        "Free trial of all facilities including pool and steam room"
-    ],
-    "success_stories": [
-        "Rohan lost 15kg in 3 months with our weight loss program",
-        "Anita completed her first marathon after training with us",
-        "Vikram gained 8kg muscle mass in 6 months",
-        "Senior member Mrs. Kapoor improved her flexibility and joint health"
-    ]
-}
+        "success_stories": {
+            "topic": "success_stories",
+            "data": data["success_stories"]
+        },
+        "overview": {
+            "topic": "overview",
+            "gym_name": tenant.gym_name,
+            "location": tenant.gym_location,
+            "trial_price": tenant.gym_trial_price,
+            "main_facilities": tenant.gym_facilities.split(", "),
+            "available_info": ["facilities", "classes", "trainers", "hours", "plans", "trial", "success_stories"]
+        }
+    }
+    return {topic: to_json(payload, indent=2) for topic, payload in payloads.items()}
 
 def get_gym_info_tool(query: str) -> str:
     """
@@ -78,65 +83,12 @@ def get_gym_info_tool(query: str) -> str:
     query = query.lower().strip()
     
     try:
-        # Handle different query types
-        if "facility" in query or "facilities" in query or "equipment" in query:
-            return json.dumps({
-                "topic": "facilities",
-                "data": GYM_INFO_DATABASE["facilities"],
-                "summary": f"{settings.gym_name} offers: {settings.gym_facilities}"
-            }, indent=2)
-        
-        elif "class" in query or "schedule" in query:
-            return json.dumps({
-                "topic": "classes",
-                "data": GYM_INFO_DATABASE["classes"],
-                "summary": f"We offer {len(GYM_INFO_DATABASE['classes'])} different group fitness classes"
-            }, indent=2)
-        
-        elif "trainer" in query or "coach" in query:
-            return json.dumps({
-                "topic": "trainers",
-                "data": GYM_INFO_DATABASE["trainers"],
-                "summary": f"We have {len(GYM_INFO_DATABASE['trainers'])} certified personal trainers"
-            }, indent=2)
-        
-        elif "hour" in query or "timing" in query or "time" in query:
-            return json.dumps({
-                "topic": "operating_hours",
-                "data": GYM_INFO_DATABASE["operating_hours"]
-            }, indent=2)
-        
-        elif "price" in query or "plan" in query or "membership" in query or "cost" in query:
-            return json.dumps({
-                "topic": "membership_plans",
-                "data": GYM_INFO_DATABASE["membership_plans"],
-                "trial_price": settings.gym_trial_price
-            }, indent=2)
-        
-        elif "trial" in query or "benefit" in query:
-            return json.dumps({
-                "topic": "trial_benefits",
-                "data": GYM_INFO_DATABASE["trial_benefits"],
-                "price": settings.gym_trial_price,
-                "summary": f"Trial includes full gym access, PT session, and fitness assessment for ₹{settings.gym_trial_price}"
-            }, indent=2)
-        
-        elif "success" in query or "result" in query or "testimonial" in query:
-            return json.dumps({
-                "topic": "success_stories",
-                "data": GYM_INFO_DATABASE["success_stories"]
-            }, indent=2)
-        
-        else:
-            # Return general overview
-            return json.dumps({
-                "topic": "overview",
-                "gym_name": settings.gym_name,
-                "location": settings.gym_location,
-                "trial_price": settings.gym_trial_price,
-                "main_facilities": settings.gym_facilities.split(", "),
-                "available_info": ["facilities", "classes", "trainers", "hours", "plans", "trial", "success_stories"]
-            }, indent=2)
+        payloads = gym_knowledge.snapshot().derived("gym_info_payloads")
+        for topic, keywords in TOPIC_KEYWORDS:
+            if any(keyword in query for keyword in keywords):
+                return payloads[topic]
+        # Return general overview
+        return payloads["overview"]
             
     except Exception as e:
         return json.dumps({
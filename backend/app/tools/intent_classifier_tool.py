@@ -4,9 +4,17 @@ from langchain.output_parsers import PydanticOutputParser
 from langchain.tools import Tool
 from app.models.schemas import IntentClassification
 from app.agents.prompts import INTENT_CLASSIFIER_PROMPT
+from app.agents.model_router import model_router, TokenUsageHandler
+from app.services.usage_service import COMPONENT_CLASSIFIER
 from app.config import settings
+from app.utils.helpers import LazySingleton
+from app.utils.logger import get_logger
+from typing import Optional
 import json
 import asyncio
+import time
+
+logger = get_logger(__name__)
 
 class IntentClassifierAgent:
     """
@@ -15,11 +23,9 @@ class IntentClassifierAgent:
     """
     
     def __init__(self):
-        self.llm = ChatOpenAI(
-            model="gpt-5.1",
-            temperature=0,
-            openai_api_key=settings.openai_api_key
-        )
+        # One client per model; the router picks which one a message uses
+        self.llms = {}
+        self.llm = self._get_llm(settings.intent_classifier_model)
         
         self.parser = PydanticOutputParser(pydantic_object=IntentClassification)
         
@@ -34,10 +40,29 @@ Latest user message:
 {format_instructions}""")
         ])
     
+    def _get_llm(self, model: str) -> ChatOpenAI:
+        """Get (or create and cache) the LLM client for a model"""
+        if model not in self.llms:
+            self.llms[model] = ChatOpenAI(
+                model=model,
+                temperature=0,
+                openai_api_key=settings.openai_api_key
+            )
+        return self.llms[model]
+    
+    def build_messages(self, user_message: str, conversation_history: str = "") -> list:
+        """Render the chat messages sent to the model for one classification"""
+        return self.prompt.format_messages(
+            user_message=user_message,
+            conversation_history=conversation_history or "No previous context",
+            format_instructions=self.parser.get_format_instructions()
+        )
+    
     async def classify_intent(
         self,
         user_message: str,
-        conversation_history: str = ""
+        conversation_history: str = "",
+        model: Optional[str] = None
     ) -> IntentClassification:
         """
         Classify user intent based on their message and conversation history
@@ -45,31 +70,40 @@ Latest user message:
         Args:
             user_message: The latest message from user
             conversation_history: Previous conversation context
+            model: Force a specific model instead of the routed one
             
         Returns:
             IntentClassification with level, reasoning, and indicators
         """
         try:
-            # Format the prompt
-            formatted_prompt = self.prompt.format_messages(
-                user_message=user_message,
-                conversation_history=conversation_history or "No previous context",
-                format_instructions=self.parser.get_format_instructions()
-            )
+            formatted_prompt = self.build_messages(user_message, conversation_history)
             
-            # Get classification
-            response = await self.llm.ainvoke(formatted_prompt)
+            # Get classification from the routed model
+            model = model or model_router.route_classifier(user_message)
+            usage = TokenUsageHandler()
+            started = time.perf_counter()
+            response = await self._get_llm(model).ainvoke(
+                formatted_prompt,
+                config={"callbacks": [usage]}
+            )
+            model_router.record(
+                model,
+                time.perf_counter() - started,
+                usage.prompt_tokens,
+                usage.completion_tokens,
+                component=COMPONENT_CLASSIFIER
+            )
             
             # Parse the response
             intent = self.parser.parse(response.content)
             
-            print(f"[INTENT CLASSIFIER] Level: {intent.intent_level}")
-            print(f"[INTENT CLASSIFIER] Reasoning: {intent.reasoning}")
+            logger.info("Intent classified", extra={"intent": intent.intent_level})
+            logger.debug("Intent reasoning", extra={"reasoning": intent.reasoning, "indicators": intent.key_indicators})
             
             return intent
             
         except Exception as e:
-            print(f"Error in intent classification: {str(e)}")
+            logger.warning("Intent classification failed", extra={"error": str(e)})
             # Default to medium intent on error
             return IntentClassification(
                 intent_level="medium",
@@ -77,21 +111,41 @@ Latest user message:
                 key_indicators=["classification_error"]
             )
 
-# Singleton instance
-intent_classifier = IntentClassifierAgent()
+# Singleton instance (built on first use)
+intent_classifier = LazySingleton(IntentClassifierAgent)
+
+def _parse_tool_input(input_str: str) -> tuple:
+    """Split tool input (JSON or plain text) into (user_message, conversation_history)"""
+    if input_str.startswith('{'):
+        data = json.loads(input_str)
+        return data.get('user_message', input_str), data.get('conversation_history', '')
+    return input_str, ''
+
+def _format_result(result: IntentClassification) -> str:
+    return json.dumps({
+        "intent_level": result.intent_level,
+        "reasoning": result.reasoning,
+        "key_indicators": result.key_indicators
+    })
+
+async def classify_intent_async(input_str: str) -> str:
+    """Async tool entry point; runs in the agent's task so usage is attributed to the turn"""
+    try:
+        user_message, conversation_history = _parse_tool_input(input_str)
+        result = await intent_classifier.classify_intent(user_message, conversation_history)
+        return _format_result(result)
+    except Exception as e:
+        return json.dumps({
+            "intent_level": "medium",
+            "reasoning": f"Error: {str(e)}",
+            "key_indicators": []
+        })
 
 # Create SYNC wrapper for the tool
 def classify_intent_sync(input_str: str) -> str:
     """Synchronous wrapper for intent classification"""
     try:
-        # Parse input if it's JSON, otherwise use as-is
-        if input_str.startswith('{'):
-            data = json.loads(input_str)
-            user_message = data.get('user_message', input_str)
-            conversation_history = data.get('conversation_history', '')
-        else:
-            user_message = input_str
-            conversation_history = ''
+        user_message, conversation_history = _parse_tool_input(input_str)
         
         # Run async function in sync context
         try:
@@ -104,11 +158,7 @@ def classify_intent_sync(input_str: str) -> str:
             intent_classifier.classify_intent(user_message, conversation_history)
         )
         
-        return json.dumps({
-            "intent_level": result.intent_level,
-            "reasoning": result.reasoning,
-            "key_indicators": result.key_indicators
-        })
+        return _format_result(result)
     except Exception as e:
         return json.dumps({
             "intent_level": "medium",
@@ -120,5 +170,6 @@ def classify_intent_sync(input_str: str) -> str:
 intent_classifier_tool = Tool(
     name="classify_user_intent",
     description="Classify user's intent level (high/medium/low) based on their message. Call this first for every user message.",
-    func=classify_intent_sync
-)
\ No newline at end of file
+    func=classify_intent_sync,
+    coroutine=classify_intent_async
+)
@@ -2,9 +2,12 @@ from langchain.tools import StructuredTool
 from langchain.pydantic_v1 import BaseModel, Field
 from app.services.mongodb_service import mongodb_service
 from app.agents.memory_manager import memory_manager
+from app.utils.logger import get_logger
 import json
 import asyncio
 
+logger = get_logger(__name__)
+
 class MemoryUpdateInput(BaseModel):
     """Input schema for memory update tool"""
     session_id: str = Field(description="The current session ID from the conversation")
@@ -40,6 +43,12 @@ async def update_memory_async(
         
         # Fetch current memory from MongoDB
         current_memory = await mongodb_service.get_memory(session_id)
+        if current_memory is None:
+            # Don't overwrite a stored profile we couldn't read
+            return json.dumps({
+                "success": False,
+                "message": "Lead memory is temporarily unavailable; it will be updated on a later turn"
+            })
         
         # Call Memory Manager Agent to update
         updated_memory = await memory_manager.update_memory(
@@ -72,8 +81,7 @@ async def update_memory_async(
             })
         
     except Exception as e:
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error updating lead memory", extra={"session_id": session_id})
         return json.dumps({
             "success": False,
             "message": f"Error: {str(e)}"
@@ -94,6 +102,7 @@ def update_memory_sync(session_id: str, user_message: str, agent_response: str)
 # Create LangChain StructuredTool
 memory_update_tool = StructuredTool.from_function(
     func=update_memory_sync,
+    coroutine=update_memory_async,
     name="update_lead_memory",
     description="""Update the lead's memory profile with new information.
     
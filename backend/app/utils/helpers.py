@@ -0,0 +1,138 @@
+import asyncio
+import re
+import threading
+import time
+
+# Free-text memory fields are bucketed into a few fixed categories for analytics.
+# Category names are used as MongoDB field names, so keep them as plain slugs.
+
+TIMELINE_CATEGORIES = ("immediate", "this_month", "later", "unknown")
+OBJECTION_CATEGORIES = ("none", "price", "timing", "location", "commitment", "other")
+BOOKING_STATUSES = ("not_booked", "booked", "canceled")
+INTENT_LEVELS = ("high", "medium", "low", "unknown")
+
+_TIMELINE_RULES = [
+    ("immediate", r"\b(today|tomorrow|tonight|this week|right away|asap|now|immediately)\b"),
+    ("this_month", r"\b(next week|this month|couple of weeks|\d+\s*weeks?|few days|soon)\b"),
+    ("later", r"\b(next month|months?|after|later|new year|year)\b"),
+]
+
+_OBJECTION_RULES = [
+    ("price", r"\b(price|pricing|cost|expensive|afford|budget|money|payment|fee)"),
+    ("timing", r"\b(time|timing|busy|schedule|hours|shift|travel)"),
+    ("location", r"\b(far|distance|location|commute|parking|traffic)"),
+    ("commitment", r"\b(think about|not sure|spouse|wife|husband|partner|friend|family|decide|commit)"),
+]
+
+
+def _is_empty(value) -> bool:
+    return not value or str(value).strip().lower() in ("unknown", "none", "n/a", "")
+
+
+def categorize_timeline(joining_timeline: str) -> str:
+    """Bucket a free-text joining timeline into a TIMELINE_CATEGORIES value"""
+    if _is_empty(joining_timeline):
+        return "unknown"
+    text = str(joining_timeline).lower()
+    for category, pattern in _TIMELINE_RULES:
+        if re.search(pattern, text):
+            return category
+    return "unknown"
+
+
+def categorize_objection(objections: str) -> str:
+    """Bucket free-text objections into an OBJECTION_CATEGORIES value"""
+    if _is_empty(objections):
+        return "none"
+    text = str(objections).lower()
+    for category, pattern in _OBJECTION_RULES:
+        if re.search(pattern, text):
+            return category
+    return "other"
+
+
+def normalize_intent(last_intent: str) -> str:
+    """Map a stored intent to one of INTENT_LEVELS"""
+    value = str(last_intent or "unknown").lower()
+    return value if value in INTENT_LEVELS else "unknown"
+
+
+def normalize_booking_status(booking_status: str) -> str:
+    """Map a stored booking status to one of BOOKING_STATUSES"""
+    value = str(booking_status or "not_booked").lower()
+    return value if value in BOOKING_STATUSES else "not_booked"
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket that limits how many operations start per second
+
+    Usage:
+        limiter = AsyncRateLimiter(rate_per_second=5, burst=10)
+        await limiter.acquire()
+    """
+
+    def __init__(self, rate_per_second: float, burst: int = 1):
+        self.rate = rate_per_second
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        """Wait until a token is available, then take it"""
+        if self.rate <= 0:
+            return
+
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class LazySingleton:
+    """
+    Proxy that builds its target on first attribute access
+
+    Lets modules keep `service = LazySingleton(Service)` singletons that can be
+    imported freely without constructing clients or validating settings.
+
+    Usage:
+        main_agent = LazySingleton(MainSalesAgent)
+        main_agent.process_message(...)  # MainSalesAgent() is built here
+    """
+
+    __slots__ = ("_factory", "_instance", "_lock")
+
+    def __init__(self, factory):
+        object.__setattr__(self, "_factory", factory)
+        object.__setattr__(self, "_instance", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def get_instance(self):
+        """Build the target if needed and return it"""
+        instance = object.__getattribute__(self, "_instance")
+        if instance is None:
+            with object.__getattribute__(self, "_lock"):
+                instance = object.__getattribute__(self, "_instance")
+                if instance is None:
+                    instance = object.__getattribute__(self, "_factory")()
+                    object.__setattr__(self, "_instance", instance)
+        return instance
+
+    @property
+    def is_initialized(self) -> bool:
+        return object.__getattribute__(self, "_instance") is not None
+
+    def __getattr__(self, name):
+        return getattr(self.get_instance(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self.get_instance(), name, value)
@@ -0,0 +1,258 @@
+import atexit
+import json
+import logging
+import queue
+import random
+import sys
+import uuid
+import zlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+from langchain.callbacks.base import BaseCallbackHandler
+from app.config import settings
+
+ROOT_LOGGER = "app"
+REQUEST_ID_HEADER = "x-request-id"
+VERBOSE_HEADER = "x-agent-verbose"
+
+# LogRecord attributes that aren't structured fields
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "force"}
+
+# Correlation fields (request_id, session_id, tenant, verbose) of the task being run
+log_context: ContextVar[Dict[str, Any]] = ContextVar("log_context", default={})
+
+
+@contextmanager
+def bind_log_context(**fields):
+    """Add correlation fields to every record logged inside the block"""
+    token = log_context.set({**log_context.get(), **fields})
+    try:
+        yield
+    finally:
+        log_context.reset(token)
+
+
+def is_verbose() -> bool:
+    """Whether agent chain output is logged for the current request"""
+    return settings.agent_verbose or bool(log_context.get().get("verbose"))
+
+
+class ContextFilter(logging.Filter):
+    """
+    Stamps records with the correlation fields and samples chatty levels
+
+    Runs in the caller before the record is queued, where the request's
+    context is visible. WARNING and above, records logged with
+    `extra={"force": True}` and verbose requests are always kept; lower levels
+    are kept for `sample_rate` of sessions, chosen by a hash of the session id
+    so a sampled session is logged completely.
+    """
+
+    def __init__(self, sample_rate: float = 1.0):
+        super().__init__()
+        self.sample_rate = sample_rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        context = log_context.get()
+        for key, value in context.items():
+            if key != "verbose" and not hasattr(record, key):
+                setattr(record, key, value)
+
+        if (
+            self.sample_rate >= 1.0
+            or record.levelno >= logging.WARNING
+            or context.get("verbose")
+            or getattr(record, "force", False)
+        ):
+            return True
+        key = context.get("session_id") or context.get("request_id")
+        if key is None:
+            return random.random() < self.sample_rate
+        return zlib.crc32(str(key).encode()) % 10000 < self.sample_rate * 10000
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, msg, then the record's fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.utcfromtimestamp(record.created).isoformat(timespec="milliseconds") + "Z",
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage()
+        }
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_ATTRS)
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    """Readable single-line format for local development"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = " ".join(
+            f"{key}={value}" for key, value in vars(record).items()
+            if key not in _RECORD_ATTRS and key not in ("request_id", "session_id")
+        )
+        session = getattr(record, "session_id", None)
+        return (
+            f"{self.formatTime(record, '%H:%M:%S')} {record.levelname:<7} {record.name}"
+            f"{f' [{session}]' if session else ''} {record.getMessage()}{f'  {fields}' if fields else ''}"
+        )
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """QueueHandler that drops (and counts) records instead of waiting when the queue is full"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+_handler: Optional[NonBlockingQueueHandler] = None
+_listener: Optional[QueueListener] = None
+
+
+def setup_logging(stream=None) -> NonBlockingQueueHandler:
+    """
+    Route the "app" loggers through a bounded queue to a background writer thread
+
+    Logging calls only format the message and enqueue it, so a slow stdout
+    (a pipe, a log shipper) never stalls the event loop. Safe to call more
+    than once; later calls return the running handler.
+
+    Args:
+        stream: Where records are written (default: stdout)
+    """
+    global _handler, _listener
+    if _handler is not None:
+        return _handler
+
+    log_queue: queue.Queue = queue.Queue(maxsize=settings.log_queue_size)
+    output = logging.StreamHandler(stream or sys.stdout)
+    output.setFormatter(JsonFormatter() if settings.log_format == "json" else TextFormatter())
+
+    _handler = NonBlockingQueueHandler(log_queue)
+    _handler.addFilter(ContextFilter(settings.log_sample_rate))
+
+    root = logging.getLogger(ROOT_LOGGER)
+    root.handlers = [_handler]
+    root.setLevel(settings.log_level.upper())
+    root.propagate = False
+
+    _listener = QueueListener(log_queue, output)
+    _listener.start()
+    atexit.register(shutdown_logging)
+    return _handler
+
+
+def shutdown_logging() -> None:
+    """Write out queued records and stop the writer thread"""
+    global _handler, _listener
+    if _listener is not None:
+        _listener.stop()
+    _handler = _listener = None
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the "app" hierarchy (handlers are attached by setup_logging)"""
+    if name.startswith(f"{ROOT_LOGGER}."):
+        return logging.getLogger(name)
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def get_logging_stats() -> Dict:
+    return {
+        "level": settings.log_level.upper(),
+        "sample_rate": settings.log_sample_rate,
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0
+    }
+
+
+def _truncate(value: Any, limit: int = 500) -> str:
+    text = str(value)
+    return text if len(text) <= limit else f"{text[:limit]}… ({len(text)} chars)"
+
+
+class ChainLogHandler(BaseCallbackHandler):
+    """
+    LangChain callback that logs agent steps, tool results and LLM calls
+
+    Replaces AgentExecutor(verbose=True), which printed whole chains to
+    stdout on every turn; added to a turn's callbacks only when the request
+    is verbose (see is_verbose).
+    """
+
+    run_inline = True  # Log from the event loop, where the request context is set
+
+    def __init__(self):
+        self.logger = get_logger("agent.chain")
+
+    def on_agent_action(self, action, **kwargs) -> None:
+        self.logger.info("Agent action", extra={"tool": action.tool, "tool_input": _truncate(action.tool_input), "force": True})
+
+    def on_tool_end(self, output, **kwargs) -> None:
+        self.logger.info("Tool result", extra={"output": _truncate(output), "force": True})
+
+    def on_tool_error(self, error, **kwargs) -> None:
+        self.logger.warning("Tool error", extra={"error": str(error)})
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.logger.info("LLM call finished", extra={"token_usage": usage, "force": True})
+
+    def on_agent_finish(self, finish, **kwargs) -> None:
+        self.logger.info("Agent finished", extra={"output": _truncate(finish.return_values.get("output")), "force": True})
+
+
+def _is_admin(headers: Dict[bytes, bytes]) -> bool:
+    # Imported here: the profiler logs through this module
+    from app.services.profiler import check_admin_token, PROFILE_HEADER
+
+    value = headers.get(PROFILE_HEADER.encode())
+    return value is not None and check_admin_token(value.decode("latin-1"))
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware that gives each HTTP/WebSocket request a correlation id
+
+    The id comes from the X-Request-ID header (or is generated) and is echoed
+    on HTTP responses. An "X-Agent-Verbose: 1" header turns on chain logging
+    (which includes lead messages) for that request when
+    settings.allow_verbose_requests is set and the request also carries a
+    valid X-Profile-Token admin token.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers", ()))
+        request_id = headers.get(REQUEST_ID_HEADER.encode(), b"").decode("latin-1")[:64] or uuid.uuid4().hex[:16]
+        verbose = (
+            settings.allow_verbose_requests
+            and headers.get(VERBOSE_HEADER.encode(), b"").decode("latin-1").lower() in ("1", "true", "yes")
+            and _is_admin(headers)
+        )
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (REQUEST_ID_HEADER.encode(), request_id.encode())]}
+            await send(message)
+
+        with bind_log_context(request_id=request_id, verbose=verbose):
+            await self.app(scope, receive, send_with_request_id if scope["type"] == "http" else send)
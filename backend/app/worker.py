@@ -0,0 +1,334 @@
+"""
+Queue worker: runs agent turns from a durable queue instead of HTTP
+
+Usage:
+    python -m app.worker                                   # one process, every shard
+    python -m app.worker --processes 4                     # 4 processes splitting the shards
+    python -m app.worker --processes 4 --worker-index 1 --worker-count 3   # 2nd of 3 machines
+    python -m app.worker --backend sqlite                  # local SQLite stand-in for Redis
+
+A gateway adds each lead message to the inbound stream of its session's shard
+(see RedisStreamsQueue and shard_for), with fields session_id, message and
+optionally tenant and message_id. Every worker process is a consumer in the
+group of the shards it owns (shard % total processes == its index), so one
+session's messages always reach the same process in order. Within a process,
+messages of different sessions run concurrently (up to --concurrency) and a
+session's messages run one after another.
+
+For each message the reply is added to the outbound stream
+(session_id, tenant, message_id, status, response, intent_level,
+booking_made) and the message is acknowledged. A turn is never rerun by the
+worker, since its tools (bookings, memory updates) and usage may already have
+taken effect: a turn that fails gets the agent's apology reply (status
+"error") and the message is copied to the dead-letter stream. Only setting the
+turn up (building the tenant's agent) is retried, with backoff up to
+WORKER_MAX_ATTEMPTS times; if it still fails the message is left
+unacknowledged. Unacknowledged messages (also those of a process that died)
+are picked up by their shard's new owner after WORKER_CLAIM_IDLE_SECONDS (by
+the same process index at once on restart), and a message delivered more
+than WORKER_MAX_DELIVERIES times is dead-lettered instead of run again.
+
+Delivery is at least once: a worker that dies after a turn but before the
+acknowledgment runs that turn again once the message is reclaimed.
+
+Each process keeps its own memory WAL (MEMORY_WAL_PATH with ".worker-<index>"
+before the suffix, see MemoryWAL). A restarted process with the same index
+replays its predecessor's file; files of indexes no longer running are taken
+over by the next process that starts.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import signal
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.config import settings
+from app.agents.main_agent import tenant_agents, MainSalesAgent
+from app.services.knowledge_base import gym_knowledge
+from app.services.memory_wal import memory_wal
+from app.services.message_queue import QueueMessage, create_queue, QUEUE_BACKENDS
+from app.services.mongodb_service import mongodb_service
+from app.services.tenants import tenant_registry, use_tenant, UnknownTenantError
+from app.services.transcript_store import transcript_store
+from app.utils.logger import get_logger, bind_log_context, setup_logging, shutdown_logging
+
+logger = get_logger(__name__)
+
+STATUS_OK = "ok"
+STATUS_ERROR = "error"
+
+
+class QueueWorker:
+    """
+    Consumes the inbound streams of some shards and runs each message as a turn
+
+    Messages are read while fewer than `max_inflight` are unfinished. Each
+    one becomes a task chained after the previous unfinished message of the
+    same session, and at most `concurrency` turns run at once.
+    """
+
+    def __init__(
+        self,
+        queue,
+        consumer: str,
+        shards: List[int],
+        concurrency: int,
+        max_inflight: int,
+        block_ms: int,
+        max_attempts: int,
+        retry_backoff: float,
+        max_deliveries: int,
+        claim_idle_seconds: int
+    ):
+        self.queue = queue
+        self.consumer = consumer
+        self.shards = shards
+        self.slots = asyncio.Semaphore(concurrency)
+        self.max_inflight = max(1, max_inflight)
+        self.block_ms = block_ms
+        self.max_attempts = max(1, max_attempts)
+        self.retry_backoff = retry_backoff
+        self.max_deliveries = max_deliveries
+        self.claim_idle_seconds = claim_idle_seconds
+
+        self.inflight: Dict[Tuple[str, str], asyncio.Task] = {}  # (stream, entry id) -> task
+        self.session_tails: Dict[str, asyncio.Task] = {}  # session id -> its last queued task
+        self.stopping = asyncio.Event()
+        self.processed = 0
+        self.failed = 0
+        self.dead_lettered = 0
+
+    def stop(self):
+        """Stop reading; run() returns once in-flight turns are done"""
+        self.stopping.set()
+
+    async def run(self):
+        await self.queue.setup(self.shards)
+        # This consumer's messages left unacknowledged by a previous run come first
+        self._dispatch_all(await self.queue.claim(self.consumer, self.shards, idle_ms=0, owner=self.consumer))
+        next_claim = time.monotonic() + self.claim_idle_seconds
+        logger.info("Worker started", extra={"consumer": self.consumer, "shards": self.shards})
+
+        while not self.stopping.is_set():
+            if len(self.inflight) >= self.max_inflight:
+                await asyncio.wait(list(self.inflight.values()), return_when=asyncio.FIRST_COMPLETED)
+                continue
+            try:
+                if time.monotonic() >= next_claim:
+                    next_claim = time.monotonic() + self.claim_idle_seconds
+                    self._dispatch_all(await self.queue.claim(
+                        self.consumer, self.shards, idle_ms=self.claim_idle_seconds * 1000, skip=set(self.inflight)
+                    ))
+                messages = await self.queue.read(
+                    self.consumer, self.shards, count=self.max_inflight - len(self.inflight), block_ms=self.block_ms
+                )
+            except Exception as e:
+                logger.warning("Queue read failed", extra={"error": str(e)})
+                await asyncio.sleep(1)
+                continue
+            self._dispatch_all(messages)
+
+        if self.inflight:
+            await asyncio.wait(list(self.inflight.values()))
+        logger.info("Worker stopped", extra={"consumer": self.consumer, **self.get_stats()})
+
+    def _dispatch_all(self, messages: List[QueueMessage]):
+        for message in messages:
+            if (message.stream, message.entry_id) not in self.inflight:
+                self._dispatch(message)
+
+    def _dispatch(self, message: QueueMessage):
+        session_id = message.fields.get("session_id", "")
+        task = asyncio.create_task(self._run_in_order(self.session_tails.get(session_id), message))
+        key = (message.stream, message.entry_id)
+        self.inflight[key] = task
+        self.session_tails[session_id] = task
+
+        def finished(done: asyncio.Task):
+            self.inflight.pop(key, None)
+            if self.session_tails.get(session_id) is done:
+                del self.session_tails[session_id]
+
+        task.add_done_callback(finished)
+
+    async def _run_in_order(self, previous: Optional[asyncio.Task], message: QueueMessage):
+        if previous is not None:
+            await asyncio.wait([previous])
+        async with self.slots:
+            with bind_log_context(queue_entry=message.entry_id):
+                try:
+                    await self.handle(message)
+                except Exception:
+                    # Left unacknowledged: reclaimed after claim_idle_seconds
+                    logger.exception("Queue message failed")
+
+    async def handle(self, message: QueueMessage):
+        """Run one message's turn, publish the reply and acknowledge it"""
+        fields = message.fields
+        session_id, text = fields.get("session_id"), fields.get("message")
+        if not session_id or not text:
+            await self._dead_letter(message, "missing session_id or message")
+            return
+        if message.deliveries > self.max_deliveries:
+            await self._dead_letter(message, f"delivered {message.deliveries} times")
+            return
+        try:
+            tenant = tenant_registry.get(fields.get("tenant"))
+        except UnknownTenantError:
+            await self._dead_letter(message, f"unknown tenant {fields.get('tenant')!r}")
+            return
+
+        with use_tenant(tenant):
+            agent = await self._get_agent()
+            # Run once: a failed turn may already have booked, saved memory or recorded usage
+            result = await agent.process_message(user_message=text, session_id=session_id)
+
+        await self.queue.publish_outbound({
+            "session_id": session_id,
+            "tenant": tenant.tenant_id,
+            "message_id": fields.get("message_id", ""),
+            "status": STATUS_ERROR if result.get("error") else STATUS_OK,
+            "response": result["response"],
+            "intent_level": result.get("intent_level") or "unknown",
+            "booking_made": "true" if result.get("booking_made") else "false"
+        })
+        if result.get("error"):
+            self.failed += 1
+            await self._dead_letter(message, result["error"])
+            return
+        await self.queue.ack(message)
+        self.processed += 1
+
+    async def _get_agent(self) -> MainSalesAgent:
+        """
+        The current tenant's agent, retried with backoff
+
+        Nothing has run for the message yet, so retrying is safe. Raises after
+        max_attempts, leaving the message unacknowledged for reclaiming.
+        """
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                return tenant_agents.get()
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    raise
+                logger.warning("Agent setup failed, retrying", extra={"attempt": attempt, "error": str(e) or type(e).__name__})
+                await asyncio.sleep(self.retry_backoff * 2 ** (attempt - 1))
+
+    async def _dead_letter(self, message: QueueMessage, reason: str):
+        await self.queue.dead_letter(message, reason)
+        await self.queue.ack(message)
+        self.dead_lettered += 1
+        logger.warning("Message dead-lettered", extra={"reason": reason, "deliveries": message.deliveries})
+
+    def get_stats(self) -> Dict:
+        return {
+            "inflight": len(self.inflight),
+            "processed": self.processed,
+            "failed": self.failed,
+            "dead_lettered": self.dead_lettered
+        }
+
+
+async def replay_memory_wal():
+    """Drain memory writes queued in the WAL once MongoDB accepts them again"""
+    while True:
+        await mongodb_service.replay_wal()
+        await asyncio.sleep(settings.memory_wal_replay_seconds)
+
+
+async def serve(index: int, shards: List[int], backend: str):
+    """One worker process: the app's services, then the consumer loop until SIGTERM/SIGINT"""
+    setup_logging()
+    queue = create_queue(backend)
+    worker = QueueWorker(
+        queue,
+        consumer=f"worker-{index}",
+        shards=shards,
+        concurrency=settings.worker_concurrency,
+        max_inflight=settings.worker_max_inflight,
+        block_ms=settings.worker_block_ms,
+        max_attempts=settings.worker_max_attempts,
+        retry_backoff=settings.worker_retry_backoff_seconds,
+        max_deliveries=settings.worker_max_deliveries,
+        claim_idle_seconds=settings.worker_claim_idle_seconds
+    )
+    # Installed first so a stop during startup is graceful too
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+
+    if settings.memory_wal_enabled:
+        memory_wal.owner = f"worker-{index}"  # Same file after a restart with the same index
+        memory_wal.load()
+    gym_knowledge.reload_all()
+    await mongodb_service.connect()
+    await queue.connect()
+
+    background_tasks = []
+    if settings.gym_info_reload_seconds > 0:
+        background_tasks.append(asyncio.create_task(gym_knowledge.watch()))
+    if settings.memory_wal_enabled:
+        background_tasks.append(asyncio.create_task(replay_memory_wal()))
+    if settings.transcripts_enabled:
+        background_tasks.append(asyncio.create_task(transcript_store.run()))
+
+    try:
+        await worker.run()
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        if settings.transcripts_enabled:
+            await transcript_store.flush_all()
+        await queue.close()
+        await mongodb_service.disconnect()
+        if settings.memory_wal_enabled:
+            memory_wal.close()
+        shutdown_logging()
+
+
+def run_process(index: int, total: int, backend: str):
+    shards = [shard for shard in range(settings.worker_shards) if shard % total == index]
+    asyncio.run(serve(index, shards, backend))
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run agent turns from the inbound message queue")
+    parser.add_argument("--processes", type=int, default=1, help="Worker processes on this machine")
+    parser.add_argument("--worker-index", type=int, default=0, help="This machine's index among --worker-count")
+    parser.add_argument("--worker-count", type=int, default=1, help="Machines running workers")
+    parser.add_argument("--backend", choices=QUEUE_BACKENDS, default=None, help="Default: WORKER_QUEUE_BACKEND")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    backend = args.backend or settings.worker_queue_backend
+    total = args.worker_count * args.processes
+    if total > settings.worker_shards:
+        sys.exit(f"{total} worker processes but only {settings.worker_shards} shards; raise WORKER_SHARDS")
+    indexes = [args.worker_index * args.processes + p for p in range(args.processes)]
+
+    if args.processes == 1:
+        run_process(indexes[0], total, backend)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=run_process, args=(index, total, backend), name=f"worker-{index}")
+        for index in indexes
+    ]
+    for process in processes:
+        process.start()
+    # Children stop gracefully on SIGTERM; Ctrl+C reaches them directly
+    signal.signal(signal.SIGTERM, lambda *_: [process.terminate() for process in processes])
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+    sys.exit(1 if any(process.exitcode for process in processes) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""
+Load benchmark: latency of admitted requests with and without admission control
+
+Run from the backend directory:
+    python -m benchmarks.admission_load --rate 30 --duration 20
+    python -m benchmarks.admission_load --rate 20 --priorities
+    python -m benchmarks.admission_load --rate 12 --logging
+
+Simulates an LLM backend that can serve `--capacity` runs at once with
+`--service` seconds per run (anything beyond waits for the backend). Requests
+arrive open-loop (Poisson) at `--rate` per second, so rates above
+capacity / service overload it. The same arrival trace is replayed with
+admission control off and on; the real AdmissionController is used.
+
+--priorities tags each arrival high/medium/low (--mix) and replays the trace
+through a FIFO queue and through the priority scheduler, reporting latency
+and shed rate per priority. Pick a rate where the FIFO queue is saturated but
+not shedding everything, e.g. 1.2-2x capacity.
+
+--logging measures logging overhead: each request emits the records a real
+turn logs (--log-lines), with no logging, with print() (what the agent used
+to do) and with the queued structured logger, all writing to the same sink.
+--sink-delay-ms makes every write to the sink slow, like a stdout pipe whose
+reader (a log shipper) is falling behind. Reports request latency and event
+loop lag (how late a 10 ms timer fires).
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from benchmarks.startup import DUMMY_ENV
+
+for name, value in DUMMY_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.services.admission import AdmissionController, AdmissionRejected, PRIORITY_NAMES  # noqa: E402
+from app.utils.logger import bind_log_context, get_logger, get_logging_stats, setup_logging, shutdown_logging  # noqa: E402
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+async def run_trace(
+    arrivals: List[Tuple[float, int]],
+    controller: AdmissionController,
+    args,
+    emit: Optional[Callable[[int, str], None]] = None
+) -> Dict:
+    backend = asyncio.Semaphore(args.capacity)
+    rng = random.Random(1)
+    latencies: Dict[int, List[float]] = {priority: [] for priority in PRIORITY_NAMES}
+    shed: Dict[int, List[float]] = {priority: [] for priority in PRIORITY_NAMES}
+
+    async def llm_run():
+        async with backend:
+            await asyncio.sleep(rng.uniform(0.5, 1.5) * args.service)
+
+    async def request(i: int, at: float, priority: int):
+        await asyncio.sleep(at)
+        started = time.perf_counter()
+        try:
+            async with controller.admit(priority):
+                if emit:
+                    emit(i, "start")
+                await llm_run()
+                if emit:
+                    emit(i, "finish")
+            latencies[priority].append(time.perf_counter() - started)
+        except AdmissionRejected:
+            shed[priority].append(time.perf_counter() - started)
+
+    await asyncio.gather(*(request(i, at, priority) for i, (at, priority) in enumerate(arrivals)))
+    return {"latencies": latencies, "shed": shed}
+
+
+def merged(by_priority: Dict[int, List[float]]) -> List[float]:
+    return [value for values in by_priority.values() for value in values]
+
+
+def report(label: str, result: Dict, total: int) -> None:
+    latencies, shed = merged(result["latencies"]), merged(result["shed"])
+    print(
+        f"{label:<16}{len(latencies):>10}{len(shed):>8}{len(shed) / total:>8.0%}"
+        f"{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.95):>10.2f}{percentile(latencies, 0.99):>10.2f}"
+        f"{percentile(shed, 0.99) * 1000:>14.1f}"
+    )
+
+
+def report_priorities(label: str, result: Dict) -> None:
+    for priority, name in PRIORITY_NAMES.items():
+        latencies, shed = result["latencies"][priority], result["shed"][priority]
+        total = len(latencies) + len(shed)
+        print(
+            f"{label:<12}{name:<8}{total:>8}{len(shed) / max(total, 1):>8.0%}"
+            f"{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.95):>10.2f}{percentile(latencies, 0.99):>10.2f}"
+        )
+
+
+def parse_mix(mix: str) -> List[float]:
+    """"high:0.2,medium:0.3,low:0.5" -> weights indexed by priority"""
+    names = {name: priority for priority, name in PRIORITY_NAMES.items()}
+    weights = [0.0] * len(PRIORITY_NAMES)
+    for part in mix.split(","):
+        name, weight = part.split(":")
+        weights[names[name.strip()]] = float(weight)
+    return weights
+
+
+class SlowSink:
+    """File sink whose every write takes delay_ms (a backed-up stdout pipe)"""
+
+    def __init__(self, path: str, delay_ms: float):
+        self.file = open(path, "a", encoding="utf-8")
+        self.delay = delay_ms / 1000
+        self.writes = 0
+
+    def write(self, text: str) -> int:
+        if self.delay:
+            time.sleep(self.delay)
+        self.writes += 1
+        return self.file.write(text)
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+def make_emitter(mode: str, sink: SlowSink, lines: int) -> Optional[Callable[[int, str], None]]:
+    """Per-request log calls: half of --log-lines when a turn starts, half when it finishes"""
+    if mode == "none":
+        return None
+
+    if mode == "print":
+        def emit(i: int, phase: str) -> None:
+            for n in range(lines // 2):
+                print(f"[MAIN AGENT] Session: bench-{i} {phase} line {n}", file=sink, flush=True)
+        return emit
+
+    setup_logging(sink)
+    logger = get_logger("benchmarks.admission_load")
+
+    def emit(i: int, phase: str) -> None:
+        with bind_log_context(session_id=f"bench-{i}", request_id=f"req-{i}"):
+            for n in range(lines // 2):
+                logger.info("Turn event", extra={"phase": phase, "line": n})
+    return emit
+
+
+async def measure_loop_lag(lags: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(0.01)
+        lags.append(time.perf_counter() - started - 0.01)
+
+
+async def compare_logging(arrivals: List[Tuple[float, int]], args) -> None:
+    print(f"{args.log_lines} log records per request, sink write delay {args.sink_delay_ms} ms\n")
+    print(f"{'':<10}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}{'lag p99 ms':>12}{'lag max ms':>12}{'writes':>9}{'dropped':>9}")
+    for mode in ("none", "print", "queued"):
+        fd, path = tempfile.mkstemp(suffix=".log")
+        os.close(fd)
+        sink = SlowSink(path, args.sink_delay_ms)
+        emit = make_emitter(mode, sink, args.log_lines)
+
+        lags: List[float] = []
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(measure_loop_lag(lags, stop))
+        controller = AdmissionController(args.capacity, args.queue, args.timeout)
+        result = await run_trace(arrivals, controller, args, emit)
+        stop.set()
+        await monitor
+
+        dropped = 0
+        if mode == "queued":
+            dropped = get_logging_stats()["dropped"]
+            shutdown_logging()  # Waits for the writer thread to drain the queue
+        sink.file.close()
+        os.unlink(path)
+
+        latencies = merged(result["latencies"])
+        print(
+            f"{mode:<10}{percentile(latencies, 0.5):>10.2f}{percentile(latencies, 0.95):>10.2f}"
+            f"{percentile(latencies, 0.99):>10.2f}{percentile(lags, 0.99) * 1000:>12.1f}{max(lags) * 1000:>12.1f}"
+            f"{sink.writes:>9}{dropped:>9}"
+        )
+
+
+async def main_async(args) -> None:
+    rng = random.Random(args.seed)
+    weights = parse_mix(args.mix)
+    arrivals, at = [], 0.0
+    while at < args.duration:
+        at += rng.expovariate(args.rate)
+        arrivals.append((at, rng.choices(list(PRIORITY_NAMES), weights)[0]))
+
+    capacity_rps = args.capacity / args.service
+    print(f"{len(arrivals)} requests over {args.duration}s at {args.rate}/s "
+          f"(backend capacity ~{capacity_rps:.1f}/s, load {args.rate / capacity_rps:.1f}x)\n")
+
+    if args.logging:
+        await compare_logging(arrivals, args)
+        return
+
+    if args.priorities:
+        print(f"{'':<12}{'class':<8}{'reqs':>8}{'shed%':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}")
+        fifo = AdmissionController(args.capacity, args.queue, args.timeout, prioritize=False)
+        report_priorities("fifo", await run_trace(arrivals, fifo, args))
+        ranked = AdmissionController(
+            args.capacity, args.queue, args.timeout, aging_seconds=args.aging
+        )
+        report_priorities("priority", await run_trace(arrivals, ranked, args))
+        return
+
+    print(f"{'':<16}{'admitted':>10}{'shed':>8}{'shed%':>8}{'p50 s':>10}{'p95 s':>10}{'p99 s':>10}{'shed p99 ms':>14}")
+
+    off = AdmissionController(args.capacity, args.queue, args.timeout, enabled=False)
+    report("admission off", await run_trace(arrivals, off, args), len(arrivals))
+
+    on = AdmissionController(args.capacity, args.queue, args.timeout)
+    report("admission on", await run_trace(arrivals, on, args), len(arrivals))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Admission control load benchmark")
+    parser.add_argument("--rate", type=float, default=30.0, help="Arrivals per second")
+    parser.add_argument("--duration", type=float, default=20.0, help="Seconds of arrivals")
+    parser.add_argument("--capacity", type=int, default=8, help="Concurrent LLM runs the backend serves")
+    parser.add_argument("--service", type=float, default=0.5, help="Mean seconds per run")
+    parser.add_argument("--queue", type=int, default=32, help="Admission queue size")
+    parser.add_argument("--timeout", type=float, default=2.0, help="Admission queue deadline (s)")
+    parser.add_argument("--priorities", action="store_true", help="Compare FIFO and priority scheduling")
+    parser.add_argument("--mix", default="high:0.2,medium:0.3,low:0.5", help="Share of arrivals per priority")
+    parser.add_argument("--aging", type=float, default=3.0, help="Priority head start per class (s)")
+    parser.add_argument("--logging", action="store_true", help="Compare no logging, print() and the queued logger")
+    parser.add_argument("--log-lines", type=int, default=8, help="Log records per request")
+    parser.add_argument("--sink-delay-ms", type=float, default=1.0, help="Time each write to the log sink takes")
+    parser.add_argument("--seed", type=int, default=7)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Agent engine comparison: LLM iterations and latency per turn on the replay corpus
+
+Run from the backend directory (needs the real .env - this calls OpenAI,
+Calendly and MongoDB):
+    python -m benchmarks.agent_engines
+    python -m benchmarks.agent_engines --corpus my_transcripts.jsonl --engines parallel_tools
+
+The corpus uses the backfill JSONL format; only the lead's messages are
+replayed, in order, one conversation at a time. Each engine gets its own
+"bench-<engine>-<session_id>" sessions, whose memories are deleted afterwards
+unless --keep is given.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from pathlib import Path
+from typing import Dict, List
+
+from app.agents.main_agent import MainSalesAgent
+from app.jobs.backfill_transcripts import iter_jsonl_transcripts
+from app.services.mongodb_service import mongodb_service
+
+DEFAULT_CORPUS = Path(__file__).parent / "replay_corpus.jsonl"
+ENGINES = ("functions", "parallel_tools")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+async def replay(engine: str, corpus: Path, limit: int, keep: bool) -> Dict:
+    """Replay the corpus through one engine and collect per-turn measurements"""
+    agent = MainSalesAgent(engine=engine)
+    turns = []
+    sessions = []
+
+    for i, transcript in enumerate(iter_jsonl_transcripts(corpus)):
+        if limit and i >= limit:
+            break
+        session_id = f"bench-{engine}-{transcript.session_id}"
+        sessions.append(session_id)
+
+        for role, text in transcript.messages:
+            if role != "user":
+                continue
+            started = time.perf_counter()
+            result = await agent.process_message(text, session_id)
+            turns.append({
+                "latency": time.perf_counter() - started,
+                "iterations": result.get("iterations", 0),
+                "error": bool(result.get("error"))
+            })
+        print(f"[BENCH] {engine}: {transcript.session_id} done ({len(turns)} turns so far)")
+
+    if not keep:
+        for session_id in sessions:
+            await mongodb_service.delete_memory(session_id)
+
+    return {"engine": engine, "turns": turns}
+
+
+def summarize(result: Dict) -> Dict:
+    turns = [t for t in result["turns"] if not t["error"]]
+    latencies = [t["latency"] for t in turns] or [0.0]
+    iterations = [t["iterations"] for t in turns] or [0]
+    return {
+        "turns": len(result["turns"]),
+        "errors": len(result["turns"]) - len(turns),
+        "iterations_mean": statistics.mean(iterations),
+        "iterations_max": max(iterations),
+        "latency_p50": percentile(latencies, 0.5),
+        "latency_p95": percentile(latencies, 0.95),
+        "latency_mean": statistics.mean(latencies)
+    }
+
+
+async def run(args) -> None:
+    await mongodb_service.connect()
+    try:
+        summaries = {}
+        for engine in args.engines:
+            summaries[engine] = summarize(await replay(engine, Path(args.corpus), args.limit, args.keep))
+    finally:
+        await mongodb_service.disconnect()
+
+    rows = [
+        ("turns", "turns", "{:.0f}"),
+        ("errors", "errors", "{:.0f}"),
+        ("LLM iterations / turn", "iterations_mean", "{:.2f}"),
+        ("max iterations", "iterations_max", "{:.0f}"),
+        ("latency p50 (s)", "latency_p50", "{:.2f}"),
+        ("latency p95 (s)", "latency_p95", "{:.2f}"),
+        ("latency mean (s)", "latency_mean", "{:.2f}")
+    ]
+    print(f"\n{'':<24}" + "".join(f"{engine:>16}" for engine in summaries))
+    for label, key, fmt in rows:
+        print(f"{label:<24}" + "".join(f"{fmt.format(s[key]):>16}" for s in summaries.values()))
+
+    if set(ENGINES) <= set(summaries):
+        base, new = summaries["functions"], summaries["parallel_tools"]
+        if base["latency_mean"] and base["iterations_mean"]:
+            print(
+                f"\nparallel_tools vs functions: "
+                f"{new['iterations_mean'] / base['iterations_mean'] - 1:+.0%} iterations, "
+                f"{new['latency_mean'] / base['latency_mean'] - 1:+.0%} mean latency"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare agent engines on the replay corpus")
+    parser.add_argument("--corpus", default=str(DEFAULT_CORPUS), help="Transcript JSONL to replay")
+    parser.add_argument("--engines", nargs="+", default=list(ENGINES), choices=ENGINES)
+    parser.add_argument("--limit", type=int, default=0, help="Only replay the first N conversations")
+    parser.add_argument("--keep", action="store_true", help="Keep the benchmark sessions' memories")
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+"""
+Gym details retrieval report: retrieval quality and prompt tokens saved per turn
+
+Run from the backend directory:
+    python -m benchmarks.gym_retrieval
+    python -m benchmarks.gym_retrieval --top-k 3 --min-score 1.0 --turns
+    python -m benchmarks.gym_retrieval --sweep
+
+Replays the lead messages of the replay corpus (backfill JSONL format)
+through the retrieval the agent runs each turn (latest message, previous
+message as context) over the BM25 index of the gym data file. Nothing is sent
+to OpenAI.
+
+Quality is scored against benchmarks/retrieval_labels.json, which lists per
+session and lead turn the facts the turn needs: a list of groups, each
+satisfied when any of its chunk ids is retrieved (an empty list means the turn
+needs no gym facts, e.g. "hi" or a booking with details). Tokens are counted
+with tiktoken when its encoding is available, otherwise estimated as
+characters / 4 like the model router does.
+"""
+import argparse
+import json
+import os
+import statistics
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+from benchmarks.startup import DUMMY_ENV
+
+for name, value in DUMMY_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.config import settings  # noqa: E402
+from app.agents.prompts import build_main_agent_system_prompt, retrieve_gym_details  # noqa: E402
+from app.jobs.backfill_transcripts import iter_jsonl_transcripts  # noqa: E402
+from app.services.knowledge_base import gym_knowledge  # noqa: E402
+from app.services.tenants import tenant_registry  # noqa: E402
+
+BENCH_DIR = Path(__file__).parent
+DEFAULT_CORPUS = BENCH_DIR / "replay_corpus.jsonl"
+DEFAULT_LABELS = BENCH_DIR / "retrieval_labels.json"
+
+
+def get_token_counter() -> Tuple[Callable[[str], int], str]:
+    """Token counter for the agent's model, and how it counts"""
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(settings.router_default_model)
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        return (lambda text: len(encoding.encode(text))), f"tiktoken {encoding.name}"
+    except Exception:
+        return (lambda text: len(text) // 4), "estimated (chars / 4)"
+
+
+def load_turns(corpus: Path, labels_path: Path) -> List[Dict]:
+    """Lead turns with the agent's retrieval context and labeled needs"""
+    labels = json.loads(labels_path.read_text(encoding="utf-8"))
+    turns = []
+    for transcript in iter_jsonl_transcripts(corpus):
+        session_labels = labels.get(transcript.session_id)
+        if session_labels is None:
+            continue
+        previous = None
+        user_messages = [text for role, text in transcript.messages if role == "user"]
+        for i, text in enumerate(user_messages):
+            turns.append({
+                "session_id": transcript.session_id,
+                "message": text,
+                "context": previous or "",
+                "needs": session_labels[i] if i < len(session_labels) else []
+            })
+            previous = text
+    return turns
+
+
+def evaluate(turns: List[Dict], count_tokens: Callable[[str], int], top_k: int, min_score: float) -> Dict:
+    settings.gym_retrieval_top_k = top_k
+    settings.gym_retrieval_min_score = min_score
+    tenant = tenant_registry.default
+    template = build_main_agent_system_prompt(tenant)
+    full_details = gym_knowledge.snapshot(tenant).derived("gym_details_prompt", tenant)
+    full_tokens = count_tokens(template.replace("{gym_details}", full_details))
+
+    groups = satisfied = covered_turns = informational = 0
+    small_talk_chunks = []
+    prompt_tokens = []
+    details_tokens = []
+    for turn in turns:
+        gym_details, chunk_ids = retrieve_gym_details(turn["message"], turn["context"], tenant)
+        turn["retrieved"] = chunk_ids
+        turn["tokens"] = count_tokens(template.replace("{gym_details}", gym_details))
+        prompt_tokens.append(turn["tokens"])
+        details_tokens.append(count_tokens(gym_details))
+
+        needs = turn["needs"]
+        turn["met"] = sum(1 for group in needs if set(group) & set(chunk_ids))
+        if needs:
+            informational += 1
+            groups += len(needs)
+            satisfied += turn["met"]
+            covered_turns += turn["met"] == len(needs)
+        else:
+            small_talk_chunks.append(len(chunk_ids))
+
+    return {
+        "top_k": top_k,
+        "min_score": min_score,
+        "turns": len(turns),
+        "informational_turns": informational,
+        "need_recall": satisfied / groups if groups else 1.0,
+        "turns_covered": covered_turns / informational if informational else 1.0,
+        "small_talk_empty": small_talk_chunks.count(0) / len(small_talk_chunks) if small_talk_chunks else 1.0,
+        "small_talk_chunks": statistics.mean(small_talk_chunks) if small_talk_chunks else 0.0,
+        "full_tokens": full_tokens,
+        "mean_tokens": statistics.mean(prompt_tokens),
+        "max_tokens": max(prompt_tokens),
+        "full_details_tokens": count_tokens(full_details),
+        "mean_details_tokens": statistics.mean(details_tokens)
+    }
+
+
+def print_report(result: Dict, method: str) -> None:
+    saved = 1 - result["mean_tokens"] / result["full_tokens"]
+    print(f"{result['turns']} lead turns ({result['informational_turns']} needing gym facts), "
+          f"top_k={result['top_k']}, min_score={result['min_score']}; tokens: {method}\n")
+    print("Retrieval quality")
+    print(f"  needs met (recall)            {result['need_recall']:>7.0%}")
+    print(f"  turns with every need met     {result['turns_covered']:>7.0%}")
+    print(f"  no-fact turns given no facts  {result['small_talk_empty']:>7.0%}  "
+          f"(avg {result['small_talk_chunks']:.1f} chunks)")
+    details_saved = 1 - result["mean_details_tokens"] / result["full_details_tokens"]
+    print("\nTokens per turn                   full  retrieved   saved")
+    print(f"  GYM DETAILS section        {result['full_details_tokens']:>7}{result['mean_details_tokens']:>11.0f}{details_saved:>8.0%}")
+    print(f"  whole system prompt        {result['full_tokens']:>7}{result['mean_tokens']:>11.0f}{saved:>8.0%}"
+          f"   (max {result['max_tokens']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gym details retrieval quality and token savings")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--labels", type=Path, default=DEFAULT_LABELS)
+    parser.add_argument("--top-k", type=int, default=settings.gym_retrieval_top_k)
+    parser.add_argument("--min-score", type=float, default=settings.gym_retrieval_min_score)
+    parser.add_argument("--turns", action="store_true", help="Print every turn's retrieved chunks")
+    parser.add_argument("--sweep", action="store_true", help="Compare several top_k / min_score settings")
+    args = parser.parse_args()
+
+    count_tokens, method = get_token_counter()
+    turns = load_turns(args.corpus, args.labels)
+
+    if args.sweep:
+        print(f"{'top_k':>6}{'min_score':>11}{'recall':>9}{'covered':>9}{'quiet':>8}{'details tok':>13}{'prompt tok':>12}{'saved':>8}")
+        for top_k in (2, 3, 4, 6):
+            for min_score in (0.0, 1.0, 1.5, 2.5):
+                r = evaluate(turns, count_tokens, top_k, min_score)
+                print(f"{top_k:>6}{min_score:>11}{r['need_recall']:>9.0%}{r['turns_covered']:>9.0%}"
+                      f"{r['small_talk_empty']:>8.0%}{r['mean_details_tokens']:>13.0f}{r['mean_tokens']:>12.0f}"
+                      f"{1 - r['mean_tokens'] / r['full_tokens']:>8.0%}")
+        print(f"\ntokens: {method}; full GYM DETAILS: {r['full_details_tokens']}, full prompt: {r['full_tokens']}")
+        return
+
+    result = evaluate(turns, count_tokens, args.top_k, args.min_score)
+    if args.turns:
+        for turn in turns:
+            status = f"{turn['met']}/{len(turn['needs'])}" if turn["needs"] else "-"
+            print(f"{turn['session_id']}  {status:>4}  {turn['tokens']:>5} tok  {turn['message'][:60]!r}")
+            print(f"{'':>22}{', '.join(turn['retrieved']) or '(none)'}")
+        print()
+    print_report(result, method)
+
+
+if __name__ == "__main__":
+    main()
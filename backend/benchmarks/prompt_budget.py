@@ -0,0 +1,186 @@
+"""
+Prompt token budgets: tokens of every prompt the app sends, checked against budgets
+
+Run from the backend directory:
+    python -m benchmarks.prompt_budget
+    python -m benchmarks.prompt_budget --update-baseline
+
+Renders each model call with the components' own templates (the main agent's
+prompt and tool schemas, IntentClassifierAgent.build_messages,
+MemoryManagerAgent.build_messages) for every lead turn of the replay corpus,
+once per lead state in benchmarks/prompt_corpus.json (no memory, an all-Unknown
+profile, a partial one and a fully qualified lead). Nothing is sent to OpenAI.
+
+The largest rendering of each prompt is checked against
+benchmarks/prompt_budgets.json and the run exits with status 1 when a budget
+is exceeded, so it can gate CI. Budgets are kept per tokenizer (the
+"tokens:" line of the report); a run whose tokenizer has no budgets fails
+rather than passing unchecked. Changes are reported against
+benchmarks/prompt_baseline.json; rerun with --update-baseline and commit it
+together with an intended prompt change.
+
+Tokens are counted with tiktoken when its encoding is available locally,
+otherwise estimated as characters / 4 (see benchmarks.gym_retrieval). The
+two differ by 10-20%, so neither budgets nor a baseline counted the other way
+are applied. Counts are close to, not
+exactly, what OpenAI bills: each chat message adds MESSAGE_OVERHEAD tokens and
+tool schemas are counted as their JSON.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+from collections import defaultdict
+from pathlib import Path
+from typing import Callable, Dict, List
+
+from benchmarks.startup import DUMMY_ENV
+
+for name, value in DUMMY_ENV.items():
+    os.environ.setdefault(name, value)
+
+from langchain.tools.render import format_tool_to_openai_function  # noqa: E402
+from app.agents.main_agent import MainSalesAgent, format_memory_context  # noqa: E402
+from app.agents.memory_manager import MemoryManagerAgent  # noqa: E402
+from app.agents.session_record import SessionRecord, ROLE_USER  # noqa: E402
+from app.jobs.backfill_transcripts import iter_jsonl_transcripts  # noqa: E402
+from app.services.tenants import tenant_registry  # noqa: E402
+from app.tools.intent_classifier_tool import IntentClassifierAgent  # noqa: E402
+from benchmarks.gym_retrieval import get_token_counter  # noqa: E402
+
+BENCH_DIR = Path(__file__).parent
+DEFAULT_CORPUS = BENCH_DIR / "replay_corpus.jsonl"
+DEFAULT_STATES = BENCH_DIR / "prompt_corpus.json"
+DEFAULT_BUDGETS = BENCH_DIR / "prompt_budgets.json"
+DEFAULT_BASELINE = BENCH_DIR / "prompt_baseline.json"
+
+MESSAGE_OVERHEAD = 4  # Role and separator tokens per chat message
+SESSION_ID = "bench-prompt-budget"
+
+
+def count_messages(messages: list, count_tokens: Callable[[str], int]) -> int:
+    return sum(count_tokens(message.content) + MESSAGE_OVERHEAD for message in messages)
+
+
+def measure(corpus: Path, states_path: Path, count_tokens: Callable[[str], int]) -> Dict[str, List[int]]:
+    """Token count of every rendering of every prompt, by prompt name"""
+    states = json.loads(states_path.read_text(encoding="utf-8"))
+    agent_reply = states["agent_reply"]
+    agent = MainSalesAgent(tenant=tenant_registry.default)
+    classifier = IntentClassifierAgent()
+    memory_manager = MemoryManagerAgent()
+
+    samples: Dict[str, List[int]] = defaultdict(list)
+    tools_tokens = 0
+    for tool in agent.tools:
+        tokens = count_tokens(json.dumps(format_tool_to_openai_function(tool)))
+        samples[f"tool.{tool.name}"].append(tokens)
+        tools_tokens += tokens
+    samples["main_agent.tools"].append(tools_tokens)
+
+    transcripts = list(iter_jsonl_transcripts(corpus))
+    for memory in states["lead_states"].values():
+        memory_context = format_memory_context(memory)
+        for transcript in transcripts:
+            session = SessionRecord()
+            for text in (text for role, text in transcript.messages if role == "user"):
+                messages = agent.prompt.format_messages(
+                    input=f"[Session ID: {SESSION_ID}]\n{text}",
+                    chat_history=session.to_messages(),
+                    memory_context=memory_context,
+                    gym_details=agent._get_gym_details(session, text),
+                    agent_scratchpad=[]
+                )
+                system_tokens = count_messages([m for m in messages if m.type == "system"], count_tokens)
+                samples["main_agent.system"].append(system_tokens)
+                samples["main_agent.request"].append(count_messages(messages, count_tokens) + tools_tokens)
+
+                history = "\n".join(
+                    f"{'User' if role is ROLE_USER else 'Agent'}: {message}"
+                    for role, message in session.iter_messages()
+                )
+                samples["intent_classifier.request"].append(
+                    count_messages(classifier.build_messages(text, history), count_tokens)
+                )
+                samples["memory_manager.request"].append(
+                    count_messages(memory_manager.build_messages(memory or {}, text, agent_reply), count_tokens)
+                )
+                session.add_exchange(text, agent_reply)
+    return samples
+
+
+def summarize(samples: Dict[str, List[int]]) -> Dict[str, Dict]:
+    return {
+        name: {"mean": round(statistics.mean(values), 1), "max": max(values)}
+        for name, values in sorted(samples.items())
+    }
+
+
+def _change(current: float, previous: float) -> str:
+    delta = current - previous
+    if abs(delta) < 0.5:
+        return "="
+    return f"{delta:+.0f} ({delta / previous:+.1%})" if previous else f"{delta:+.0f}"
+
+
+def print_report(summary: Dict[str, Dict], budgets: Dict[str, int], baseline: Dict, method: str) -> List[str]:
+    """Print the table; returns the prompts over budget"""
+    previous = baseline.get("prompts", {})
+    comparable = baseline.get("tokenizer") == method
+    if baseline and not comparable:
+        print(f"Baseline was counted with {baseline.get('tokenizer')!r}, not {method!r}; changes not shown\n")
+
+    over = []
+    print(f"{'prompt':<38}{'mean':>8}{'max':>8}{'budget':>8}   {'mean vs baseline':<18}{'max vs baseline':<18}")
+    for name, stats in summary.items():
+        budget = budgets.get(name)
+        if budget is not None and stats["max"] > budget:
+            over.append(name)
+        if not comparable:
+            mean_change = max_change = ""
+        elif name in previous:
+            mean_change = _change(stats["mean"], previous[name]["mean"])
+            max_change = _change(stats["max"], previous[name]["max"])
+        else:
+            mean_change = max_change = "new"
+        print(f"{name:<38}{stats['mean']:>8.0f}{stats['max']:>8}{budget if budget is not None else '-':>8}   "
+              f"{mean_change:<18}{max_change:<18}{'OVER BUDGET' if name in over else ''}")
+    for name in sorted(set(previous) - set(summary)) if comparable else ():
+        print(f"{name:<38}{'(removed)':>16}")
+    print(f"\ntokens: {method}")
+    return over
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt token counts checked against per-prompt budgets")
+    parser.add_argument("--corpus", type=Path, default=DEFAULT_CORPUS)
+    parser.add_argument("--states", type=Path, default=DEFAULT_STATES)
+    parser.add_argument("--budgets", type=Path, default=DEFAULT_BUDGETS)
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="Save this run as the new baseline")
+    args = parser.parse_args()
+
+    count_tokens, method = get_token_counter()
+    summary = summarize(measure(args.corpus, args.states, count_tokens))
+    all_budgets = json.loads(args.budgets.read_text(encoding="utf-8")) if args.budgets.exists() else {}
+    budgets = all_budgets.get(method, {})
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8")) if args.baseline.exists() else {}
+
+    over = print_report(summary, budgets, baseline, method)
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps({"tokenizer": method, "prompts": summary}, indent=2) + "\n", encoding="utf-8")
+        print(f"Baseline written to {args.baseline}")
+
+    if not budgets:
+        print(f"\nFAIL: no budgets for tokens counted with {method!r} in {args.budgets} "
+              f"(budgets exist for: {', '.join(map(repr, all_budgets)) or 'none'})")
+        sys.exit(1)
+    if over:
+        print(f"\nFAIL: over budget: {', '.join(over)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
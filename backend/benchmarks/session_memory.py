@@ -0,0 +1,79 @@
+"""
+Memory benchmark: bytes per in-process session, before and after SessionRecord
+
+Run from the backend directory:
+    python -m benchmarks.session_memory --sessions 20000
+"""
+import argparse
+import gc
+import tracemalloc
+
+from langchain.schema import HumanMessage, AIMessage
+
+from app.agents.session_record import SessionRecord
+
+USER_TEXT = "I want to lose weight, can I come in the evening around 6 PM?"
+AGENT_TEXT = "Absolutely! Our evening slots at 6 and 7 PM are perfect for that. Shall I book one?"
+EXCHANGES = 5  # Sessions keep the last 10 messages
+
+
+def make_dict_session(i: int) -> dict:
+    """Session shape used before SessionRecord"""
+    history = []
+    for n in range(EXCHANGES):
+        history.append(HumanMessage(content=f"{USER_TEXT} #{i}-{n}"))
+        history.append(AIMessage(content=f"{AGENT_TEXT} #{i}-{n}"))
+    return {
+        "chat_history": history,
+        "last_intent": "medium",
+        "user_info": {},
+        "message_count": EXCHANGES
+    }
+
+
+def make_record_session(i: int) -> SessionRecord:
+    record = SessionRecord()
+    for n in range(EXCHANGES):
+        record.add_exchange(f"{USER_TEXT} #{i}-{n}", f"{AGENT_TEXT} #{i}-{n}")
+    record.set_intent("medium")
+    record.message_count = EXCHANGES
+    return record
+
+
+def measure(factory, count: int) -> float:
+    """Average traced bytes per session for `count` sessions"""
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+
+    sessions = {f"session-{i}": factory(i) for i in range(count)}
+
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    del sessions
+    return (after - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bytes per session benchmark")
+    parser.add_argument("--sessions", type=int, default=20000)
+    args = parser.parse_args()
+
+    text_bytes = measure(lambda i: [f"{USER_TEXT} #{i}-{n}" for n in range(EXCHANGES)] +
+                         [f"{AGENT_TEXT} #{i}-{n}" for n in range(EXCHANGES)], args.sessions)
+    dict_bytes = measure(make_dict_session, args.sessions)
+    record_bytes = measure(make_record_session, args.sessions)
+
+    print(f"Sessions measured:        {args.sessions}")
+    print(f"Message text only:        {text_bytes:,.0f} bytes/session")
+    print(f"Before (dict + messages): {dict_bytes:,.0f} bytes/session")
+    print(f"After (SessionRecord):    {record_bytes:,.0f} bytes/session")
+    print(f"Saved:                    {dict_bytes - record_bytes:,.0f} bytes/session "
+          f"({(dict_bytes - record_bytes) / dict_bytes:.0%})")
+    print(f"Projected at 100k:        {dict_bytes * 1e5 / 2**20:,.0f} MiB -> {record_bytes * 1e5 / 2**20:,.0f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Startup benchmark: import time, first-request latency and lazy construction cost
+
+Run from the backend directory:
+    python -m benchmarks.startup --runs 5
+
+Each run imports app.main in a fresh interpreter. Dummy credentials are used
+when the real ones aren't set, so nothing here talks to OpenAI, Calendly or
+MongoDB (startup/warm-up hooks are not triggered by the ASGI transport).
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+DUMMY_ENV = {
+    "OPENAI_API_KEY": "sk-benchmark",
+    "CALENDLY_API_TOKEN": "benchmark",
+    "CALENDLY_EVENT_TYPE_URI": "https://api.calendly.com/event_types/benchmark",
+    "MONGODB_URL": "mongodb://localhost:27017"
+}
+
+# Executed in the child interpreter; prints "<metric> <milliseconds>" lines
+CHILD_SCRIPT = r"""
+import asyncio, time
+t0 = time.perf_counter()
+import app.main as main
+print("import_ms", (time.perf_counter() - t0) * 1000)
+
+import httpx
+
+async def first_request():
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        t1 = time.perf_counter()
+        response = await client.get("/health")
+        response.raise_for_status()
+        print("first_request_ms", (time.perf_counter() - t1) * 1000)
+
+asyncio.run(first_request())
+
+t2 = time.perf_counter()
+main.tenant_agents.get()
+main.memory_manager.get_instance()
+main.intent_classifier.get_instance()
+print("agent_construction_ms", (time.perf_counter() - t2) * 1000)
+"""
+
+
+def run_once() -> dict:
+    env = {**DUMMY_ENV, **os.environ}
+    result = subprocess.run([sys.executable, "-c", CHILD_SCRIPT], env=env, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise SystemExit(f"Benchmark run failed:\n{result.stderr}")
+
+    metrics = {}
+    for line in result.stdout.splitlines():
+        parts = line.split()
+        if len(parts) == 2 and parts[0].endswith("_ms"):
+            metrics[parts[0]] = float(parts[1])
+    return metrics
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+
+    print(f"Runs: {args.runs} (fresh interpreter each)")
+    print(f"{'metric':<24}{'median':>10}{'min':>10}{'max':>10}")
+    for metric in ("import_ms", "first_request_ms", "agent_construction_ms"):
+        values = [run[metric] for run in runs if metric in run]
+        if values:
+            print(f"{metric:<24}{statistics.median(values):>10.1f}{min(values):>10.1f}{max(values):>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
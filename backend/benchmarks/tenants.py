@@ -0,0 +1,118 @@
+"""
+Multi-tenant benchmark: agent lookup cost and memory with the per-tenant agent cache
+
+Run from the backend directory:
+    python -m benchmarks.tenants --tenants 50 --requests 5000
+
+Builds `--tenants` synthetic gym branches and replays a request stream whose
+tenant popularity follows a Zipf distribution (a few busy branches, a long
+tail), through TenantAgentCache at several sizes and through "no cache" (an
+agent built per request, the cost without the cache). Nothing here talks to
+OpenAI, Calendly or MongoDB; dummy credentials are used when the real ones
+aren't set.
+"""
+import argparse
+import os
+import random
+import statistics
+import time
+import tracemalloc
+from typing import Dict, List
+
+from benchmarks.startup import DUMMY_ENV
+
+for name, value in DUMMY_ENV.items():
+    os.environ.setdefault(name, value)
+
+from app.agents.main_agent import MainSalesAgent, TenantAgentCache  # noqa: E402
+from app.services.tenants import Tenant, TenantRegistry, tenant_registry  # noqa: E402
+
+
+def build_tenants(count: int) -> List[Tenant]:
+    default = tenant_registry.default
+    tenants = [default]
+    for i in range(1, count):
+        tenants.append(TenantRegistry.build_tenant(default, f"branch-{i:02d}", {
+            "gym_name": f"FitLife Branch {i}",
+            "gym_location": f"{i} Fitness Street, Mumbai",
+            "calendly_event_type_uri": f"https://api.calendly.com/event_types/branch-{i:02d}"
+        }))
+    return tenants
+
+
+def request_stream(tenants: List[Tenant], count: int, skew: float, seed: int) -> List[Tenant]:
+    rng = random.Random(seed)
+    weights = [1 / (rank + 1) ** skew for rank in range(len(tenants))]
+    return rng.choices(tenants, weights, k=count)
+
+
+def percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct * (len(ordered) - 1))))]
+
+
+def run(label: str, get_agent, stream: List[Tenant]) -> Dict:
+    timings = []
+    started = time.perf_counter()
+    for tenant in stream:
+        t0 = time.perf_counter()
+        get_agent(tenant)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {
+        "label": label,
+        "total_s": time.perf_counter() - started,
+        "p50_ms": statistics.median(timings),
+        "p99_ms": percentile(timings, 0.99),
+        "max_ms": max(timings)
+    }
+
+
+def agent_footprint_kb(tenants: List[Tenant], samples: int = 10) -> float:
+    """Memory retained per built agent (traced separately: tracemalloc slows everything down)"""
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    agents = [MainSalesAgent(tenant=tenant) for tenant in tenants[:samples]]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return (after - before) / len(agents) / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-tenant agent cache benchmark")
+    parser.add_argument("--tenants", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of tenant popularity")
+    parser.add_argument("--cache-sizes", default="8,16,50")
+    parser.add_argument("--uncached-requests", type=int, default=200,
+                        help="Requests replayed without a cache (each builds an agent)")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    tenants = build_tenants(args.tenants)
+    stream = request_stream(tenants, args.requests, args.skew, args.seed)
+    distinct = len({tenant.tenant_id for tenant in stream})
+    # Build shared LLM clients up front so every run measures agent construction only
+    MainSalesAgent(tenant=tenants[0])
+    footprint_kb = agent_footprint_kb(tenants)
+
+    print(f"{args.requests} requests over {args.tenants} tenants ({distinct} seen, Zipf skew {args.skew}); "
+          f"~{footprint_kb:.0f} KB per built agent\n")
+    print(f"{'':<14}{'hit rate':>10}{'builds':>8}{'total s':>10}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}{'agents MB':>11}")
+
+    uncached = stream[:args.uncached_requests]
+    result = run("no cache", lambda tenant: MainSalesAgent(tenant=tenant), uncached)
+    print(f"{result['label']:<14}{0:>10.0%}{len(uncached):>8}{result['total_s']:>10.2f}"
+          f"{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['max_ms']:>10.2f}{'-':>11}"
+          f"   ({len(uncached)} requests)")
+
+    for size in (int(size) for size in args.cache_sizes.split(",")):
+        cache = TenantAgentCache(size)
+        result = run(f"cache {size}", cache.get, stream)
+        stats = cache.get_stats()
+        retained_mb = stats["cached"] * footprint_kb / 1024
+        print(f"{result['label']:<14}{stats['hits'] / args.requests:>10.0%}{stats['misses']:>8}{result['total_s']:>10.2f}"
+              f"{result['p50_ms']:>10.3f}{result['p99_ms']:>10.3f}{result['max_ms']:>10.2f}{retained_mb:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
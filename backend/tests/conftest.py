@@ -0,0 +1,22 @@
+import os
+
+# Settings are read on first use; tests never reach OpenAI, Calendly or MongoDB
+os.environ.update({
+    "OPENAI_API_KEY": "sk-test",
+    "CALENDLY_API_TOKEN": "test",
+    "CALENDLY_EVENT_TYPE_URI": "https://api.calendly.com/event_types/test",
+    "CALENDLY_WEBHOOK_SIGNING_KEY": "test-signing-key",
+    "MONGODB_URL": "mongodb://localhost:27017",
+    "MEMORY_WAL_ENABLED": "false",
+    "TRANSCRIPTS_ENABLED": "false"
+})
+
+import pytest  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+
+@pytest.fixture
+def mongo_db():
+    """A fresh in-memory Motor database"""
+    return AsyncMongoMockClient()["gym_sales_test"]
+
@@ -0,0 +1,148 @@
+"""Calendly webhooks replayed into the booking mirror (see app.jobs.replay_calendly_webhooks)"""
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+from app.jobs.replay_calendly_webhooks import sample_events
+from app.services.booking_mirror import (
+    BookingMirrorService,
+    booking_mirror,
+    sign_payload,
+    verify_signature,
+    WebhookSignatureError,
+    _parse_time
+)
+
+SIGNING_KEY = "test-signing-key"
+
+
+@pytest.fixture
+def start_time():
+    return (datetime.utcnow() + timedelta(days=1)).strftime("%Y-%m-%dT04:30:00Z")
+
+
+@pytest.fixture
+def mirror(mongo_db, start_time):
+    """A booking mirror with the sample slot mirrored as available"""
+    service = BookingMirrorService()
+    service.attach(mongo_db)
+    asyncio.run(service.availability.insert_one({
+        "_id": start_time,
+        "start_time": _parse_time(start_time),
+        "status": "available"
+    }))
+    return service
+
+
+def signed(event, key=SIGNING_KEY):
+    body = json.dumps(event).encode()
+    return body, sign_payload(body, key)
+
+
+async def slot_status(mirror, start_time):
+    return (await mirror.availability.find_one({"_id": start_time}))["status"]
+
+
+def test_signature_round_trip():
+    body, header = signed({"event": "invitee.created"})
+    verify_signature(body, header, SIGNING_KEY, tolerance_seconds=180)
+
+
+@pytest.mark.parametrize("tamper", [
+    lambda body, header: (body, header[:-4] + "0000"),
+    lambda body, header: (body.replace(b"created", b"canceled"), header),
+    lambda body, header: (body, None),
+    lambda body, header: (body, "v1=abc")
+])
+def test_tampered_signature_rejected(tamper):
+    body, header = tamper(*signed({"event": "invitee.created"}))
+    with pytest.raises(WebhookSignatureError):
+        verify_signature(body, header, SIGNING_KEY, tolerance_seconds=180)
+
+
+def test_stale_signature_rejected():
+    body = b"{}"
+    header = sign_payload(body, SIGNING_KEY, timestamp=int(datetime.utcnow().timestamp()) - 3600)
+    with pytest.raises(WebhookSignatureError):
+        verify_signature(body, header, SIGNING_KEY, tolerance_seconds=180)
+
+
+def test_duplicate_delivery_applied_once(mirror, start_time):
+    created, duplicate, _ = sample_events(start_time)
+
+    async def scenario():
+        assert await mirror.apply_event(created) is True
+        assert await slot_status(mirror, start_time) == "booked"
+        assert await mirror.apply_event(duplicate) is False
+        assert await mirror.bookings.count_documents({}) == 1
+        assert (await mirror.bookings.find_one({}))["status"] == "active"
+
+    asyncio.run(scenario())
+
+
+def test_full_sequence_reopens_slot(mirror, start_time):
+    async def scenario():
+        applied = [await mirror.apply_event(event) for event in sample_events(start_time)]
+        assert applied == [True, False, True]
+        assert (await mirror.bookings.find_one({}))["status"] == "canceled"
+        assert await slot_status(mirror, start_time) == "available"
+
+    asyncio.run(scenario())
+
+
+def test_cancel_before_create(mirror, start_time):
+    created, _, canceled = sample_events(start_time)
+
+    async def scenario():
+        assert await mirror.apply_event(canceled) is True
+        # The older created event arrives late and must not resurrect the booking
+        assert await mirror.apply_event(created) is False
+        booking = await mirror.bookings.find_one({})
+        assert booking["status"] == "canceled"
+        assert await slot_status(mirror, start_time) == "available"
+
+    asyncio.run(scenario())
+
+
+def test_other_event_type_ignored(mirror, start_time):
+    created = sample_events(start_time)[0]
+    created["payload"]["scheduled_event"]["event_type"] = "https://api.calendly.com/event_types/other"
+    assert asyncio.run(mirror.apply_event(created)) is False
+
+
+@pytest.fixture
+def client(mirror, monkeypatch):
+    """The app without its startup hooks, with the module mirror on the test database"""
+    from app.main import app
+
+    monkeypatch.setattr(booking_mirror, "bookings", mirror.bookings)
+    monkeypatch.setattr(booking_mirror, "availability", mirror.availability)
+    return TestClient(app)
+
+
+def post_webhook(client, body, header):
+    headers = {"Content-Type": "application/json"}
+    if header:
+        headers["Calendly-Webhook-Signature"] = header
+    return client.post("/webhooks/calendly", content=body, headers=headers)
+
+
+def test_endpoint_replay(client, start_time):
+    assert settings.calendly_webhook_signing_key == SIGNING_KEY
+    responses = [post_webhook(client, *signed(event)) for event in sample_events(start_time)]
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert [response.json()["applied"] for response in responses] == [True, False, True]
+
+
+def test_endpoint_rejects_tampered_signature(client, mirror, start_time):
+    body, header = signed(sample_events(start_time)[0])
+    response = post_webhook(client, body, header[:-4] + "0000")
+    assert response.status_code == 401
+    assert asyncio.run(mirror.bookings.count_documents({})) == 0
+
+    response = post_webhook(client, body, None)
+    assert response.status_code == 401
@@ -0,0 +1,29 @@
+"""Live chat connections are per gym branch: colliding session ids never reach another branch's socket"""
+import asyncio
+
+from app.services.connection_manager import ConnectionManager, ChatConnection
+
+
+class FakeWebSocket:
+    async def close(self, code=1000):
+        pass
+
+
+def test_same_session_id_in_two_branches():
+    async def scenario():
+        manager = ConnectionManager()
+        andheri = ChatConnection(FakeWebSocket(), "lead-1", tenant_id="andheri")
+        bandra = ChatConnection(FakeWebSocket(), "lead-1", tenant_id="bandra")
+        manager.register(andheri)
+        manager.register(bandra)
+
+        assert manager.get("lead-1", tenant_id="andheri") is andheri
+        assert await manager.send_to_session("lead-1", {"type": "follow_up"}, tenant_id="bandra")
+        assert bandra.outbound.qsize() == 1 and andheri.outbound.qsize() == 0
+        assert not andheri.closed
+
+        manager.unregister(andheri)
+        assert manager.get("lead-1", tenant_id="andheri") is None
+        assert manager.get("lead-1", tenant_id="bandra") is bandra
+
+    asyncio.run(scenario())
@@ -0,0 +1,25 @@
+"""GET /export/leads streams lead memories (health details, contact info) to admins only"""
+import pytest
+from fastapi.testclient import TestClient
+
+from app.config import settings
+
+
+@pytest.fixture
+def client(monkeypatch):
+    from app.main import app
+
+    monkeypatch.setattr(settings, "profiling_admin_token", "admin-token")
+    return TestClient(app)
+
+
+@pytest.mark.parametrize("headers", [{}, {"X-Profile-Token": "wrong"}])
+def test_export_requires_admin_token(client, headers):
+    response = client.get("/export/leads", headers=headers)
+    assert response.status_code == 401
+
+
+def test_export_with_admin_token_passes_auth(client):
+    # Startup hooks don't run here, so MongoDB isn't connected
+    response = client.get("/export/leads", headers={"X-Profile-Token": "admin-token"})
+    assert response.status_code == 503
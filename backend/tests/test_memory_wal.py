@@ -0,0 +1,90 @@
+"""Per-process memory WAL files: compaction keeps to its own file, stopped processes' files are taken over"""
+import asyncio
+import json
+
+import pytest
+
+from app.services import memory_wal as wal_module
+from app.services.memory_wal import MemoryWAL
+
+
+def make_wal(tmp_path, owner):
+    wal = MemoryWAL(str(tmp_path / "memory.jsonl"), owner=owner)
+    wal.load()
+    return wal
+
+
+def memory(session_id, last_updated, **fields):
+    return {"_id": session_id, "last_updated": last_updated, **fields}
+
+
+def replay_all(wal):
+    written = {}
+
+    async def write_batch(tenant_id, memories):
+        written.update(memories)
+        return len(memories)
+
+    asyncio.run(wal.replay(write_batch, batch_size=10))
+    return written
+
+
+def test_processes_write_and_compact_their_own_files(tmp_path):
+    first, second = make_wal(tmp_path, "pid-1"), make_wal(tmp_path, "pid-2")
+    first.append("default", "lead-1", memory("lead-1", "2025-01-01T10:00:00"))
+    second.append("default", "lead-2", memory("lead-2", "2025-01-01T10:00:00"))
+
+    assert list(replay_all(first)) == ["lead-1"]
+    assert not first.path.exists()
+    # The other process's pending write survives the compaction
+    [line] = second.path.read_text().splitlines()
+    assert json.loads(line)["session_id"] == "lead-2"
+
+
+def test_stopped_process_log_is_adopted(tmp_path):
+    crashed = make_wal(tmp_path, "pid-1")
+    crashed.append("default", "lead-1", memory("lead-1", "2025-01-01T10:00:00"))
+    crashed.close()  # Like a process exiting with writes pending: the file stays
+
+    restarted = make_wal(tmp_path, "pid-2")
+    assert restarted.get("default", "lead-1")["_id"] == "lead-1"
+    assert restarted.adopted == 1
+    assert not crashed.path.exists()
+    assert restarted.path.exists()
+
+
+def test_running_process_log_is_left_alone(tmp_path):
+    running = make_wal(tmp_path, "pid-1")
+    running.append("default", "lead-1", memory("lead-1", "2025-01-01T10:00:00"))
+
+    other = make_wal(tmp_path, "pid-2")
+    assert other.pending == {}
+    assert running.path.exists()
+
+
+def test_newest_document_wins_across_logs(tmp_path):
+    older, newer = make_wal(tmp_path, "pid-1"), make_wal(tmp_path, "pid-2")
+    newer.append("default", "lead-1", memory("lead-1", "2025-01-01T11:00:00", fitness_goals="Marathon"))
+    older.append("default", "lead-1", memory("lead-1", "2025-01-01T10:00:00", fitness_goals="Weight loss"))
+    older.close()
+    newer.close()
+
+    restarted = make_wal(tmp_path, "pid-3")
+    assert restarted.get("default", "lead-1")["fitness_goals"] == "Marathon"
+
+
+def test_shared_log_of_earlier_versions_is_adopted(tmp_path):
+    entry = {"seq": 1, "tenant": "default", "session_id": "lead-1", "doc": memory("lead-1", "2025-01-01T10:00:00")}
+    (tmp_path / "memory.jsonl").write_text(json.dumps(entry) + "\n")
+
+    wal = make_wal(tmp_path, "pid-1")
+    assert wal.get("default", "lead-1") is not None
+    assert not (tmp_path / "memory.jsonl").exists()
+
+
+def test_same_owner_twice_is_refused(tmp_path, monkeypatch):
+    monkeypatch.setattr(wal_module, "LOCK_WAIT_SECONDS", 0.2)
+    running = make_wal(tmp_path, "worker-0")
+    with pytest.raises(RuntimeError):
+        make_wal(tmp_path, "worker-0")
+    running.close()
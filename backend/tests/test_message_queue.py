@@ -0,0 +1,233 @@
+"""QueueWorker against both queue backends (SQLite file, Redis Streams on fakeredis), with a stub agent"""
+import asyncio
+import json
+
+import fakeredis
+import pytest
+
+from app import worker as worker_module
+from app.services.message_queue import RedisStreamsQueue, SQLiteQueue
+from app.worker import QueueWorker, STATUS_ERROR, STATUS_OK
+
+SHARDS = 4
+
+
+class StubAgent:
+    """Records each turn; messages starting with "fail" return the agent's error result"""
+
+    def __init__(self):
+        self.calls = []
+        self.running = set()
+        self.overlapped = False
+
+    async def process_message(self, user_message: str, session_id: str):
+        if session_id in self.running:
+            self.overlapped = True
+        self.running.add(session_id)
+        await asyncio.sleep(0.01)
+        self.running.discard(session_id)
+        self.calls.append((session_id, user_message))
+        if user_message.startswith("fail"):
+            return {"response": "Sorry, something went wrong.", "error": "boom"}
+        return {"response": f"re: {user_message}", "intent_level": "medium", "booking_made": False}
+
+
+class StubAgents:
+    """Stands in for tenant_agents; get() raises for the first `failures` calls"""
+
+    def __init__(self, agent, failures=0):
+        self.agent = agent
+        self.failures = failures
+        self.attempts = 0
+
+    def get(self, tenant=None):
+        self.attempts += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("agent setup failed")
+        return self.agent
+
+
+@pytest.fixture
+def agent(monkeypatch):
+    agent = StubAgent()
+    monkeypatch.setattr(worker_module, "tenant_agents", StubAgents(agent))
+    return agent
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def queue(request, tmp_path):
+    if request.param == "sqlite":
+        queue = SQLiteQueue(str(tmp_path / "messages.db"), "test", SHARDS, maxlen=1000)
+        asyncio.run(queue.connect())
+    else:
+        queue = RedisStreamsQueue("redis://fake", "test", "agents", SHARDS, maxlen=1000)
+        queue.redis = fakeredis.FakeAsyncRedis(decode_responses=True)
+    asyncio.run(queue.setup(range(SHARDS)))
+    yield queue
+    asyncio.run(queue.close())
+
+
+def make_worker(queue, consumer="worker-0", **overrides):
+    options = dict(
+        concurrency=4,
+        max_inflight=16,
+        block_ms=20,
+        max_attempts=3,
+        retry_backoff=0.0,
+        max_deliveries=3,
+        claim_idle_seconds=3600
+    )
+    options.update(overrides)
+    return QueueWorker(queue, consumer=consumer, shards=list(range(SHARDS)), **options)
+
+
+async def run_until(worker, done, timeout=5.0):
+    """Run the worker until done() holds, then stop it and wait for in-flight turns"""
+    task = asyncio.create_task(worker.run())
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not done() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    worker.stop()
+    await asyncio.wait_for(task, timeout)
+    assert done()
+
+
+async def dead_letters(queue):
+    if isinstance(queue, SQLiteQueue):
+        rows = queue.db.execute("SELECT fields FROM entries WHERE stream = ?", (queue.dead_letter_stream,)).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    return [fields for _, fields in await queue.redis.xrange(queue.dead_letter_stream)]
+
+
+async def unacknowledged(queue):
+    return await queue.claim("probe", range(SHARDS), idle_ms=0)
+
+
+def test_session_messages_run_in_order(queue, agent):
+    sessions = [f"lead-{n}" for n in range(5)]
+    expected = {session: [f"{session} msg {i}" for i in range(4)] for session in sessions}
+
+    async def scenario():
+        for i in range(4):
+            for session in sessions:
+                await queue.publish_inbound(session, expected[session][i], message_id=f"{session}-{i}")
+        worker = make_worker(queue)
+        await run_until(worker, lambda: worker.processed == 20)
+
+        for session in sessions:
+            assert [text for sid, text in agent.calls if sid == session] == expected[session]
+        assert not agent.overlapped
+
+        replies = await queue.read_replies()
+        assert len(replies) == 20
+        assert all(reply.fields["status"] == STATUS_OK for reply in replies)
+        assert {reply.fields["message_id"] for reply in replies} == {f"{s}-{i}" for s in sessions for i in range(4)}
+        assert await unacknowledged(queue) == []
+
+    asyncio.run(scenario())
+
+
+def test_failed_turn_is_dead_lettered_not_rerun(queue, agent):
+    async def scenario():
+        await queue.publish_inbound("lead-1", "fail please", message_id="m1")
+        worker = make_worker(queue)
+        await run_until(worker, lambda: worker.dead_lettered == 1)
+
+        assert agent.calls == [("lead-1", "fail please")]
+        [reply] = await queue.read_replies()
+        assert reply.fields["status"] == STATUS_ERROR
+        assert reply.fields["response"] == "Sorry, something went wrong."
+        [dead] = await dead_letters(queue)
+        assert dead["reason"] == "boom" and dead["message_id"] == "m1"
+        assert await unacknowledged(queue) == []
+
+    asyncio.run(scenario())
+
+
+def test_missing_message_is_dead_lettered(queue, agent):
+    async def scenario():
+        await queue.publish_inbound("lead-1", "")
+        worker = make_worker(queue)
+        await run_until(worker, lambda: worker.dead_lettered == 1)
+
+        assert agent.calls == []
+        assert (await dead_letters(queue))[0]["reason"] == "missing session_id or message"
+
+    asyncio.run(scenario())
+
+
+def test_agent_setup_is_retried(queue, agent, monkeypatch):
+    monkeypatch.setattr(worker_module, "tenant_agents", StubAgents(agent, failures=2))
+
+    async def scenario():
+        await queue.publish_inbound("lead-1", "hello")
+        worker = make_worker(queue)
+        await run_until(worker, lambda: worker.processed == 1)
+        assert agent.calls == [("lead-1", "hello")]
+
+    asyncio.run(scenario())
+
+
+def test_agent_setup_failure_leaves_message_for_reclaim(queue, agent, monkeypatch):
+    agents = StubAgents(agent, failures=3)
+    monkeypatch.setattr(worker_module, "tenant_agents", agents)
+
+    async def scenario():
+        await queue.publish_inbound("lead-1", "hello")
+        worker = make_worker(queue)
+        await run_until(worker, lambda: agents.attempts == 3 and not worker.inflight)
+
+        assert agent.calls == [] and worker.dead_lettered == 0
+        [pending] = await unacknowledged(queue)
+        assert pending.fields["message"] == "hello"
+        assert pending.deliveries == 2
+
+    asyncio.run(scenario())
+
+
+def test_restarted_worker_reclaims_its_pending_messages(queue, agent):
+    async def scenario():
+        await queue.publish_inbound("lead-1", "first")
+        await queue.publish_inbound("lead-1", "second")
+        # A previous run read both and died before acknowledging them
+        assert len(await queue.read("worker-0", range(SHARDS), count=10, block_ms=10)) == 2
+
+        worker = make_worker(queue)
+        await run_until(worker, lambda: worker.processed == 2)
+        assert agent.calls == [("lead-1", "first"), ("lead-1", "second")]
+        assert await unacknowledged(queue) == []
+
+    asyncio.run(scenario())
+
+
+def test_idle_messages_of_another_consumer_are_claimed(queue, agent):
+    async def scenario():
+        await queue.publish_inbound("lead-1", "hello")
+        assert len(await queue.read("worker-9", range(SHARDS), count=10, block_ms=10)) == 1
+        await asyncio.sleep(1.05)
+
+        # Not at startup (owned by another consumer), only once idle past claim_idle_seconds
+        worker = make_worker(queue, claim_idle_seconds=1)
+        await run_until(worker, lambda: worker.processed == 1)
+        assert agent.calls == [("lead-1", "hello")]
+
+    asyncio.run(scenario())
+
+
+def test_message_redelivered_too_often_is_dead_lettered(queue, agent):
+    async def scenario():
+        await queue.publish_inbound("lead-1", "crashes the worker")
+        await queue.read("worker-0", range(SHARDS), count=10, block_ms=10)
+        for _ in range(3):
+            await queue.claim("worker-0", range(SHARDS), idle_ms=0)
+
+        worker = make_worker(queue, max_deliveries=3)
+        await run_until(worker, lambda: worker.dead_lettered == 1)
+        assert agent.calls == []
+        [dead] = await dead_letters(queue)
+        assert dead["reason"] == "delivered 5 times" and dead["deliveries"] == "5"
+        assert await unacknowledged(queue) == []
+
+    asyncio.run(scenario())
+
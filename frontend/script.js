@@ -2,6 +2,14 @@
 const API_BASE_URL = window.location.origin;
 let sessionId = null;
 
+// WebSocket transport (falls back to HTTP POST /chat when not connected)
+let socket = null;
+let socketReady = false;
+let reconnectDelay = 1000;
+let awaitingSocketReply = false;
+let streamingBubble = null;
+let streamedText = '';
+
 // DOM Elements
 const chatContainer = document.getElementById('chatContainer');
 const userInput = document.getElementById('userInput');
@@ -21,8 +29,109 @@ document.addEventListener('DOMContentLoaded', () => {
         }
     });
     resetButton.addEventListener('click', resetConversation);
+    
+    connectWebSocket();
 });
 
+// Open (or re-open) the chat WebSocket for the current session
+function connectWebSocket() {
+    if (!('WebSocket' in window)) return;
+    
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const query = sessionId ? `?session_id=${encodeURIComponent(sessionId)}` : '';
+    const ws = new WebSocket(`${protocol}://${window.location.host}/ws/chat${query}`);
+    socket = ws;
+    
+    ws.onopen = () => {
+        socketReady = true;
+        reconnectDelay = 1000;
+    };
+    
+    ws.onmessage = (event) => {
+        try {
+            handleSocketFrame(JSON.parse(event.data));
+        } catch (error) {
+            console.error('Bad frame:', error);
+        }
+    };
+    
+    ws.onclose = () => {
+        if (socket !== ws) return;  // Replaced by a newer connection
+        socketReady = false;
+        socket = null;
+        
+        if (awaitingSocketReply) {
+            awaitingSocketReply = false;
+            finishStreaming();
+            addMessage('Connection lost. Please send your message again.', 'bot');
+            setInputState(true);
+        }
+        
+        setTimeout(connectWebSocket, reconnectDelay);
+        reconnectDelay = Math.min(reconnectDelay * 2, 30000);
+    };
+    
+    ws.onerror = () => ws.close();
+}
+
+// Handle a frame pushed by the server
+function handleSocketFrame(frame) {
+    switch (frame.type) {
+        case 'session':
+            sessionId = frame.session_id;
+            break;
+        case 'token':
+            if (!streamingBubble) {
+                streamingBubble = addMessage('', 'bot');
+                streamedText = '';
+            }
+            streamedText += frame.text;
+            streamingBubble.innerHTML = formatMessage(streamedText);
+            chatContainer.scrollTop = chatContainer.scrollHeight;
+            break;
+        case 'response':
+        case 'error':
+            awaitingSocketReply = false;
+            if (streamingBubble) {
+                streamingBubble.innerHTML = formatMessage(frame.response);
+                finishStreaming();
+            } else {
+                addMessage(frame.response, 'bot');
+            }
+            updateIntentIndicator(frame.intent_level);
+            if (frame.booking_made) {
+                showNotification('🎉 Booking confirmed! Check your email for details.');
+            }
+            setInputState(true);
+            userInput.focus();
+            break;
+        case 'intent':
+            updateIntentIndicator(frame.fields && frame.fields.last_intent);
+            break;
+        case 'follow_up':
+            addMessage(frame.response, 'bot');
+            break;
+        case 'busy':
+            // The message wasn't run: unlock the input so it can be sent again
+            awaitingSocketReply = false;
+            finishStreaming();
+            showNotification(frame.retry_after
+                ? `${frame.response} (retry in ${frame.retry_after}s)`
+                : frame.response);
+            setInputState(true);
+            userInput.focus();
+            break;
+        case 'ping':
+            if (socket) socket.send(JSON.stringify({ type: 'pong' }));
+            break;
+    }
+}
+
+function finishStreaming() {
+    streamingBubble = null;
+    streamedText = '';
+}
+
 // Send message function
 async function sendMessage() {
     const message = userInput.value.trim();
@@ -38,6 +147,13 @@ async function sendMessage() {
     // Clear input
     userInput.value = '';
     
+    if (socketReady && socket.readyState === WebSocket.OPEN) {
+        // Reply arrives as frames (see handleSocketFrame)
+        awaitingSocketReply = true;
+        socket.send(JSON.stringify({ type: 'message', message: message }));
+        return;
+    }
+    
     try {
         // Send to API
         const response = await fetch(`${API_BASE_URL}/chat`, {
@@ -99,6 +215,9 @@ function addMessage(content, type) {
     
     // Scroll to bottom
     chatContainer.scrollTop = chatContainer.scrollHeight;
+    
+    // Paragraph element, so streamed replies can be updated in place
+    return contentDiv.querySelector('p');
 }
 
 // Format message (basic markdown-like formatting)
@@ -169,8 +288,15 @@ async function resetConversation() {
             if (index > 0) msg.remove();
         });
         
-        // Reset session
+        // Reset session (and reconnect the socket to a fresh one)
         sessionId = null;
+        if (socket) {
+            const oldSocket = socket;
+            socket = null;
+            socketReady = false;
+            oldSocket.close();
+            connectWebSocket();
+        }
         
         // Reset intent indicator
         intentValue.textContent = '-';